@@ -0,0 +1,321 @@
+"""
+Local stand-in for old.nz.ua serving the pages NZClient parses.
+
+Run it standalone and point the application at it with NZ_BASE_URL:
+
+    python -m benchmarks.fake_server --port 8000 --latency 0.05
+    NZ_BASE_URL=http://127.0.0.1:8000 python -m journal_free -u teacher -p secret journals
+
+Any username is accepted with the password given by --password.
+"""
+import argparse
+import html
+import random
+import secrets
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SESSION_COOKIE = "nz_session"
+CSRF_TOKEN = "fake-csrf-token"
+LESSON_PATH = "/journal/lesson-edit"
+
+
+def render(body: str, title: str = "Журнал", user: str | None = None) -> str:
+    header = f'<div class="h-user-info"><a href="/profile"><span>{html.escape(user)}</span></a></div>' if user else ''
+    return (
+        '<!DOCTYPE html><html lang="uk"><head><meta charset="utf-8">'
+        f'<title>{html.escape(title)}</title><meta name="csrf-token" content="{CSRF_TOKEN}"></head>'
+        f'<body><header>{header}</header><main>{body}</main></body></html>'
+    )
+
+
+class FakeNZ:
+    """
+    State of the fake site: users sessions, terms, journals and their lessons.
+
+    :param int journals: Journals of the teacher, one class each
+    :param int pages: Lesson list pages of every journal
+    :param int lessons_per_page: Lessons on a full list page
+    :param float latency: Seconds every response is delayed by
+    :param int capacity: Requests served at full speed at once, the latency grows linearly past it, 0 is unlimited
+    :param float challenge_rate: Share of the requests answered with an antibot challenge
+    :param float throttle_rate: Share of the requests answered with 429
+    :param str password: Password accepted for every username
+    """
+
+    def __init__(self, journals: int = 2, pages: int = 3, lessons_per_page: int = 10, latency: float = 0.0,
+                 capacity: int = 0, challenge_rate: float = 0.0, throttle_rate: float = 0.0,
+                 password: str = "secret") -> None:
+        self.pages = max(1, pages)
+        self.lessons_per_page = lessons_per_page
+        self.latency = latency
+        self.capacity = capacity
+        self.challenge_rate = challenge_rate
+        self.throttle_rate = throttle_rate
+        self.password = password
+        self.terms = [dict(value="1", name="I семестр"), dict(value="2", name="II семестр")]
+        self.selected_term = "2"
+        self.journals = [dict(id=str(index + 1), subject="Математика", name=f"{5 + index}-А")
+                         for index in range(journals)]
+        self.lessons: dict[str, dict] = {}
+        self.sessions: dict[str, str] = {}
+        self.requests = 0
+        self.posts = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def lessons_per_journal(self) -> int:
+        return self.pages * self.lessons_per_page
+
+    def lesson(self, lesson_id: str) -> dict:
+        with self._lock:
+            return dict(self.lessons.get(lesson_id, dict(topic='', number='', homework='')))
+
+    def save_lesson(self, lesson_id: str, topic: str, number: str, homework: str) -> None:
+        with self._lock:
+            self.lessons[lesson_id] = dict(topic=topic, number=number, homework=homework)
+
+    def reset(self, lessons: bool = True) -> None:
+        """
+        Zeroes the request counters and, unless lessons is False, empties every journal.
+        """
+        with self._lock:
+            if lessons:
+                self.lessons.clear()
+            self.requests = 0
+            self.posts = 0
+
+    def delay(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            overload = max(0, self.in_flight - self.capacity) if self.capacity else 0
+        try:
+            if self.latency:
+                time.sleep(self.latency * (1 + overload))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, with Nagle the body waits for the delayed ACK of the headers
+    disable_nagle_algorithm = True
+    server: "FakeNZServer"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    @property
+    def site(self) -> FakeNZ:
+        return self.server.site
+
+    def _send(self, body: str, status: int = 200, headers: dict | None = None) -> None:
+        content = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _redirect(self, location: str, headers: dict | None = None) -> None:
+        self._send('', 302, dict(headers or {}, Location=location))
+
+    def _user(self) -> str | None:
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        session = cookie.get(SESSION_COOKIE)
+        return self.site.sessions.get(session.value) if session is not None else None
+
+    def _form(self) -> dict:
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        return {key: values[0] for key, values in parse_qs(body, keep_blank_values=True).items()}
+
+    def _blocked(self) -> bool:
+        roll = random.random()
+        if roll < self.site.challenge_rate:
+            status = 403 if self.command == 'POST' else 200
+            self._send(render('<div id="challenge-running"></div>', title="Just a moment..."), status)
+            return True
+        if roll < self.site.challenge_rate + self.site.throttle_rate:
+            self._send('Too Many Requests', 429, {'Retry-After': '0'})
+            return True
+        return False
+
+    def do_GET(self) -> None:
+        self.site.delay()
+        if self._blocked():
+            return
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        user = self._user()
+        if url.path in ('', '/'):
+            return self._send(render(self._login_form(), title="Вхід"))
+        if user is None:
+            return self._redirect('/')
+        if url.path == '/journal/list':
+            return self._send(render(self._journal_list(), user=user))
+        if url.path == '/journal/index' and query.get('journal') in {journal['id'] for journal in self.site.journals}:
+            return self._send(render(self._lessons(query['journal'], int(query.get('page', 1))), user=user))
+        if url.path == LESSON_PATH and 'id' in query:
+            return self._send(render(self._lesson_form(query['id']), user=user))
+        self._send(render('<h1>Not Found</h1>', title="404"), 404)
+
+    def do_POST(self) -> None:
+        self.site.delay()
+        form = self._form()
+        if self._blocked():
+            return
+        with self.site._lock:
+            self.site.posts += 1
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if form.get('_csrf') != CSRF_TOKEN:
+            return self._send(render('<h1>Bad Request</h1>', title="400"), 400)
+        if url.path == '/login':
+            return self._login(form)
+        if self._user() is None:
+            return self._redirect('/')
+        if url.path == '/site/semester-change':
+            self.site.selected_term = form.get('semester_id', self.site.selected_term)
+            return self._redirect('/journal/list')
+        if url.path == LESSON_PATH and 'id' in query:
+            self.site.save_lesson(
+                query['id'],
+                form.get('OsvitaScheduleReal[lesson_topic]', ''),
+                form.get('OsvitaScheduleReal[lesson_number_in_plan]', ''),
+                form.get('OsvitaScheduleReal[hometask]', ''),
+            )
+            return self._send(render('<div class="alert alert-success">Збережено</div>'))
+        self._send(render('<h1>Not Found</h1>', title="404"), 404)
+
+    def _login(self, form: dict) -> None:
+        username = form.get('LoginForm[login]', '')
+        if not username or form.get('LoginForm[password]') != self.site.password:
+            alert = '<div class="alert alert-danger"><ul><li>Неправильний логін або пароль.</li></ul></div>'
+            return self._send(render(alert + self._login_form(), title="Вхід"))
+        session = secrets.token_hex(16)
+        self.site.sessions[session] = f"{username.title()} Вчитель"
+        self._send(render('<div class="dashboard"></div>', user=self.site.sessions[session]),
+                   headers={'Set-Cookie': f"{SESSION_COOKIE}={session}; Path=/; HttpOnly"})
+
+    @staticmethod
+    def _login_form() -> str:
+        return (
+            f'<form id="login-form" action="/login" method="post"><input type="hidden" name="_csrf" value="{CSRF_TOKEN}">'
+            '<input type="text" name="LoginForm[login]"><input type="password" name="LoginForm[password]">'
+            '<input type="checkbox" name="LoginForm[rememberMe]" value="1"></form>'
+        )
+
+    def _journal_list(self) -> str:
+        options = ''.join(
+            f'<option value="{term["value"]}"{" selected" if term["value"] == self.site.selected_term else ""}>'
+            f'{term["name"]}</option>'
+            for term in self.site.terms
+        )
+        rows = ''.join(
+            f'<tr><td>{journal["subject"]}</td><td><a href="/journal/index?journal={journal["id"]}">{journal["name"]}</a></td></tr>'
+            for journal in self.site.journals
+        )
+        return (
+            f'<form id="semester-form"><input type="hidden" name="_csrf" value="{CSRF_TOKEN}">'
+            f'<select id="personalselectform-semester_id" name="semester_id">{options}</select></form>'
+            f'<table class="table journal-choose"><tr><th>Предмет</th><th>Класи</th></tr>{rows}</table>'
+        )
+
+    def _lessons(self, journal_id: str, page: int) -> str:
+        first = (page - 1) * self.site.lessons_per_page
+        lessons = ''.join(
+            f'<li class="dz-item"><span>Урок {first + index + 1}</span>'
+            f'<a class="dz-edit modal-box" href="{LESSON_PATH}?id={journal_id}-{first + index}">Редагувати</a></li>'
+            for index in range(self.site.lessons_per_page if page <= self.site.pages else 0)
+        )
+        pagination = ''
+        if self.site.pages > 1:
+            items = ''.join(f'<li><a href="?journal={journal_id}&page={number}">{number}</a></li>'
+                            for number in range(1, self.site.pages + 1))
+            pagination = f'<ul class="pagination"><li class="prev">&laquo;</li>{items}<li class="next">&raquo;</li></ul>'
+        return f'<ul class="dz-container">{lessons}</ul>{pagination}'
+
+    def _lesson_form(self, lesson_id: str) -> str:
+        lesson = self.site.lesson(lesson_id)
+        return (
+            f'<form id="lesson-form" method="post"><input type="hidden" name="_csrf" value="{CSRF_TOKEN}">'
+            f'<textarea id="osvitaschedulereal-lesson_topic">{html.escape(lesson["topic"])}</textarea>'
+            f'<input id="osvitaschedulereal-lesson_number_in_plan" value="{html.escape(lesson["number"])}">'
+            f'<textarea id="osvitaschedulereal-hometask">{html.escape(lesson["homework"])}</textarea>'
+            '<select id="osvitaschedulereal-hometask_to"><option value="2024-09-09">09.09.2024</option>'
+            '<option value="2024-09-16">16.09.2024</option></select></form>'
+        )
+
+
+class FakeNZServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server of a FakeNZ site, usable as a context manager running in a background thread.
+
+    :param FakeNZ site: (optional) Site state, a default one is created
+    :param int port: (optional) Port to listen on, 0 picks a free one
+    """
+    daemon_threads = True
+
+    def __init__(self, site: FakeNZ | None = None, port: int = 0) -> None:
+        super().__init__(('127.0.0.1', port), Handler)
+        self.site = site if site is not None else FakeNZ()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def journal_url(self, index: int = 0) -> str:
+        return f"/journal/index?journal={self.site.journals[index]['id']}"
+
+    def start(self) -> "FakeNZServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeNZServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in nz.ua server")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--journals', type=int, default=2)
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--lessons-per-page', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds every response is delayed by")
+    parser.add_argument('--capacity', type=int, default=0, help="requests served at full speed at once")
+    parser.add_argument('--challenge-rate', type=float, default=0.0, help="share of antibot challenge responses")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument('--password', default="secret")
+    args = parser.parse_args()
+    site = FakeNZ(journals=args.journals, pages=args.pages, lessons_per_page=args.lessons_per_page,
+                  latency=args.latency, capacity=args.capacity, challenge_rate=args.challenge_rate,
+                  throttle_rate=args.throttle_rate, password=args.password)
+    server = FakeNZServer(site, args.port)
+    print(f"Serving a fake nz.ua on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
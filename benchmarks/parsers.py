@@ -0,0 +1,120 @@
+"""
+Parser micro-benchmarks on the recorded page corpus.
+
+    python -m benchmarks.parsers
+    python -m benchmarks.parsers --parser lxml --step pagination --json
+
+Every page of benchmarks/corpus/manifest.json is parsed by every extraction
+backend. The result is first checked against the recorded expectation, then
+timed with timeit and traced with tracemalloc. Allocations are those of the
+Python heap, memory libxml2 allocates itself is not seen by tracemalloc.
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+from pathlib import Path
+
+from journal_free.parsers import PARSERS, BaseParser
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+
+
+def load_corpus(steps: list[str] | None = None) -> list[dict]:
+    manifest = json.loads((CORPUS_DIR / "manifest.json").read_text(encoding='utf-8'))
+    corpus = []
+    for entry in manifest:
+        if steps and entry['step'] not in steps:
+            continue
+        corpus.append(dict(entry, content=(CORPUS_DIR / entry['file']).read_bytes()))
+    return corpus
+
+
+def check(parser: BaseParser, entry: dict) -> None:
+    result = parser.parse(entry['page'], entry['content'])
+    if result != entry['expected']:
+        raise AssertionError(f"{parser.name} parses {entry['file']} as {result}, expected {entry['expected']}")
+
+
+def measure_time(parser: BaseParser, entry: dict, repeat: int) -> float:
+    """
+    Best seconds per parse over the repeats, every repeat runs for at least 0.2 seconds.
+    """
+    timer = timeit.Timer(lambda: parser.parse(entry['page'], entry['content']))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def measure_memory(parser: BaseParser, entry: dict) -> tuple[int, int]:
+    """
+    Peak Python heap bytes of one parse and the memory blocks still held after it, the result included.
+    """
+    # The first parse builds the per-thread state, it is not part of a page parse
+    parser.parse(entry['page'], entry['content'])
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = parser.parse(entry['page'], entry['content'])
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return peak - baseline, blocks
+
+
+def run(parsers: list[str], steps: list[str] | None = None, repeat: int = 5) -> list[dict]:
+    corpus = load_corpus(steps)
+    results = []
+    for name in parsers:
+        try:
+            parser = PARSERS[name]()
+        except ImportError as e:
+            print(f"{name}: skipped, {e}")
+            continue
+        for entry in corpus:
+            check(parser, entry)
+            seconds = measure_time(parser, entry, repeat)
+            peak, blocks = measure_memory(parser, entry)
+            results.append(dict(
+                parser=name,
+                step=entry['step'],
+                file=entry['file'],
+                size=len(entry['content']),
+                microseconds=seconds * 1e6,
+                pages_per_second=1 / seconds,
+                peak_bytes=peak,
+                retained_blocks=blocks,
+            ))
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmarks.parsers", description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--parser', action='append', choices=list(PARSERS), help="backend to measure, all by default")
+    parser.add_argument('--step', action='append', help="parsing step to measure: csrf, login_alert, journals, "
+                                                        "pagination, lesson_fields, antibot, all by default")
+    parser.add_argument('--repeat', type=int, default=5, help="timing repeats, the best one is reported")
+    parser.add_argument('--json', action='store_true', help="print machine readable JSON")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> list[dict]:
+    args = build_parser().parse_args(argv)
+    results = run(args.parser or list(PARSERS), args.step, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return results
+    print(f"{'parser':<8}{'step':<15}{'page':<24}{'KiB':>6}{'us/page':>10}{'pages/s':>10}{'peak KiB':>10}{'blocks':>8}")
+    for result in results:
+        print(f"{result['parser']:<8}{result['step']:<15}{result['file']:<24}{result['size'] / 1024:6.1f}"
+              f"{result['microseconds']:10.1f}{result['pages_per_second']:10.0f}"
+              f"{result['peak_bytes'] / 1024:10.1f}{result['retained_blocks']:8d}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+End-to-end fill and export throughput against the local stand-in server.
+
+    python -m benchmarks.throughput --lessons 200 --latency 0.05
+    python -m benchmarks.throughput --challenge-rate 0.05 --fixed --json
+
+Both scenarios run on one FakeNZ journal that is emptied before every fill run,
+lessons/second is measured from the first journal request to the last saved or
+exported lesson.
+"""
+import argparse
+import json
+import math
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_server import FakeNZ, FakeNZServer
+from journal_free.client import NZClient, FileClient
+from journal_free.engine import SubmissionEngine, ExportEngine, FillStatus
+from journal_free.session_store import SessionStore
+
+
+def write_plan(path: Path, lessons: int) -> FileClient:
+    with open(path, 'w', encoding='utf-8') as file:
+        for number in range(1, lessons + 1):
+            file.write(f"{number},Тема уроку {number},Параграф {number}\n")
+    return FileClient(str(path))
+
+
+def login(server: FakeNZServer, directory: Path) -> NZClient:
+    client = NZClient("benchmark", server.site.password, session_store=SessionStore("benchmark", directory),
+                      base_url=server.url)
+    client.authenticate()
+    return client
+
+
+def bench_fill(server: FakeNZServer, client: NZClient, plan: FileClient, args: argparse.Namespace) -> dict:
+    server.site.reset()
+    engine = SubmissionEngine(client, concurrency=args.concurrency, sync=args.sync, adaptive=not args.fixed)
+    started = time.perf_counter()
+    status = engine.fill(server.journal_url(), plan, resume=False)
+    elapsed = time.perf_counter() - started
+    if status != FillStatus.SUCCESS:
+        raise RuntimeError(f"fill ended with {status}")
+    return dict(seconds=elapsed, lessons=engine.submitted + engine.skipped, requests=server.site.requests,
+                limit=engine.limiter.limit)
+
+
+def bench_export(server: FakeNZServer, client: NZClient, directory: Path, args: argparse.Namespace) -> dict:
+    server.site.reset(lessons=False)
+    engine = ExportEngine(client, concurrency=args.concurrency, adaptive=not args.fixed)
+    started = time.perf_counter()
+    status = engine.export(server.journal_url(), str(directory / "export.xlsx"))
+    elapsed = time.perf_counter() - started
+    if status != FillStatus.SUCCESS:
+        raise RuntimeError(f"export ended with {status}")
+    return dict(seconds=elapsed, lessons=engine.total, requests=server.site.requests, limit=engine.limiter.limit)
+
+
+def summarize(name: str, runs: list[dict], client: NZClient) -> dict:
+    rates = [run['lessons'] / run['seconds'] for run in runs]
+    return dict(
+        scenario=name,
+        runs=len(runs),
+        lessons=runs[0]['lessons'],
+        lessons_per_second=statistics.median(rates),
+        best_lessons_per_second=max(rates),
+        seconds=statistics.median(run['seconds'] for run in runs),
+        requests=runs[-1]['requests'],
+        final_limit=runs[-1]['limit'],
+        policy=client.policy_stats,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmarks.throughput", description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lessons', type=int, default=200, help="lessons in the journal")
+    parser.add_argument('--per-page', type=int, default=20, help="lessons on a journal page")
+    parser.add_argument('--latency', type=float, default=0.05, help="server latency in seconds")
+    parser.add_argument('--capacity', type=int, default=0, help="requests the server serves at full speed at once")
+    parser.add_argument('--challenge-rate', type=float, default=0.0, help="share of antibot challenge responses")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument('--concurrency', type=int, default=6, help="lessons in flight, the initial limit when adaptive")
+    parser.add_argument('--fixed', action='store_true', help="disable the adaptive concurrency")
+    parser.add_argument('--sync', action='store_true', help="fill with sync, every lesson is read before it is saved")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of every scenario, the median is reported")
+    parser.add_argument('--json', action='store_true', help="print machine readable JSON")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> list[dict]:
+    args = build_parser().parse_args(argv)
+    site = FakeNZ(journals=1, pages=math.ceil(args.lessons / args.per_page), lessons_per_page=args.per_page,
+                  latency=args.latency, capacity=args.capacity, challenge_rate=args.challenge_rate,
+                  throttle_rate=args.throttle_rate)
+    results = []
+    with FakeNZServer(site) as server, tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        plan = write_plan(directory / "plan.csv", site.lessons_per_journal)
+        client = login(server, directory)
+        results.append(summarize("fill", [bench_fill(server, client, plan, args) for _ in range(args.repeat)], client))
+        client = login(server, directory)
+        results.append(summarize("export", [bench_export(server, client, directory, args) for _ in range(args.repeat)], client))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"{result['scenario']:<8}{result['lessons']:>6} lessons  {result['lessons_per_second']:8.1f} lessons/s"
+                  f"  ({result['seconds']:.2f} s, {result['requests']} requests, final limit {result['final_limit']},"
+                  f" {result['policy']['retries']} retries)")
+    return results
+
+
+if __name__ == "__main__":
+    main()
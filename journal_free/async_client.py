@@ -0,0 +1,102 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from journal_free import settings
+from journal_free.client import NZClient, JournalList
+
+
+class AsyncNZClient:
+    """
+    Thread-backed asyncio facade of NZClient, not a native asyncio HTTP client.
+
+    Every coroutine runs the blocking NZClient method on a thread pool of
+    ``concurrency`` threads, so at most that many requests are in flight however
+    many coroutines are awaited, the others wait for a free thread. The requests
+    have to go through cloudscraper, the antibot clearance is bound to its TLS
+    fingerprint and it has no asyncio transport. The cookies and the clearance
+    are shared with the blocking client, the threads send on its pooled sessions.
+
+    :param str username: (optional) nz.ua login, required without client
+    :param str password: (optional) nz.ua password, required without client
+    :param NZClient client: (optional) Existing client to share the session with
+    :param int concurrency: (optional) Threads of the pool, the most requests in flight at once
+    """
+
+    def __init__(self, username: str | None = None, password: str | None = None,
+                 client: NZClient | None = None, concurrency: int = settings.SUBMIT_CONCURRENCY) -> None:
+        self.client = client if client is not None else NZClient(username, password)
+        self.concurrency = max(1, concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    async def __aenter__(self) -> "AsyncNZClient":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    @property
+    def is_auth(self) -> bool:
+        return self.client.is_auth
+
+    @property
+    def user(self) -> str | None:
+        return self.client.user
+
+    @property
+    def journal_list(self) -> JournalList | None:
+        return self.client.journal_list
+
+    @property
+    def terms(self) -> tuple[dict, ...] | None:
+        return self.client.terms
+
+    @property
+    def selected_term(self) -> dict | None:
+        return self.client.selected_term
+
+    @property
+    def journals(self) -> tuple[dict, ...] | None:
+        return self.client.journals
+
+    async def authenticate(self) -> bool:
+        return await self._run(self.client.authenticate)
+
+    async def get_journals(self) -> JournalList | None:
+        return await self._run(self.client.get_journals)
+
+    async def change_term(self, term_id) -> JournalList | None:
+        return await self._run(self.client.change_term, term_id)
+
+    async def find_lessons_url(self, url: str, concurrency: int = settings.PAGE_CONCURRENCY) -> tuple[str, ...] | None:
+        return await self._run(self.client.find_lessons_url, url, concurrency)
+
+    async def add_topic(self, url: str, lesson_data: dict) -> int:
+        return await self._run(self.client.add_topic, url, lesson_data)
+
+    async def parse_lesson_data(self, url: str) -> dict:
+        return await self._run(self.client.parse_lesson_data, url)
+
+    async def add_topics(self, lessons_url: Iterable[str], rows: Iterable[dict]) -> list[int]:
+        """
+        Submits the plan rows to the lessons concurrently.
+
+        :return: Status codes in lesson order
+        """
+        return list(await asyncio.gather(*(self.add_topic(url, row) for row, url in zip(rows, lessons_url))))
+
+    async def parse_lessons_data(self, lessons_url: Iterable[str]) -> list[dict]:
+        """
+        Reads the lessons concurrently.
+
+        :return: Lesson data in lesson order
+        """
+        return list(await asyncio.gather(*(self.parse_lesson_data(url) for url in lessons_url)))
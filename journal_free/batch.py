@@ -0,0 +1,131 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from journal_free import settings
+from journal_free.client import NZClient, FileClient
+from journal_free.engine import SubmissionEngine, FillStatus, Progress
+from journal_free.policy import AdaptiveLimiter
+
+
+class BatchFill:
+    """
+    Fills several journals at once under one global concurrency budget.
+
+    Every journal gets its own SubmissionEngine, all engines submit their lessons
+    on one shared executor bounded by the same limiter, so the number of lessons
+    in flight never exceeds the budget however many journals run.
+
+    :param NZClient client: Authenticated client
+    :param int concurrency: (optional) Lessons in flight across all journals, the initial limit when adaptive
+    :param int journals: (optional) Journals filled at once
+    :param bool sync: (optional) Skip lessons whose journal content already matches the plan row
+    :param bool resume: (optional) Resume interrupted runs from their checkpoints
+    :param bool adaptive: (optional) Tune the shared budget to the server latency, see AdaptiveLimiter
+    :param progress: (optional) Callback receiving the journal name and its Progress snapshots
+    """
+
+    def __init__(self, client: NZClient, concurrency: int = settings.BATCH_CONCURRENCY,
+                 journals: int = settings.BATCH_JOURNALS, sync: bool = False, resume: bool = True,
+                 adaptive: bool = settings.ADAPTIVE_CONCURRENCY,
+                 progress: Callable[[str, Progress], None] | None = None) -> None:
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.journals = max(1, journals)
+        self.sync = sync
+        self.resume = resume
+        self.adaptive = adaptive
+        self.on_progress = progress
+        self.limiter: AdaptiveLimiter | None = None
+        self._engines: list[SubmissionEngine] = []
+        self._engines_lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """
+        Cancels the running journals and the journals not started yet, their checkpoints are kept.
+        """
+        self._cancelled.set()
+        with self._engines_lock:
+            for engine in self._engines:
+                engine.cancel()
+
+    def run(self, jobs: Iterable[dict]) -> list[dict]:
+        """
+        Fills every journal and waits for all of them.
+
+        :param jobs: Dicts with the journal ``url``, its display ``name`` and the plan ``file``
+        :return: Report of every journal in job order
+        """
+        self._cancelled.clear()
+        if self.adaptive:
+            self.limiter = AdaptiveLimiter(self.concurrency)
+        else:
+            self.limiter = AdaptiveLimiter.fixed(self.concurrency)
+        with ThreadPoolExecutor(max_workers=self.limiter.maximum) as lessons_executor, \
+                ThreadPoolExecutor(max_workers=self.journals) as journals_executor:
+            futures = [journals_executor.submit(self._fill, job, lessons_executor) for job in jobs]
+            return [future.result() for future in futures]
+
+    def _fill(self, job: dict, executor: ThreadPoolExecutor) -> dict:
+        report = dict(name=job.get('name', job['url']), url=job['url'], error=None)
+        file: FileClient = job['file']
+        if not file.is_valid:
+            return dict(report, status=FillStatus.INVALID_PLAN, total=0, submitted=0, skipped=0, resumed=0, failed=0)
+        if self._cancelled.is_set():
+            return dict(report, status=FillStatus.CANCELLED, total=0, submitted=0, skipped=0, resumed=0, failed=0)
+        progress = None
+        if self.on_progress is not None:
+            progress = lambda snapshot: self.on_progress(report['name'], snapshot)
+        engine = SubmissionEngine(self.client, sync=self.sync, executor=executor, limiter=self.limiter,
+                                  progress=progress)
+        with self._engines_lock:
+            self._engines.append(engine)
+            if self._cancelled.is_set():
+                engine.cancel()
+        try:
+            status = engine.fill(job['url'], file, resume=self.resume)
+        except Exception as e:
+            status = FillStatus.ERROR
+            report['error'] = str(e)
+        finally:
+            with self._engines_lock:
+                self._engines.remove(engine)
+        return dict(
+            report,
+            status=status,
+            total=engine.total,
+            submitted=engine.submitted,
+            skipped=engine.skipped,
+            resumed=engine.resumed,
+            failed=engine.failed,
+            limit=engine.limiter.limit,
+            latency=engine.limiter.latency,
+        )
+
+    @staticmethod
+    def jobs_from_workbook(file_path: str, journals: Iterable[dict]) -> list[dict]:
+        """
+        Pairs the sheets of a multi-sheet workbook with journals.
+
+        A sheet is matched by the full "Subject - Class" journal name or, when it
+        is unambiguous, by the class name alone. Sheets without a journal are ignored.
+
+        :param str file_path: Plan workbook
+        :param journals: Journals of a JournalList returned by NZClient.get_journals
+        """
+        by_name = {}
+        by_class = {}
+        for journal in journals:
+            for class_ in journal['classes']:
+                name = f"{journal['subject']} - {class_['name']}"
+                by_name[name] = dict(name=name, url=class_['url'])
+                by_class.setdefault(class_['name'], []).append(by_name[name])
+        jobs = []
+        for sheet in FileClient.sheet_names(file_path):
+            journal = by_name.get(sheet)
+            if journal is None and len(by_class.get(sheet, [])) == 1:
+                journal = by_class[sheet][0]
+            if journal is not None:
+                jobs.append(dict(journal, file=FileClient(file_path, sheet=sheet)))
+        return jobs
@@ -0,0 +1,84 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from journal_free import settings
+
+
+class Checkpoint:
+    """
+    Lessons confirmed by a journal fill run, kept in a local SQLite journal.
+
+    A run is identified by the journal url and the plan file hash, so a restarted
+    run with the same plan resumes after the last confirmed lesson while a changed
+    plan starts from scratch.
+
+    :param str journal_url: Journal url
+    :param str plan_hash: Hash of the plan file
+    :param Path path: (optional) SQLite database file
+    """
+
+    def __init__(self, journal_url: str, plan_hash: str, path: Path = settings.CHECKPOINT_PATH) -> None:
+        self.journal_url = journal_url
+        self.plan_hash = plan_hash
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS confirmed_lessons (
+                journal_url TEXT NOT NULL,
+                plan_hash TEXT NOT NULL,
+                lesson_index INTEGER NOT NULL,
+                lesson_url TEXT NOT NULL,
+                confirmed_at REAL NOT NULL,
+                PRIMARY KEY (journal_url, plan_hash, lesson_index)
+            )
+        """)
+        rows = self._connection.execute(
+            "SELECT lesson_index, lesson_url FROM confirmed_lessons WHERE journal_url = ? AND plan_hash = ?",
+            (journal_url, plan_hash)
+        )
+        self._confirmed: dict[int, str] = dict(rows.fetchall())
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def count(self) -> int:
+        return len(self._confirmed)
+
+    def is_confirmed(self, index: int, url: str) -> bool:
+        """
+        Checks whether the lesson at the position was already saved by this run.
+        """
+        with self._lock:
+            return self._confirmed.get(index) == url
+
+    def confirm(self, index: int, url: str) -> None:
+        with self._lock:
+            self._confirmed[index] = url
+            self._connection.execute(
+                "INSERT OR REPLACE INTO confirmed_lessons VALUES (?, ?, ?, ?, ?)",
+                (self.journal_url, self.plan_hash, index, url, time.time())
+            )
+
+    def clear(self) -> None:
+        """
+        Forgets the run, called once every lesson of the plan is saved.
+        """
+        with self._lock:
+            self._confirmed.clear()
+            self._connection.execute(
+                "DELETE FROM confirmed_lessons WHERE journal_url = ? AND plan_hash = ?",
+                (self.journal_url, self.plan_hash)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,257 @@
+import argparse
+import getpass
+import json
+import os
+import signal
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+from journal_free import settings
+from journal_free.batch import BatchFill
+from journal_free.client import NZClient, FileClient, AuthError, AntiBotError, ResponseError, \
+    PlanFormatError, SheetNotFoundError, UnsupportedFormatError
+from journal_free.engine import SubmissionEngine, ExportEngine, FillStatus, Progress
+from journal_free.metrics import RequestTracer
+from journal_free.service import FillService
+from journal_free.session_store import SessionStore
+from journal_free.sharding import ShardedRun
+
+
+def _login(args: argparse.Namespace) -> NZClient:
+    username = args.username or os.environ.get('NZ_USERNAME') or SessionStore.last_username()
+    if not username:
+        raise AuthError("Username is required, pass --username or set NZ_USERNAME")
+    client = NZClient(username, args.password or os.environ.get('NZ_PASSWORD', ''), tracer=args.tracer)
+    if client.restore_session():
+        return client
+    if not client.password:
+        client.password = getpass.getpass(f"Password for {username}: ")
+    if not client.authenticate():
+        # The login page had no form, every command would run logged out
+        raise AuthError("nz.ua did not show the login form, try again later")
+    return client
+
+
+def _output(args: argparse.Namespace, data, text: str) -> None:
+    print(json.dumps(data, ensure_ascii=False, indent=2) if args.json else text)
+
+
+def _print_progress(progress: Progress, name: str | None = None) -> None:
+    total = f"/{progress.expected}" if progress.expected is not None else ''
+    eta = f", eta {progress.eta:.0f} s" if progress.eta is not None else ''
+    prefix = f"{name}: " if name else ''
+    print(f"{prefix}{progress.done}{total} lessons, {progress.failed} failed, {progress.throughput:.1f} lessons/s{eta}",
+          file=sys.stderr)
+
+
+@contextmanager
+def _cancel_on_interrupt(cancel):
+    """
+    The first Ctrl+C cancels the run and lets the lessons in flight finish, the second one interrupts at once.
+    """
+    def handler(signum, frame):
+        signal.signal(signal.SIGINT, previous)
+        print("Cancelling, waiting for the lessons in flight, press Ctrl+C again to interrupt", file=sys.stderr)
+        cancel()
+
+    previous = signal.signal(signal.SIGINT, handler)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+def _exit_code(statuses: list[str]) -> int:
+    if any(status == FillStatus.CANCELLED for status in statuses):
+        return 130
+    return 0 if all(status == FillStatus.SUCCESS for status in statuses) else 1
+
+
+def login(args: argparse.Namespace) -> int:
+    client = _login(args)
+    _output(args, dict(user=client.user), f"Logged in as {client.user}")
+    return 0
+
+
+def journals(args: argparse.Namespace) -> int:
+    client = _login(args)
+    journal_list = client.change_term(args.term) if args.term is not None else client.get_journals()
+    if journal_list is None:
+        print("The journal list could not be read", file=sys.stderr)
+        return 1
+    lines = [f"Term: {journal_list.selected_term['name'] if journal_list.selected_term else '-'}"]
+    for journal in journal_list.journals:
+        for class_ in journal['classes']:
+            lines.append(f"{journal['subject']} - {class_['name']}\t{class_['url']}")
+    _output(args, journal_list._asdict(), '\n'.join(lines))
+    return 0
+
+
+def fill(args: argparse.Namespace) -> int:
+    client = _login(args)
+    if args.journal is not None:
+        file = FileClient(args.plan, sheet=args.sheet)
+        if not file.is_valid:
+            reports = [dict(name=args.journal, url=args.journal, status=FillStatus.INVALID_PLAN)]
+        else:
+            engine = SubmissionEngine(client, concurrency=args.concurrency or settings.SUBMIT_CONCURRENCY, sync=args.sync,
+                                      progress=_print_progress if args.progress else None)
+            with _cancel_on_interrupt(engine.cancel):
+                status = engine.fill(args.journal, file, resume=not args.no_resume)
+            reports = [dict(
+                name=args.journal,
+                url=args.journal,
+                status=status,
+                total=engine.total,
+                submitted=engine.submitted,
+                skipped=engine.skipped,
+                resumed=engine.resumed,
+                failed=engine.failed,
+                limit=engine.limiter.limit,
+                latency=engine.limiter.latency,
+            )]
+    else:
+        journal_list = client.get_journals()
+        jobs = BatchFill.jobs_from_workbook(args.plan, journal_list.journals if journal_list is not None else [])
+        if not jobs:
+            print("No sheet of the workbook matches a journal name", file=sys.stderr)
+            return 1
+        progress = (lambda name, progress: _print_progress(progress, name)) if args.progress else None
+        if args.processes > 1:
+            sharded = ShardedRun(client, processes=args.processes,
+                                 concurrency=args.concurrency or settings.SUBMIT_CONCURRENCY, sync=args.sync,
+                                 resume=not args.no_resume, progress=progress)
+            with _cancel_on_interrupt(sharded.cancel):
+                reports = sharded.fill(jobs)
+        else:
+            batch = BatchFill(client, concurrency=args.concurrency or settings.BATCH_CONCURRENCY, sync=args.sync,
+                              resume=not args.no_resume, progress=progress)
+            with _cancel_on_interrupt(batch.cancel):
+                reports = batch.run(jobs)
+    lines = []
+    for report in reports:
+        counters = ', '.join(f"{key}: {report[key]}" for key in ('submitted', 'skipped', 'resumed', 'failed') if key in report)
+        lines.append(f"{report['name']}: {report['status']}" + (f" ({counters})" if counters else ''))
+    _output(args, reports, '\n'.join(lines))
+    return _exit_code([report['status'] for report in reports])
+
+
+def export(args: argparse.Namespace) -> int:
+    client = _login(args)
+    engine = ExportEngine(client, concurrency=args.concurrency or settings.EXPORT_CONCURRENCY,
+                          progress=_print_progress if args.progress else None)
+    with _cancel_on_interrupt(engine.cancel):
+        status = engine.export(args.journal, args.output)
+    _output(args, dict(file=args.output, status=status, lessons=engine.total, limit=engine.limiter.limit,
+                       latency=engine.limiter.latency),
+            f"Exported {engine.total} lessons to {args.output}" if status == FillStatus.SUCCESS else status)
+    return _exit_code([status])
+
+
+def export_all(args: argparse.Namespace) -> int:
+    client = _login(args)
+    journal_list = client.get_journals()
+    if journal_list is None:
+        print("The journal list could not be read", file=sys.stderr)
+        return 1
+    os.makedirs(args.directory, exist_ok=True)
+    jobs = []
+    for journal in journal_list.journals:
+        for class_ in journal['classes']:
+            name = f"{journal['subject']} - {class_['name']}"
+            file_name = ''.join('_' if char in '\\/:*?"<>|' else char for char in name)
+            jobs.append(dict(name=name, url=class_['url'], output=os.path.join(args.directory, f"{file_name}.xlsx")))
+    sharded = ShardedRun(client, processes=args.processes, concurrency=args.concurrency or settings.EXPORT_CONCURRENCY,
+                         progress=(lambda name, progress: _print_progress(progress, name)) if args.progress else None)
+    with _cancel_on_interrupt(sharded.cancel):
+        reports = sharded.export(jobs)
+    lines = [f"{report['name']}: {report['status']} ({report['lessons']} lessons)" for report in reports]
+    _output(args, reports, '\n'.join(lines))
+    return _exit_code([report['status'] for report in reports])
+
+
+def serve(args: argparse.Namespace) -> int:
+    client = _login(args)
+    service = FillService(client, workers=args.workers, host=args.host, port=args.port,
+                          export_dir=Path(args.export_dir))
+    print(f"Serving the fill API on {service.url} with {service.workers} workers, Ctrl+C stops", file=sys.stderr)
+    if settings.SERVICE_TOKEN is None:
+        print(f"The API token is in {service.token_path}", file=sys.stderr)
+    service.serve_forever()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="journal_free", description="nz.ua journal autofill without the GUI")
+    parser.add_argument('-u', '--username', help="nz.ua login, defaults to NZ_USERNAME or the last stored session")
+    parser.add_argument('-p', '--password', help="nz.ua password, defaults to NZ_PASSWORD or a prompt")
+    parser.add_argument('--json', action='store_true', help="print machine readable JSON")
+    parser.add_argument('--trace', help="append a JSON line per nz.ua request to the file")
+    parser.add_argument('--stats', action='store_true', help="print request timings per endpoint to stderr")
+    parser.add_argument('--progress', action='store_true', help="print fill and export progress to stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('login', help="log in and store the session").set_defaults(func=login)
+
+    journals_parser = commands.add_parser('journals', help="list journals of the selected term")
+    journals_parser.add_argument('--term', help="switch to the term id before listing")
+    journals_parser.set_defaults(func=journals)
+
+    fill_parser = commands.add_parser('fill', help="fill journals from a plan file")
+    fill_parser.add_argument('plan', help="plan file (xlsx, ods, csv, json), one sheet per journal without --journal")
+    fill_parser.add_argument('--journal', help="journal url to fill from a single plan")
+    fill_parser.add_argument('--sheet', help="workbook sheet with the plan, the active one by default")
+    fill_parser.add_argument('--sync', action='store_true', help="skip lessons already matching the plan")
+    fill_parser.add_argument('--no-resume', action='store_true', help="ignore checkpoints of interrupted runs")
+    fill_parser.add_argument('--concurrency', type=int, default=None,
+                             help="lessons submitted at once, per process with --processes")
+    fill_parser.add_argument('--processes', type=int, default=1,
+                             help="fill the journals of a workbook on worker processes, one journal per process at once")
+    fill_parser.set_defaults(func=fill)
+
+    export_parser = commands.add_parser('export', help="export a journal to Excel")
+    export_parser.add_argument('journal', help="journal url")
+    export_parser.add_argument('output', help="xlsx file to write")
+    export_parser.add_argument('--concurrency', type=int, default=None, help="lesson pages read at once")
+    export_parser.set_defaults(func=export)
+
+    export_all_parser = commands.add_parser('export-all', help="export every journal of the selected term to Excel")
+    export_all_parser.add_argument('directory', help="directory the xlsx files are written to")
+    export_all_parser.add_argument('--processes', type=int, default=settings.SHARD_PROCESSES,
+                                   help="worker processes, one journal per process at once")
+    export_all_parser.add_argument('--concurrency', type=int, default=None, help="lesson pages read at once per process")
+    export_all_parser.set_defaults(func=export_all)
+
+    serve_parser = commands.add_parser('serve', help="process fill and export jobs submitted to a local JSON API")
+    serve_parser.add_argument('--workers', type=int, default=settings.SERVICE_WORKERS, help="worker processes")
+    serve_parser.add_argument('--host', default=settings.SERVICE_HOST, help="interface the API listens on")
+    serve_parser.add_argument('--port', type=int, default=settings.SERVICE_PORT, help="port of the API")
+    serve_parser.add_argument('--export-dir', default=str(settings.SERVICE_EXPORT_DIR),
+                              help="directory the export jobs write to")
+    serve_parser.set_defaults(func=serve)
+    return parser
+
+
+def _print_stats(tracer: RequestTracer) -> None:
+    print(f"{'endpoint':<36}{'count':>7}{'errors':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'ttfb p50':>10}{'parse p50':>10}",
+          file=sys.stderr)
+    for row in tracer.summary():
+        timings = [row[key] for key in ('total_p50_ms', 'total_p90_ms', 'total_p99_ms', 'ttfb_p50_ms', 'parse_p50_ms')]
+        p50, p90, p99, ttfb, parse = (f"{value:.1f}" if value is not None else '-' for value in timings)
+        print(f"{row['method'] + ' ' + row['endpoint']:<36}{row['count']:>7}{row['errors']:>7}"
+              f"{p50:>9}{p90:>9}{p99:>9}{ttfb:>10}{parse:>10}", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.tracer = RequestTracer(args.trace or settings.TRACE_PATH)
+    try:
+        return args.func(args)
+    except (AuthError, AntiBotError, ResponseError, PlanFormatError, SheetNotFoundError, UnsupportedFormatError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        if args.stats:
+            _print_stats(args.tracer)
+        args.tracer.close()
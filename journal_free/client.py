@@ -1,10 +1,23 @@
-import cloudscraper
-from bs4 import BeautifulSoup
-from openpyxl.reader.excel import load_workbook
-from openpyxl.workbook import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterable, Iterator, NamedTuple, TYPE_CHECKING
+from urllib.parse import urlsplit
 
 from journal_free import settings
+from journal_free.metrics import RequestTracer, Span
+from journal_free.parsers import get_parser
+from journal_free.policy import RequestPolicy
+from journal_free.readers import get_reader, InvalidRowError, PlanFormatError, SheetNotFoundError, \
+    UnsupportedFormatError
+from journal_free.session_store import SessionStore, export_session, import_session
+
+if TYPE_CHECKING:
+    from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+    from requests import Response, Session
 
 
 class AntiBotError(Exception):
@@ -20,35 +33,373 @@ class AuthError(Exception):
         return f"Authentication error.\n{self.msg}"
 
 
+class ResponseError(Exception):
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+    def __str__(self):
+        return f"Unexpected server response: {self.status_code}"
+
+
+class ResponseCache:
+    """
+    Parsed GET responses kept for a per-endpoint time to live.
+
+    :param dict ttl: Seconds to keep the responses of an endpoint path, endpoints not listed are not cached
+    :param tuple invalidate_all: POST endpoints that change the whole session state
+    """
+
+    def __init__(self, ttl: dict[str, float], invalidate_all: tuple[str, ...]) -> None:
+        self.ttl = ttl
+        self.invalidate_all = invalidate_all
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[tuple, tuple[float, "Response", dict | None]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def path(url: str) -> str:
+        return urlsplit(url).path or '/'
+
+    def get(self, key: tuple) -> tuple["Response", dict | None] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1], entry[2]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key: tuple, url: str, res: "Response", site: dict | None) -> None:
+        ttl = self.ttl.get(self.path(url), 0)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, res, site)
+
+    def invalidate(self, url: str | None = None) -> None:
+        """
+        Drops the cached responses of the url path, or all of them.
+
+        :param str url: (optional) Url the mutating request was sent to, None drops everything
+        """
+        with self._lock:
+            if url is None or self.path(url) in self.invalidate_all:
+                self._entries.clear()
+                return
+            path = self.path(url)
+            for key in [key for key in self._entries if self.path(key[0]) == path]:
+                del self._entries[key]
+
+    def is_cacheable(self, url: str) -> bool:
+        return self.ttl.get(self.path(url), 0) > 0
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self._entries))
+
+
+class JournalList(NamedTuple):
+    """
+    Terms and journals of the account as read from the journal list, the selected term is the one listed.
+    """
+    terms: tuple[dict, ...]
+    selected_term: dict | None
+    journals: tuple[dict, ...]
+
+
 class NZClient:
+    """
+    nz.ua client safe to share between threads.
+
+    Every request is sent on an HTTP session taken from the client pool, a
+    session carries one request at a time and goes back to the pool afterwards,
+    so the pool holds as many sessions as requests were ever in flight at once,
+    whatever threads send them. Sessions left idle for settings.SESSION_IDLE_TIMEOUT
+    are closed. All sessions share one cookie jar and one set of headers, so the
+    login, the antibot clearance and the User-Agent it is bound to are common to
+    every request. Reads return their results, the latest journal list is
+    additionally kept as an immutable snapshot replaced as a whole.
+
+    :param str username: nz.ua login
+    :param str password: nz.ua password
+    :param SessionStore session_store: (optional) Store of the authenticated session, per user by default
+    :param str base_url: (optional) Site url, settings.BASE_URL by default
+    :param RequestTracer tracer: (optional) Collector of the request timings
+    """
     BASE_URL = settings.BASE_URL
-    session = None
-    is_auth = False
-    user = None
-    terms: list | None = None
-    selected_term = None
-    journals: list | None = None
-    lessons_url: list | None = None
-
-    def __init__(self, username: str, password: str):
+
+    def __init__(self, username: str, password: str, session_store: SessionStore | None = None,
+                 base_url: str | None = None, tracer: RequestTracer | None = None):
         self.username = username
         self.password = password
-        self.session = cloudscraper.create_scraper(disableCloudflareV1=True)
+        if base_url is not None:
+            self.BASE_URL = base_url.rstrip('/')
+        self.is_auth = False
+        self.user: str | None = None
+        self.journal_list: JournalList | None = None
+        # Idle pooled sessions with the time they were returned, the most recently used last
+        self._idle_sessions: deque[tuple["Session", float]] = deque()
+        self._sessions_lock = threading.Lock()
+        self.sessions_created = 0
+        # Template of the thread sessions, its cookie jar and headers are the shared ones
+        self._main_session = self._create_session()
+        self.parser = get_parser()
+        self.cache = ResponseCache(settings.CACHE_TTL, settings.CACHE_INVALIDATE_ALL)
+        self.policy = RequestPolicy()
+        self.tracer = tracer if tracer is not None else RequestTracer()
+        if session_store is None and settings.REMEMBER_SESSION:
+            session_store = SessionStore(username)
+        self.session_store = session_store
 
     @staticmethod
-    def check_antibot(response: BeautifulSoup) -> None:
-        if response.find('title').text == 'Just a moment...':
-            raise Exception('Antibot error, try again')
+    def _create_session(cipher_suite: str | None = None) -> "Session":
+        import cloudscraper
+
+        return cloudscraper.create_scraper(disableCloudflareV1=True, cipherSuite=cipher_suite)
+
+    @contextmanager
+    def _session(self) -> Iterator["Session"]:
+        """
+        Lends a pooled session for one request.
+        """
+        with self._sessions_lock:
+            session = self._idle_sessions.pop()[0] if self._idle_sessions else None
+        if session is None:
+            # Same TLS fingerprint as the template, the clearance cookie is checked against it
+            session = self._create_session(self._main_session.cipherSuite)
+            session.cookies = self._main_session.cookies
+            session.headers = self._main_session.headers
+            with self._sessions_lock:
+                self.sessions_created += 1
+        try:
+            yield session
+        finally:
+            now = time.monotonic()
+            expired = []
+            with self._sessions_lock:
+                self._idle_sessions.append((session, now))
+                # The session just returned is never expired
+                while len(self._idle_sessions) > 1 and self._idle_sessions[0][1] < now - settings.SESSION_IDLE_TIMEOUT:
+                    expired.append(self._idle_sessions.popleft()[0])
+            for idle_session in expired:
+                idle_session.close()
+
+    @property
+    def session_stats(self) -> dict:
+        with self._sessions_lock:
+            return dict(created=self.sessions_created, idle=len(self._idle_sessions))
+
+    @property
+    def cookies(self):
+        return self._main_session.cookies
+
+    def export_state(self) -> dict:
+        """
+        Authenticated state of the client, picklable and JSON serializable, see from_state.
+        """
+        return dict(
+            username=self.username,
+            base_url=self.BASE_URL,
+            user=self.user,
+            is_auth=self.is_auth,
+            session=export_session(self._main_session),
+        )
+
+    @classmethod
+    def from_state(cls, state: dict, tracer: RequestTracer | None = None) -> "NZClient":
+        """
+        Creates a client sharing the login of an exported one, used by worker processes.
+
+        The new client has no session store, the stored session belongs to the exporting process.
+        """
+        client = cls(state['username'], '', session_store=None, base_url=state['base_url'], tracer=tracer)
+        client.session_store = None
+        client.load_session_state(state['session'])
+        client.user = state['user']
+        client.is_auth = state['is_auth']
+        return client
+
+    def load_session_state(self, state: dict) -> None:
+        """
+        Loads a state created by export_session.
+
+        The sessions are created again when the state has another cipher suite,
+        the antibot clearance is only accepted with the TLS fingerprint it was issued to.
+        """
+        cipher_suite = state.get('cipher_suite')
+        if cipher_suite and cipher_suite != self._main_session.cipherSuite:
+            self.close()
+            main_session = self._create_session(cipher_suite)
+            main_session.cookies = self._main_session.cookies
+            self._main_session = main_session
+        import_session(self._main_session, state)
+
+    def close(self) -> None:
+        """
+        Closes the connections of every pooled session, the cookies are kept.
+        """
+        with self._sessions_lock:
+            sessions = [session for session, _ in self._idle_sessions]
+            self._idle_sessions.clear()
+        for session in sessions + [self._main_session]:
+            session.close()
+
+    @property
+    def terms(self) -> tuple[dict, ...] | None:
+        return self.journal_list.terms if self.journal_list is not None else None
+
+    @property
+    def selected_term(self) -> dict | None:
+        return self.journal_list.selected_term if self.journal_list is not None else None
+
+    @property
+    def journals(self) -> tuple[dict, ...] | None:
+        return self.journal_list.journals if self.journal_list is not None else None
+
+    @property
+    def cache_stats(self) -> dict:
+        return self.cache.stats
+
+    @property
+    def policy_stats(self) -> dict:
+        return self.policy.stats
+
+    def request_stats(self) -> list[dict]:
+        """
+        Timing percentiles of the requests sent by the client per endpoint, see RequestTracer.summary.
+        """
+        return self.tracer.summary()
+
+    @staticmethod
+    def is_antibot_page(site: dict | None) -> bool:
+        return site is not None and site['title'] == 'Just a moment...'
+
+    @classmethod
+    def check_antibot(cls, site: dict | None) -> None:
+        if cls.is_antibot_page(site):
+            raise AntiBotError
+
+    @classmethod
+    def _is_blocked(cls, result: tuple["Response", dict | None]) -> bool:
+        res, site = result
+        return res.status_code in settings.RETRY_STATUSES or cls.is_antibot_page(site)
+
+    @staticmethod
+    def _retry_after(result: tuple["Response", dict | None]) -> float | None:
+        try:
+            return float(result[0].headers['Retry-After'])
+        except (KeyError, ValueError):
+            return None
+
+    def _send(self, method: str, url: str, page: str | None, **kwargs) -> tuple["Response", dict | None]:
+        endpoint = self.tracer.endpoint(url)
+        # A new pooled session is built before the span starts, the span only times the request
+        with self._session() as session:
+            started, start = time.time(), time.perf_counter()
+            try:
+                res = session.request(method, self.BASE_URL + url, **kwargs)
+            except Exception as e:
+                self.tracer.record(Span(started, method, endpoint, None, 0, 0.0, time.perf_counter() - start, 0.0,
+                                        error=type(e).__name__))
+                raise
+        site = None
+        parse = 0.0
+        if page is not None and res.status_code == 200:
+            parse_start = time.perf_counter()
+            site = self.parser.parse(page, res.content)
+            parse = time.perf_counter() - parse_start
+        # requests measures elapsed up to the parsed response headers, which is the time to first byte
+        self.tracer.record(Span(started, method, endpoint, res.status_code, len(res.content),
+                                res.elapsed.total_seconds(), time.perf_counter() - start, parse,
+                                blocked=self._is_blocked((res, site))))
+        return res, site
+
+    def _request(self, method: str, url: str, page: str | None = None, **kwargs) -> tuple["Response", dict | None]:
+        """
+        Sends a request to nz.ua and extracts the page fields of successful responses.
+
+        GET responses of the endpoints listed in settings.CACHE_TTL are served from
+        the cache while they are fresh, POST requests invalidate the cached pages
+        they change. Throttled responses and antibot challenges are retried by the
+        request policy, see RequestPolicy.
+
+        :param str method: HTTP method
+        :param str url: Url relative to BASE_URL
+        :param str page: (optional) Page type for the extraction layer, see BaseParser.PAGES
+        :return: Response and the extracted page fields, None if nothing was extracted
+        :raises AntiBotError: The challenge page is still served after the retries
+        """
+        key = None
+        if method == 'GET' and self.cache.is_cacheable(url):
+            key = (url, page, tuple(sorted((cookie.name, cookie.value) for cookie in self.cookies)))
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.tracer.record(Span(time.time(), method, self.tracer.endpoint(url), cached[0].status_code,
+                                        len(cached[0].content), 0.0, 0.0, 0.0, cached=True))
+                return cached
+        res, site = self.policy.execute(lambda: self._send(method, url, page, **kwargs),
+                                        self._is_blocked, self._retry_after)
+        if method == 'POST':
+            self.cache.invalidate(url)
+        if site is None:
+            return res, None
+        self.check_antibot(site)
+        if key is not None:
+            self.cache.set(key, url, res, site)
+        return res, site
+
+    def restore_session(self) -> bool:
+        """
+        Restores the stored session of the user and validates it with a single request.
+
+        The stored session is only deleted when nz.ua answers that it is no longer valid,
+        a network error keeps it for the next launch.
+
+        :return: True if the stored session is still authenticated
+        """
+        state = self.session_store.load() if self.session_store is not None else None
+        if state is None:
+            return False
+        self.load_session_state(state)
+        try:
+            res, site = self._request('GET', "/journal/list", page='journal_list')
+        except Exception:
+            # nz.ua could not be reached, nothing is known about the session
+            self.cookies.clear()
+            return False
+        # The challenge still served after the retries means the stored clearance is no longer accepted
+        expired = res.status_code == 403 or self.is_antibot_page(site) or \
+            (res.status_code == 200 and (site is None or site['user'] is None))
+        if expired:
+            self.session_store.clear()
+        if expired or site is None or site['user'] is None:
+            self.cookies.clear()
+            return False
+        self.user = site['user']
+        self.is_auth = True
+        return True
+
+    def logout(self) -> None:
+        if self.session_store is not None:
+            self.session_store.clear()
+        self.cookies.clear()
+        self.cache.invalidate()
+        self.user = None
+        self.is_auth = False
+        self.journal_list = None
 
     def authenticate(self) -> bool:
-        res = self.session.get(self.BASE_URL)
+        if self.restore_session():
+            return True
+        res, site = self._request('GET', '', page='login')
         if res.status_code != 200:
             if res.status_code == 403:
                 raise AntiBotError
             raise Exception(f"{res.status_code}: {res.text}")
-        site = BeautifulSoup(res.content, 'html.parser')
-        self.check_antibot(site)
-        csrf_token = site.find('input', {"name": "_csrf"}).get('value', None)
+        csrf_token = site['csrf']
         if csrf_token is None:
             return False
         data = {
@@ -57,155 +408,259 @@ class NZClient:
             'LoginForm[password]': self.password,
             'LoginForm[rememberMe]': 1,
         }
-        post = self.session.post(self.BASE_URL + "/login", data=data, headers=dict(Referer=self.BASE_URL))
-        post_resp = BeautifulSoup(post.content, 'html.parser')
-        self.check_antibot(post_resp)
-        alert = post_resp.find('div', class_='alert-danger')
-        if alert is None:
-
-            self.user = post_resp.find('div', class_='h-user-info').find('span').text
+        post, post_resp = self._request('POST', "/login", page='login_result', data=data, headers=dict(Referer=self.BASE_URL))
+        if post_resp is None:
+            raise Exception(f"{post.status_code}: {post.text}")
+        if post_resp['alert'] is None:
+            self.user = post_resp['user']
             self.is_auth = True
+            if self.session_store is not None:
+                self.session_store.save(self._main_session, self.user)
         else:
             self.user = None
             self.is_auth = False
-            raise AuthError(alert.find('li').text)
+            raise AuthError(post_resp['alert'])
         return self.is_auth
 
-    def get_journals(self):
-        if self.is_auth:
-            res = self.session.get(self.BASE_URL + "/journal/list")
-            site = BeautifulSoup(res.content, 'html.parser')
-            self.check_antibot(site)
-            self.terms = [{"name": term.text, "value": term['value']} for term in site.find(id="personalselectform-semester_id").find_all("option")]
-            self.selected_term = {
-                "name": site.find(id="personalselectform-semester_id").select_one('option[selected]').text,
-                "value": site.find(id="personalselectform-semester_id").select_one('option[selected]')['value'],
-            }
-            journals = []
-            for item in site.find("table", class_="journal-choose").find_all("tr"):
-                subj_obj = item.find_all("td")
-                subj_name = subj_obj[0].text
-                subj_classes = subj_obj[1].find_all("a")
-                journals.append({
-                    "subject": subj_name,
-                    "classes": [{"name": class_.text, "url": class_.get('href', None)} for class_ in subj_classes]
-                })
-            self.journals = journals
-
-    def change_term(self, term_id):
-        if self.is_auth:
-            res = self.session.get(self.BASE_URL + "/journal/list")
-            site = BeautifulSoup(res.content, 'html.parser')
-            self.check_antibot(site)
-            csrf_token = site.find('input', {"name": "_csrf"}).get('value', None)
-            data = {
-                '_csrf': csrf_token,
-                'semester_id': term_id,
-            }
-            res = self.session.post(
-                self.BASE_URL + "/site/semester-change",
-                data=data,
-                headers=dict(Referer=self.BASE_URL + "/journal/list")
-            )
-            self.get_journals()
+    def get_journals(self) -> JournalList | None:
+        """
+        Reads the terms and journals, the result also replaces the journal_list snapshot.
 
-    def find_lessons_url(self, url: str) -> None:
-        res = self.session.get(self.BASE_URL + url)
-        if res.status_code != 200:
+        :return: Journal list, None if not authenticated or the page could not be read
+        """
+        if not self.is_auth:
+            return None
+        res, site = self._request('GET', "/journal/list", page='journal_list')
+        if site is None:
+            return None
+        journal_list = JournalList(tuple(site['terms']), site['selected_term'], tuple(site['journals']))
+        self.journal_list = journal_list
+        return journal_list
+
+    def change_term(self, term_id) -> JournalList | None:
+        """
+        Selects the term of the session.
+
+        :return: Journal list of the selected term, see get_journals
+        """
+        if not self.is_auth:
+            return None
+        res, site = self._request('GET', "/journal/list", page='journal_list')
+        if site is None:
+            return None
+        data = {
+            '_csrf': site['csrf'],
+            'semester_id': term_id,
+        }
+        self._request(
+            'POST',
+            "/site/semester-change",
+            data=data,
+            headers=dict(Referer=self.BASE_URL + "/journal/list")
+        )
+        return self.get_journals()
+
+    def _fetch_lessons_page(self, url: str, page: int) -> list:
+        page_res, site = self._request('GET', url + '&page=' + str(page), page='lessons')
+        if site is None:
+            raise ResponseError(page_res.status_code)
+        return site['lessons']
+
+    def iter_lessons_pages(self, url: str, concurrency: int = settings.PAGE_CONCURRENCY) -> Iterator[list]:
+        """
+        Yields the edit urls of the journal lessons page by page, in page order.
+
+        The first page is reused from the pagination request, the remaining pages
+        are fetched concurrently, so every page is yielded as soon as it and the
+        pages before it are scraped.
+
+        :param str url: Journal url
+        :param int concurrency: (optional) Maximum number of pages fetched at once, 1 fetches them one by one
+        :raises ResponseError: The journal page could not be loaded
+        """
+        res, site = self._request('GET', url, page='lessons')
+        if site is None:
+            raise ResponseError(res.status_code)
+        page_count = site['page_count']
+        yield site['lessons']
+        if page_count < 2:
             return
-        site = BeautifulSoup(res.content, 'html.parser')
-        self.check_antibot(site)
-        pagination = site.find('ul', class_='pagination')
-        page_count = len(pagination.find_all('li')) - 2 if pagination is not None else 1
-        self.lessons_url = []
-        for i in range(page_count):
-            page_res = self.session.get(self.BASE_URL + url + '&page=' + str(i + 1))
-            site = BeautifulSoup(page_res.content, 'html.parser')
-            site_list_url = site.find('ul', class_='dz-container').find_all('a', class_="dz-edit modal-box")
-            for site_url in site_list_url:
-                self.lessons_url.append(site_url['href'])
+        workers = max(1, min(concurrency, page_count - 1))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(self._fetch_lessons_page, url, page) for page in range(2, page_count + 1)]
+            for future in futures:
+                yield future.result()
+        finally:
+            executor.shutdown(cancel_futures=True)
 
-    def add_topic(self, url: str, lesson_data: dict) -> int:
-        res = self.session.get(self.BASE_URL + url)
-        if res.status_code != 200:
-            return res.status_code
-        site = BeautifulSoup(res.content, 'html.parser')
-        self.check_antibot(site)
-        csrf_token = site.find('input', {"name": "_csrf"}).get('value', None)
-        homework_date = site.find(id="osvitaschedulereal-hometask_to").find_all('option')[0]['value']
+    def find_lessons_url(self, url: str, concurrency: int = settings.PAGE_CONCURRENCY) -> tuple[str, ...] | None:
+        """
+        Collects the edit urls of every journal lesson, see iter_lessons_pages.
+
+        :return: Lesson urls in journal order, None if the journal could not be loaded
+        """
+        try:
+            return tuple(lesson_url for page in self.iter_lessons_pages(url, concurrency) for lesson_url in page)
+        except ResponseError:
+            return None
+
+    @staticmethod
+    def _normalize(value) -> str:
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).replace('\r\n', '\n').strip()
+
+    @classmethod
+    def lesson_matches(cls, lesson: dict, lesson_data: dict) -> bool:
+        """
+        Checks whether the lesson already holds the plan row.
+
+        :param dict lesson: Lesson data read from the journal
+        :param dict lesson_data: Plan row
+        """
+        return all(cls._normalize(lesson.get(key)) == cls._normalize(lesson_data.get(key))
+                   for key in ('topic', 'number', 'homework'))
+
+    def _post_topic(self, url: str, site: dict, lesson_data: dict) -> int:
         data = {
-            '_csrf': csrf_token,
+            '_csrf': site['csrf'],
             'OsvitaScheduleReal[lesson_topic]': lesson_data.get('topic'),
             'OsvitaScheduleReal[lesson_number_in_plan]': lesson_data.get('number'),
             'OsvitaScheduleReal[hometask]': lesson_data.get('homework'),
-            'OsvitaScheduleReal[hometask_to]': homework_date,
+            'OsvitaScheduleReal[hometask_to]': site['hometask_to'],
             'OsvitaScheduleReal[second_personal_id]': '',
             'OsvitaScheduleReal[second_predmet_id]': '',
         }
-        response = self.session.post(self.BASE_URL + url, data=data, headers=dict(Referer=url))
+        response, _ = self._request('POST', url, data=data, headers=dict(Referer=url))
         return response.status_code
 
+    def add_topic(self, url: str, lesson_data: dict) -> int:
+        res, site = self._request('GET', url, page='lesson_form')
+        if res.status_code != 200:
+            return res.status_code
+        return self._post_topic(url, site, lesson_data)
+
+    def sync_topic(self, url: str, lesson_data: dict) -> tuple[int, bool]:
+        """
+        Submits the plan row only if the lesson content differs from it.
+
+        The current values are read from the same lesson form that is submitted,
+        so an unchanged lesson costs a single GET.
+
+        :return: Status code and whether the lesson was submitted
+        """
+        res, site = self._request('GET', url, page='lesson_form')
+        if res.status_code != 200:
+            return res.status_code, False
+        if self.lesson_matches(site, lesson_data):
+            return res.status_code, False
+        return self._post_topic(url, site, lesson_data), True
+
     def parse_lesson_data(self, url: str) -> dict:
-        response = self.session.get(self.BASE_URL + url)
+        response, site = self._request('GET', url, page='lesson_form')
         if response.status_code != 200:
             return dict(
                 status_code=response.status_code
             )
-        site = BeautifulSoup(response.content, 'html.parser')
-        self.check_antibot(site)
-        topic = site.find(id="osvitaschedulereal-lesson_topic").get_text()
-        number = site.find(id="osvitaschedulereal-lesson_number_in_plan").get('value', '')
-        homework = site.find(id="osvitaschedulereal-hometask").get_text()
         return dict(
             status_code=200,
-            topic=topic,
-            number=number,
-            homework=homework,
+            topic=site['topic'],
+            number=site['number'],
+            homework=site['homework'],
         )
 
 
+class PlanRow(NamedTuple):
+    number: object
+    topic: object
+    homework: object
+
+    def as_lesson_data(self) -> dict:
+        return {'topic': self.topic, 'number': self.number, 'homework': self.homework}
+
+
 class FileClient:
-    __data: list | None = None
+    """
+    Plan file reader.
+
+    The file is read by the reader registered for its extension and streamed:
+    validation keeps only the row count, the rows themselves are read again
+    lazily by rows(), so memory stays flat whatever the file size.
+
+    :param str file_path: Plan file, xlsx, ods, csv or json
+    :param str sheet: (optional) Sheet with the plan, the active sheet by default
+    :raises UnsupportedFormatError: The file extension has no reader
+    :raises SheetNotFoundError: The file has no such sheet
+    :raises PlanFormatError: The file could not be decoded or parsed
+    """
     valid: bool = False
 
-    def __init__(self, file_path: str):
-        document = load_workbook(file_path)
-        self.active_page: Worksheet = document.active
+    def __init__(self, file_path: str, sheet: str | None = None):
+        self.file_path = file_path
+        self.sheet = sheet
+        self.reader = get_reader(file_path)
+        self.hash = self._file_hash(file_path)
+        if sheet is not None:
+            self.hash = hashlib.sha256(f"{self.hash}:{sheet}".encode()).hexdigest()
+        self._count = 0
         self._parse_data()
 
-    def _parse_data(self) -> None:
-        self.__data = []
-        for row in self.active_page.rows:
-            try:
-                topic = row[1].value
-                number = row[0].value
-            except Exception:
-                self.valid = False
-                return
+    @staticmethod
+    def sheet_names(file_path: str) -> list[str]:
+        return get_reader(file_path).sheet_names(file_path)
 
-            if topic is None or number is None:
-                self.valid = False
-                return
-            try:
-                homework = row[2].value if row[2].value is not None else ""
-            except IndexError:
-                homework = ''
-            except Exception:
-                self.valid = False
-                return
-            self.__data.append({
-                'topic': topic,
-                'number': number,
-                'homework': homework,
-            })
-        if len(self.__data) == 0:
+    @staticmethod
+    def _file_hash(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 16), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _iter_values(self) -> Iterator[tuple]:
+        return self.reader.iter_values(self.file_path, self.sheet)
+
+    @staticmethod
+    def _parse_row(values: tuple) -> PlanRow | None:
+        if len(values) < 2 or values[0] is None or values[1] is None:
+            return None
+        homework = values[2] if len(values) > 2 and values[2] is not None else ''
+        return PlanRow(values[0], values[1], homework)
+
+    def _parse_data(self) -> None:
+        self._count = 0
+        try:
+            for values in self._iter_values():
+                if self._parse_row(values) is None:
+                    self.valid = False
+                    return
+                self._count += 1
+        except InvalidRowError:
             self.valid = False
             return
-        self.valid = True
+        self.valid = self._count > 0
+
+    def rows(self) -> Iterator[PlanRow]:
+        """
+        Streams the validated plan rows from the workbook.
+
+        :raises InvalidRowError: The file was changed since the validation and a row is no longer valid,
+            skipping it would shift the following rows to other lessons
+        """
+        if not self.valid:
+            return
+        for index, values in enumerate(self._iter_values()):
+            row = self._parse_row(values)
+            if row is None:
+                raise InvalidRowError(index, values, "has no lesson number or topic")
+            yield row
 
     @property
     def count(self) -> int:
-        return self.active_page.max_row
+        return self._count
 
     @property
     def is_valid(self) -> bool:
@@ -213,18 +668,29 @@ class FileClient:
 
     @property
     def validated_data(self) -> list:
-        return self.__data if self.valid else []
+        return [row.as_lesson_data() for row in self.rows()]
 
     @property
     def _data(self) -> list:
-        return self.__data
+        return self.validated_data
 
     @staticmethod
-    def create(file_name: str, data: list[dict]) -> "FileClient":
-        file = Workbook()
-        sheet: Worksheet = file.active
-        sheet.title = 'base'
-        for row in data:
-            sheet.append([row['number'], row['topic'], row['homework']])
+    def create(file_name: str, data: Iterable[dict]) -> None:
+        """
+        Writes the lessons to a plan workbook, rows are streamed to the file by a write-only workbook.
+
+        :param str file_name: xlsx file to write
+        :param data: Lessons with topic, number and homework
+        """
+        from openpyxl.workbook import Workbook
+
+        file = Workbook(write_only=True)
+        sheet: "WriteOnlyWorksheet" = file.create_sheet('base')
+        try:
+            for row in data:
+                sheet.append([row['number'], row['topic'], row['homework']])
+        except BaseException:
+            # Finishes the half written sheet, its temp file is removed by openpyxl at exit
+            sheet.close()
+            raise
         file.save(file_name)
-        return FileClient(file_name)
@@ -0,0 +1,414 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Executor, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from journal_free import settings
+from journal_free.checkpoint import Checkpoint
+from journal_free.client import NZClient, FileClient, AntiBotError, ResponseError, InvalidRowError, \
+    PlanFormatError
+from journal_free.policy import AdaptiveLimiter
+
+
+class LessonStatus:
+    PENDING = "pending"
+    SUCCESS = "success"
+    SKIPPED = "skipped"
+    RESUMED = "resumed"
+    ERROR = "error"
+
+
+class FillStatus:
+    ERROR = "error"
+    NO_LESSONS = "no lessons"
+    INVALID_PLAN = "invalid plan"
+    CANCELLED = "cancelled"
+    SUCCESS = "success"
+
+
+class Progress(NamedTuple):
+    """
+    Snapshot of a running fill or export, an export counts the lessons it read as submitted.
+    """
+    discovered: int
+    expected: int | None
+    submitted: int
+    skipped: int
+    resumed: int
+    failed: int
+    elapsed: float
+    throughput: float
+    eta: float | None
+
+    @property
+    def done(self) -> int:
+        return self.submitted + self.skipped + self.resumed + self.failed
+
+
+class BaseEngine:
+    """
+    Progress reporting and cooperative cancellation shared by the engines.
+
+    The progress callback is called from the worker threads at most once per
+    settings.PROGRESS_INTERVAL, and once more when the run ends.
+
+    :param progress: (optional) Callback receiving Progress snapshots
+    """
+
+    def __init__(self, progress: Callable[[Progress], None] | None = None) -> None:
+        self.on_progress = progress
+        self.expected: int | None = None
+        self._cancelled = threading.Event()
+        self._started_at: float | None = None
+        self._reported_at = 0.0
+        self._report_lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """
+        Stops scheduling new lessons, the lessons in flight are finished and the run returns CANCELLED.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started_at if self._started_at is not None else 0.0
+
+    def _counters(self) -> tuple[int, int, int, int, int]:
+        """ discovered, submitted, skipped, resumed, failed """
+        raise NotImplementedError
+
+    def progress(self) -> Progress:
+        discovered, submitted, skipped, resumed, failed = self._counters()
+        elapsed = self.elapsed
+        # Resumed lessons cost no requests, they would inflate the throughput
+        processed = submitted + skipped + failed
+        throughput = processed / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.expected is not None and throughput > 0:
+            eta = max(0, self.expected - processed - resumed) / throughput
+        return Progress(discovered, self.expected, submitted, skipped, resumed, failed, elapsed, throughput, eta)
+
+    def _start(self) -> None:
+        self._started_at = time.monotonic()
+        self._reported_at = 0.0
+
+    def _report(self, force: bool = False) -> None:
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        with self._report_lock:
+            if not force and now - self._reported_at < settings.PROGRESS_INTERVAL:
+                return
+            self._reported_at = now
+        try:
+            self.on_progress(self.progress())
+        except Exception:
+            # The display of the progress failing must not stop the run
+            pass
+
+
+class SubmissionEngine(BaseEngine):
+    """
+    Submits lesson topics to the journal with a bounded number of lessons in flight.
+
+    Several engines can share one concurrency budget by passing the same executor
+    and limiter, the executor must have at least as many workers as the limiter maximum.
+
+    :param NZClient client: Authenticated client, its pooled sessions are shared by the worker threads
+    :param int concurrency: (optional) Lessons submitted at once, the initial limit when adaptive
+    :param bool sync: (optional) Skip lessons whose journal content already matches the plan row
+    :param Checkpoint checkpoint: (optional) Run checkpoint, confirmed lessons are not submitted again
+    :param Executor executor: (optional) Shared executor the lessons are submitted on
+    :param AdaptiveLimiter limiter: (optional) Shared limiter bounding the lessons in flight
+    :param bool adaptive: (optional) Tune the concurrency to the server latency, see AdaptiveLimiter
+    :param progress: (optional) Callback receiving Progress snapshots, see BaseEngine
+    """
+
+    def __init__(self, client: NZClient, concurrency: int = settings.SUBMIT_CONCURRENCY, sync: bool = False,
+                 checkpoint: Checkpoint | None = None, executor: Executor | None = None,
+                 limiter: AdaptiveLimiter | None = None, adaptive: bool = settings.ADAPTIVE_CONCURRENCY,
+                 progress: Callable[[Progress], None] | None = None) -> None:
+        super().__init__(progress)
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.sync = sync
+        self.checkpoint = checkpoint
+        self.executor = executor
+        if limiter is None:
+            limiter = AdaptiveLimiter(self.concurrency) if adaptive else AdaptiveLimiter.fixed(self.concurrency)
+        self.limiter = limiter
+        self.lessons: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+
+    def run(self, lessons_url: Iterable[str], rows: Iterable[dict]) -> bool:
+        """
+        Submits the plan rows to the lessons in order and waits for all of them.
+
+        Both iterables are consumed lazily, so lessons are submitted while the
+        urls are still being discovered. New lessons stop being scheduled after
+        the first failed one or once the run is cancelled, the lessons in flight
+        are always waited for. With a checkpoint the lessons confirmed by a previous
+        run are skipped, and the checkpoint is cleared once the run succeeds.
+
+        :param lessons_url: Lesson urls in journal order
+        :param rows: Plan rows in lesson order
+        :return: True if every scheduled lesson was saved
+        """
+        self._failed.clear()
+        self._start()
+        executor = self.executor if self.executor is not None else \
+            ThreadPoolExecutor(max_workers=self.limiter.maximum)
+        futures = []
+        discovered = 0
+        try:
+            for index, (lesson_data, url) in enumerate(zip(rows, lessons_url)):
+                discovered += 1
+                if self._failed.is_set() or self.cancelled:
+                    break
+                if self.checkpoint is not None and self.checkpoint.is_confirmed(index, url):
+                    self._set_status(url, index=index, status=LessonStatus.RESUMED, status_code=None)
+                    self._report()
+                    continue
+                started = self.limiter.acquire()
+                if self._failed.is_set() or self.cancelled:
+                    self.limiter.release(started)
+                    break
+                self._set_status(url, index=index, status=LessonStatus.PENDING, status_code=None)
+                future = executor.submit(self._submit, index, url, lesson_data, started)
+                future.add_done_callback(lambda done, started=started: self._release_cancelled(done, started))
+                futures.append(future)
+            else:
+                # Every lesson of the journal with a plan row is known now
+                self.expected = discovered
+        finally:
+            wait(futures)
+            if executor is not self.executor:
+                executor.shutdown()
+            self._report(force=True)
+        if self._failed.is_set() or self.cancelled:
+            return False
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+        return True
+
+    def fill(self, journal_url: str, file: FileClient, resume: bool = True) -> str:
+        """
+        Fills the journal from the plan file, lessons are submitted while the journal pages are scraped.
+
+        :param str journal_url: Journal url
+        :param FileClient file: Validated plan file
+        :param bool resume: (optional) Resume an interrupted run of the same journal and plan
+        :return: FillStatus value, INVALID_PLAN if a row became invalid since the validation
+        """
+        self.expected = file.count
+        pages = self.client.iter_lessons_pages(journal_url)
+        if resume and self.checkpoint is None:
+            self.checkpoint = Checkpoint(journal_url, file.hash)
+        try:
+            lessons_url = (lesson_url for page in pages for lesson_url in page)
+            is_saved = self.run(lessons_url, (row.as_lesson_data() for row in file.rows()))
+        except (ResponseError, AntiBotError):
+            return FillStatus.ERROR
+        except (InvalidRowError, PlanFormatError):
+            # The plan file was changed after it was validated, the lessons saved so far are kept in the checkpoint
+            return FillStatus.INVALID_PLAN
+        finally:
+            pages.close()
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+                self.checkpoint = None
+        if not is_saved:
+            return FillStatus.ERROR if self._failed.is_set() else FillStatus.CANCELLED
+        elif self.total == 0:
+            return FillStatus.NO_LESSONS
+        return FillStatus.SUCCESS
+
+    def _submit(self, index: int, url: str, lesson_data: dict, started: float) -> bool:
+        ok = False
+        try:
+            ok = self._send(index, url, lesson_data)
+        finally:
+            self.limiter.release(started, ok=ok)
+        self._report()
+        return ok
+
+    def _release_cancelled(self, done: Future, started: float) -> None:
+        # _submit releases the slot itself, a lesson cancelled before it started never ran it
+        if done.cancelled():
+            self.limiter.release(started, ok=False)
+
+    def _send(self, index: int, url: str, lesson_data: dict) -> bool:
+        try:
+            if self.sync:
+                status_code, is_submitted = self.client.sync_topic(url, lesson_data)
+            else:
+                status_code, is_submitted = self.client.add_topic(url, lesson_data), True
+        except Exception as e:
+            self._set_status(url, status=LessonStatus.ERROR, error=str(e))
+            self._failed.set()
+            return False
+        if status_code == 200:
+            status = LessonStatus.SUCCESS if is_submitted else LessonStatus.SKIPPED
+            self._set_status(url, status=status, status_code=status_code)
+            if self.checkpoint is not None:
+                try:
+                    self.checkpoint.confirm(index, url)
+                except Exception:
+                    # The lesson is saved, a restarted run only submits it again
+                    pass
+            return True
+        self._set_status(url, status=LessonStatus.ERROR, status_code=status_code)
+        self._failed.set()
+        return False
+
+    def _set_status(self, url: str, **kwargs) -> None:
+        with self._lock:
+            self.lessons.setdefault(url, {}).update(kwargs)
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return sum(1 for lesson in self.lessons.values() if lesson['status'] == status)
+
+    def _counters(self) -> tuple[int, int, int, int, int]:
+        counts = dict.fromkeys((LessonStatus.SUCCESS, LessonStatus.SKIPPED, LessonStatus.RESUMED, LessonStatus.ERROR), 0)
+        with self._lock:
+            discovered = len(self.lessons)
+            for lesson in self.lessons.values():
+                if lesson['status'] in counts:
+                    counts[lesson['status']] += 1
+        return discovered, *counts.values()
+
+    @property
+    def total(self) -> int:
+        return len(self.lessons)
+
+    @property
+    def submitted(self) -> int:
+        return self.count(LessonStatus.SUCCESS)
+
+    @property
+    def skipped(self) -> int:
+        return self.count(LessonStatus.SKIPPED)
+
+    @property
+    def resumed(self) -> int:
+        return self.count(LessonStatus.RESUMED)
+
+    @property
+    def failed(self) -> int:
+        return self.count(LessonStatus.ERROR)
+
+
+class ExportEngine(BaseEngine):
+    """
+    Reads the journal lessons back into a plan workbook.
+
+    Lesson pages are read concurrently while the journal pages are still being
+    scraped, rows are yielded in journal order and written by a write-only
+    workbook, so only the lessons in flight are kept in memory.
+
+    :param NZClient client: Authenticated client, its pooled sessions are shared by the worker threads
+    :param int concurrency: (optional) Lesson pages read at once, the initial limit when adaptive
+    :param bool adaptive: (optional) Tune the concurrency to the server latency, see AdaptiveLimiter
+    :param progress: (optional) Callback receiving Progress snapshots, see BaseEngine
+    :param Executor executor: (optional) Shared executor the lesson pages are read on,
+        with at least as many workers as the limiter maximum
+    """
+
+    def __init__(self, client: NZClient, concurrency: int = settings.EXPORT_CONCURRENCY,
+                 adaptive: bool = settings.ADAPTIVE_CONCURRENCY,
+                 progress: Callable[[Progress], None] | None = None, executor: Executor | None = None) -> None:
+        super().__init__(progress)
+        self.client = client
+        self.executor = executor
+        self.concurrency = max(1, concurrency)
+        self.limiter = AdaptiveLimiter(self.concurrency) if adaptive else AdaptiveLimiter.fixed(self.concurrency)
+        self.total = 0
+        self.discovered = 0
+
+    def _read_lesson(self, url: str) -> dict:
+        started = self.limiter.acquire()
+        try:
+            data = self.client.parse_lesson_data(url)
+        except Exception:
+            self.limiter.release(started, ok=False)
+            raise
+        status_code = data.pop('status_code')
+        self.limiter.release(started, ok=status_code == 200)
+        if status_code != 200:
+            raise ResponseError(status_code)
+        return data
+
+    def iter_lessons(self, journal_url: str) -> Iterator[dict]:
+        """
+        Yields the topic, number and homework of every journal lesson in journal order.
+
+        :param str journal_url: Journal url
+        :raises ResponseError: A journal or lesson page could not be loaded
+        :raises CancelledError: The export was cancelled, the lesson pages in flight are finished first
+        """
+        self.discovered = 0
+        pages = self.client.iter_lessons_pages(journal_url)
+        executor = self.executor if self.executor is not None else \
+            ThreadPoolExecutor(max_workers=self.limiter.maximum)
+        in_flight = deque()
+        try:
+            for page in pages:
+                for url in page:
+                    self._check_cancelled()
+                    self.discovered += 1
+                    in_flight.append(executor.submit(self._read_lesson, url))
+                    while len(in_flight) > self.limiter.maximum:
+                        yield in_flight.popleft().result()
+            self.expected = self.discovered
+            while in_flight:
+                self._check_cancelled()
+                yield in_flight.popleft().result()
+        finally:
+            pages.close()
+            for future in in_flight:
+                future.cancel()
+            wait(in_flight)
+            if executor is not self.executor:
+                executor.shutdown()
+
+    def _check_cancelled(self) -> None:
+        if self.cancelled:
+            raise CancelledError
+
+    def _counters(self) -> tuple[int, int, int, int, int]:
+        return self.discovered, self.total, 0, 0, 0
+
+    def export(self, journal_url: str, file_path: str) -> str:
+        """
+        Exports the journal to a plan workbook.
+
+        :param str journal_url: Journal url
+        :param str file_path: xlsx file to write, it is not written if the export fails or is cancelled
+        :return: FillStatus value
+        """
+        self.total = 0
+        self.expected = None
+        self._start()
+
+        def rows() -> Iterator[dict]:
+            for lesson in self.iter_lessons(journal_url):
+                self.total += 1
+                self._report()
+                yield lesson
+
+        try:
+            FileClient.create(file_path, rows())
+        except (ResponseError, AntiBotError):
+            return FillStatus.ERROR
+        except CancelledError:
+            return FillStatus.CANCELLED
+        finally:
+            self._report(force=True)
+        return FillStatus.SUCCESS if self.total else FillStatus.NO_LESSONS
@@ -1,37 +1,99 @@
+import time
+
+# Taken before the heavy imports below so the startup report includes them
+STARTED_AT = time.perf_counter()
+
 import sys
-from typing import Callable
+from concurrent.futures import Future
+from typing import Callable, Hashable
 
-from PySide6.QtCore import Qt, QThread, Signal, Slot
+from PySide6.QtCore import Qt, QObject, QTimer, Signal, Slot
 from PySide6.QtGui import QPainterPath, QPainter
-from PySide6.QtWidgets import QApplication, QMainWindow, QWidget
+from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QFileDialog
+
+from journal_free import settings
+# Imported through the package, the engines catch the errors of journal_free.client
+from journal_free.client import NZClient, FileClient, JournalList, PlanFormatError, UnsupportedFormatError
+from journal_free.engine import SubmissionEngine, ExportEngine
+from journal_free.scheduler import RequestScheduler, Priority
+from journal_free.session_store import SessionStore
+from journal_free.views.base import WindowSetup, HeaderComponent, FooterComponent, MainComponent, Modal, OperationStatus
+from journal_free.views.login import LoginWindow
+
+
+class StartupTimer:
+    """
+    Startup phases report printed to stderr when settings.STARTUP_TIMING is on.
+
+    :param float started_at: perf_counter value the startup began at
+    """
+
+    def __init__(self, started_at: float) -> None:
+        self.started_at = started_at
+        self.last = started_at
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
 
-from client import NZClient, FileClient
-from views.base import WindowSetup, HeaderComponent, FooterComponent, MainComponent, Modal, OperationStatus
-from views.journal import JournalWindow
-from views.login import LoginWindow
-from views.main import MainWindow
+    @property
+    def total(self) -> float:
+        return (self.last - self.started_at) * 1000
 
+    def report(self) -> None:
+        lines = [f"  {phase:<24}{duration:8.1f} ms" for phase, duration in self.phases]
+        lines.append(f"  {'total':<24}{self.total:8.1f} ms")
+        if self.total > settings.STARTUP_BUDGET_MS:
+            lines.append(f"  over the {settings.STARTUP_BUDGET_MS:.0f} ms startup budget")
+        print("Startup timing:", *lines, sep="\n", file=sys.stderr)
 
-class RequestWorker(QThread):
-    finished = Signal(str)
 
-    def __init__(self, parent: QWidget, func: Callable):
+# Scheduler key of the calls changing the NZClient state (login, journals, term), they never overlap
+CLIENT_KEY = 'client'
+
+
+class RequestWorker(QObject):
+    """
+    Runs a call on the shared RequestScheduler, the signals are delivered on the GUI thread.
+    """
+    finished = Signal(object)
+    progress = Signal(object)
+
+    def __init__(self, parent: QWidget, func: Callable, scheduler: RequestScheduler,
+                 priority: Priority = Priority.INTERACTIVE, key: Hashable | None = CLIENT_KEY,
+                 supersede: bool = False):
         super().__init__(parent)
         self.func = func
+        self.scheduler = scheduler
+        self.priority = priority
+        self.key = key
+        self.supersede = supersede
+
+    def start(self) -> Future:
+        return self.scheduler.submit(self.run, priority=self.priority, key=self.key, supersede=self.supersede)
 
     def run(self):
         try:
             res = self.func()
-            self.finished.emit(res)
         except Exception as e:
-            self.finished.emit(f"Error: {e}")
+            res = f"Error: {e}"
+        try:
+            self.finished.emit(res)
+        except RuntimeError:
+            # The view the worker belonged to was closed while the call ran
+            pass
 
 
 class BaseWindow(QMainWindow):
     nz_client: NZClient
+    fill_engine: SubmissionEngine | None = None
+    export_engine: ExportEngine | None = None
 
     def __init__(self):
         super().__init__()
+        self.scheduler = RequestScheduler()
         base = WindowSetup(self)
         self._load_header(base)
         self._load_main(base)
@@ -57,6 +119,29 @@ class BaseWindow(QMainWindow):
         self.login = LoginWindow(self.main)
         self.login.set_login_event(self.login_event)
         self.main.addWidget(self.login)
+        username = SessionStore.last_username()
+        if username is not None:
+            self.login.set_username(username)
+            self.login.set_enabled_form(False)
+            self.login.loading(True)
+            QTimer.singleShot(0, lambda: self.restore_session(username))
+
+    def restore_session(self, username: str) -> None:
+        worker = RequestWorker(parent=self.login, func=lambda: self.restore_session_request(username),
+                               scheduler=self.scheduler)
+        worker.finished.connect(self.restore_session_finished)
+        worker.start()
+
+    def restore_session_request(self, username: str) -> bool:
+        self.nz_client = NZClient(username, '')
+        return self.nz_client.restore_session()
+
+    def restore_session_finished(self, result: str) -> None:
+        if self.nz_client.is_auth:
+            self.login_event_finished(result)
+        else:
+            self.login.set_enabled_form(True)
+            self.login.loading(False)
 
     def login_event(self, event: object) -> None:
         username = self.login.username
@@ -68,7 +153,7 @@ class BaseWindow(QMainWindow):
         self.nz_client = NZClient(username, password)
         self.login.set_enabled_form(False)
         self.login.loading(True)
-        worker = RequestWorker(parent=self.login, func=self.nz_client.authenticate)
+        worker = RequestWorker(parent=self.login, func=self.nz_client.authenticate, scheduler=self.scheduler)
         worker.finished.connect(self.login_event_finished)
         worker.start()
 
@@ -82,7 +167,7 @@ class BaseWindow(QMainWindow):
             del self.login
             self.show_main_view()
         else:
-            dialog = Modal(result, err=True)
+            dialog = Modal(str(result), err=True)
             dialog.exec()
 
     def logout_event(self):
@@ -93,22 +178,28 @@ class BaseWindow(QMainWindow):
                     widget.deleteLater()
             self.header.set_user(None)
             self.main.resetStyle()
+            self.nz_client.logout()
             del self.nz_client
             self.show_login_view()
 
     def show_main_view(self) -> None:
+        from journal_free.views.main import MainWindow
+
         self.header.set_logout_enabled(False)
         self.main_view = MainWindow(self.main)
         self.main.addWidget(self.main_view)
         self.main_view.loading()
-        worker = RequestWorker(parent=self.main_view, func=self.nz_client.get_journals)
+        worker = RequestWorker(parent=self.main_view, func=self.nz_client.get_journals, scheduler=self.scheduler)
         worker.finished.connect(self.main_view_finished)
         worker.start()
 
-    def main_view_finished(self, result: str) -> None:
+    def main_view_finished(self, result: JournalList | str | None) -> None:
         self.header.set_logout_enabled(True)
-        self.main_view.load_terms(self.nz_client.terms, self.nz_client.selected_term)
-        self.main_view.load_journals(self.nz_client.journals, self.open_journal)
+        journal_list = result if isinstance(result, JournalList) else self.nz_client.journal_list
+        if journal_list is None:
+            journal_list = JournalList((), None, ())
+        self.main_view.load_terms(journal_list.terms or None, journal_list.selected_term)
+        self.main_view.load_journals(journal_list.journals, self.open_journal)
         self.main_view.termChangeEvent(self.change_term)
         self.main_view.termChangeEnabled(True)
 
@@ -117,7 +208,9 @@ class BaseWindow(QMainWindow):
         self.header.set_logout_enabled(False)
         term_id = self.main_view.get_term_value(index)
         self.main_view.loading()
-        worker = RequestWorker(parent=self.main_view, func=lambda: self.nz_client.change_term(term_id))
+        # Only the latest of several quick term switches is worth loading
+        worker = RequestWorker(parent=self.main_view, func=lambda: self.nz_client.change_term(term_id),
+                               scheduler=self.scheduler, supersede=True)
         worker.finished.connect(self.main_view_finished)
         worker.start()
 
@@ -129,11 +222,15 @@ class BaseWindow(QMainWindow):
         return handler
 
     def show_journal_view(self, subject: str, class_: dict) -> None:
+        from journal_free.views.journal import JournalWindow
+
         self.journal_view = JournalWindow(self.main)
         self.journal_view.setBackEvent(self.back_to_main_view)
         self.main.addWidget(self.journal_view)
         self.journal_view.load_content(subject, class_, self.nz_client.selected_term['name'])
         self.journal_view.setFillEvent(self.fill_journal)  # TODO: check
+        self.journal_view.setExportEvent(self.export_journal)
+        self.journal_view.setStopEvent(self.stop_journal_operation)
 
     def back_to_main_view(self) -> None:
         self.journal_view.deleteLater()
@@ -145,93 +242,120 @@ class BaseWindow(QMainWindow):
             dialog = Modal('Выберите файл')
             dialog.exec()
             return
-        file = FileClient(self.journal_view.file_path)
+        try:
+            file = FileClient(self.journal_view.file_path)
+        except UnsupportedFormatError:
+            dialog = Modal('Формат файла не поддерживается')
+            dialog.exec()
+            return
+        except PlanFormatError:
+            dialog = Modal('Файл повреждён или не соответствует своему формату.\nСохраните план заново и выберите его ещё раз.')
+            dialog.exec()
+            return
         if not file.valid:
             dialog = Modal('Шаблон файла не верный.\nТема или номер урока не могут быть пустыми.\nТак же возможно есть пропуски в строках или\nсимволы ниже основной таблицы.')
             dialog.exec()
             return
         self.journal_view.set_enabled(False)
         self.journal_view.loading(True)
+        self.journal_view.running(True)
         self.header.set_logout_enabled(False)
-        worker = RequestWorker(parent=self.journal_view, func=lambda: self.fill_journal_request(file))
+        journal_url = self.journal_view.journal_url
+        worker = RequestWorker(parent=self.journal_view, func=lambda: self.fill_engine.fill(journal_url, file),
+                               scheduler=self.scheduler, priority=Priority.BULK, key=None)
+        self.fill_engine = SubmissionEngine(self.nz_client, sync=self.journal_view.sync_enabled,
+                                            executor=self.scheduler.executor(Priority.BULK),
+                                            progress=worker.progress.emit)
+        worker.progress.connect(self.journal_view.show_progress)
         worker.finished.connect(self.fill_journal_finished)
         worker.start()
 
-    def fill_journal_request(self, file: FileClient) -> str | None:
-        self.nz_client.find_lessons_url(self.journal_view.journal_url)
-        index = 0
-        if self.nz_client.lessons_url is None:
-            return OperationStatus.ERROR
-        elif self.nz_client.lessons_url == 0:
-            return OperationStatus.NO_LESSONS
-        for lesson_url in self.nz_client.lessons_url:
-            if index < file.count:
-                status = self.nz_client.add_topic(lesson_url, file.validated_data[index])
-                if status != 200:
-                    return OperationStatus.ERROR
-            index += 1
-        return OperationStatus.SUCCESS
+    def stop_journal_operation(self) -> None:
+        self.journal_view.stopping()
+        for engine in (self.fill_engine, self.export_engine):
+            if engine is not None:
+                engine.cancel()
 
     def fill_journal_finished(self, result) -> None:
         self.journal_view.set_enabled(True)
         self.journal_view.loading(False)
+        self.journal_view.running(False)
         self.header.set_logout_enabled(True)
 
         if result == OperationStatus.SUCCESS:
-            dialog = Modal('Журнал заполнен успешно')
+            message = ['Журнал заполнен успешно']
+            if self.fill_engine.resumed:
+                message.append(f'Продолжено после прерванного запуска, уже заполнено: {self.fill_engine.resumed}')
+            if self.fill_engine.skipped:
+                message.append(f'Пропущено уроков без изменений: {self.fill_engine.skipped}')
+            dialog = Modal('\n'.join(message))
             dialog.exec()
 
         elif result == OperationStatus.NO_LESSONS:
             dialog = Modal('На nz.ua не создано ниодного урока', err=True)
             dialog.exec()
 
+        elif result == OperationStatus.CANCELLED:
+            dialog = Modal(f'Заполнение остановлено, заполнено уроков: {self.fill_engine.submitted + self.fill_engine.skipped}.\n'
+                           'Повторный запуск продолжит заполнение с места остановки.')
+            dialog.exec()
+
+        elif result == OperationStatus.INVALID_PLAN:
+            dialog = Modal('Файл изменился во время заполнения, строка без темы или номера урока.\n'
+                           'Исправьте файл и запустите заполнение снова.', err=True)
+            dialog.exec()
+
         elif result == OperationStatus.ERROR:
-            dialog = Modal('Ошибка сервера.', err=True)
+            dialog = Modal('Ошибка сервера.\nПовторный запуск продолжит заполнение с места остановки.', err=True)
             dialog.exec()
 
-    # def parse_journal(self) -> None:
-    #     self.journal_view.set_enabled(False)
-    #     self.journal_view.loading(True)
-    #     self.header.set_logout_enabled(False)
-    #     worker = RequestWorker(parent=self.journal_view, func=self.parse_journal_request)
-    #     worker.finished.connect(self.parse_journal_finished)
-    #     worker.start()
-    #
-    # def parse_journal_request(self) -> str:
-    #     self.nz_client.find_lessons_url(self.journal_view.journal_url)
-    #     if self.nz_client.lessons_url is None:
-    #         return OperationStatus.ERROR
-    #     elif self.nz_client.lessons_url == 0:
-    #         return OperationStatus.NO_LESSONS
-    #     journal_data = []
-    #     for lesson_url in self.nz_client.lessons_url:
-    #         _data = self.nz_client.parse_lesson_data(lesson_url)
-    #         if _data['status_code'] != 200:
-    #             return OperationStatus.ERROR
-    #         _data.pop('status_code')
-    #         # if _data['topic'] == '' and _data['number'] == '' and _data['homework'] == '':
-    #         #     break
-    #         journal_data.append(_data)
-    #     file = FileClient.create(f"{self.journal_view.class_}.xlsx", journal_data)
-    #     return OperationStatus.SUCCESS
-    #
-    # def parse_journal_finished(self, result: str):
-    #     self.journal_view.set_enabled(True)
-    #     self.journal_view.loading(False)
-    #     self.header.set_logout_enabled(True)
-    #
-    #     if result == OperationStatus.SUCCESS:
-    #         dialog = Modal('Журнал скачан успешно')
-    #         dialog.exec()
-    #
-    #     elif result == OperationStatus.NO_LESSONS:
-    #         dialog = Modal('На nz.ua не создано ниодного урока', err=True)
-    #         dialog.exec()
-    #
-    #     elif result == OperationStatus.ERROR:
-    #         dialog = Modal('Ошибка сервера.', err=True)
-    #         dialog.exec()
+        else:
+            dialog = Modal(str(result), err=True)
+            dialog.exec()
 
+    def export_journal(self) -> None:
+        file_path, _ = QFileDialog.getSaveFileName(self, "Сохранение журнала", f"{self.journal_view.class_}.xlsx",
+                                                   "Excel (*.xlsx)")
+        if not file_path:
+            return
+        self.journal_view.set_enabled(False)
+        self.journal_view.export_loading(True)
+        self.journal_view.running(True)
+        self.header.set_logout_enabled(False)
+        journal_url = self.journal_view.journal_url
+        worker = RequestWorker(parent=self.journal_view, func=lambda: self.export_engine.export(journal_url, file_path),
+                               scheduler=self.scheduler, priority=Priority.BULK, key=None)
+        self.export_engine = ExportEngine(self.nz_client, executor=self.scheduler.executor(Priority.BULK),
+                                          progress=worker.progress.emit)
+        worker.progress.connect(self.journal_view.show_progress)
+        worker.finished.connect(self.export_journal_finished)
+        worker.start()
+
+    def export_journal_finished(self, result: str) -> None:
+        self.journal_view.set_enabled(True)
+        self.journal_view.export_loading(False)
+        self.journal_view.running(False)
+        self.header.set_logout_enabled(True)
+
+        if result == OperationStatus.SUCCESS:
+            dialog = Modal('Журнал скачан успешно')
+            dialog.exec()
+
+        elif result == OperationStatus.NO_LESSONS:
+            dialog = Modal('На nz.ua не создано ниодного урока', err=True)
+            dialog.exec()
+
+        elif result == OperationStatus.CANCELLED:
+            dialog = Modal('Скачивание остановлено, файл не сохранён')
+            dialog.exec()
+
+        elif result == OperationStatus.ERROR:
+            dialog = Modal('Ошибка сервера.', err=True)
+            dialog.exec()
+
+        else:
+            dialog = Modal(result, err=True)
+            dialog.exec()
 
     def paintEvent(self, event):
         path = QPainterPath()
@@ -249,6 +373,11 @@ class BaseWindow(QMainWindow):
         painter.drawRoundedRect(self.rect(), 15, 15)
 
     def _close_program(self):
+        # A fill in progress keeps its checkpoint and is resumed by the next run
+        for engine in (self.fill_engine, self.export_engine):
+            if engine is not None:
+                engine.cancel()
+        self.scheduler.shutdown(wait=False, cancel_pending=True)
         self.close()
 
     def _minimize_window(self):
@@ -256,7 +385,14 @@ class BaseWindow(QMainWindow):
 
 
 if __name__ == "__main__":
+    timer = StartupTimer(STARTED_AT)
+    timer.mark('imports')
     app = QApplication(sys.argv)
+    timer.mark('application')
     window = BaseWindow()
+    timer.mark('window')
     window.show()
+    timer.mark('show')
+    if settings.STARTUP_TIMING:
+        QTimer.singleShot(0, lambda: (timer.mark('first event loop tick'), timer.report()))
     sys.exit(app.exec())
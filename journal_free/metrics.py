@@ -0,0 +1,122 @@
+import json
+import math
+import threading
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
+from journal_free import settings
+
+
+class Span(NamedTuple):
+    """
+    Timing of one request attempt, times are in seconds, ``total`` includes the ``parse`` time.
+    """
+    started: float
+    method: str
+    endpoint: str
+    status: int | None
+    bytes: int
+    ttfb: float
+    total: float
+    parse: float
+    cached: bool = False
+    blocked: bool = False
+    error: str | None = None
+
+
+def percentile(values: list[float], share: float) -> float | None:
+    """
+    Nearest-rank percentile of the values.
+
+    :param values: Sorted values
+    :param float share: Percentile as a share, 0.5 is the median
+    """
+    if not values:
+        return None
+    return values[min(len(values), max(1, math.ceil(share * len(values)))) - 1]
+
+
+class RequestTracer:
+    """
+    Collects request spans, aggregates them per endpoint and optionally appends them to a JSON-lines trace.
+
+    Only the latest samples of every endpoint are kept for the percentiles,
+    the counters cover every recorded span.
+
+    :param Path trace_path: (optional) JSON-lines file every span is appended to
+    :param int samples: (optional) Latest spans kept per endpoint for the percentiles
+    """
+    PERCENTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, trace_path: Path | str | None = settings.TRACE_PATH,
+                 samples: int = settings.TRACE_SAMPLES) -> None:
+        self.trace_path = Path(trace_path) if trace_path is not None else None
+        self.samples = samples
+        self._endpoints: dict[tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+        self._trace = None
+        if self.trace_path is not None:
+            self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+            self._trace = open(self.trace_path, 'a', encoding='utf-8', buffering=1)
+
+    @staticmethod
+    def endpoint(url: str) -> str:
+        """
+        Endpoint of a url relative to BASE_URL, the query string holds ids and is dropped.
+        """
+        return url.split('?', 1)[0] or '/'
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            stats = self._endpoints.get((span.method, span.endpoint))
+            if stats is None:
+                stats = self._endpoints[(span.method, span.endpoint)] = dict(
+                    count=0, errors=0, cached=0, blocked=0, bytes=0,
+                    total=deque(maxlen=self.samples), ttfb=deque(maxlen=self.samples),
+                    parse=deque(maxlen=self.samples),
+                )
+            stats['count'] += 1
+            stats['cached'] += span.cached
+            stats['blocked'] += span.blocked
+            stats['errors'] += span.error is not None or span.status is None or span.status >= 400
+            stats['bytes'] += span.bytes
+            if not span.cached:
+                stats['total'].append(span.total)
+                stats['ttfb'].append(span.ttfb)
+                stats['parse'].append(span.parse)
+            if self._trace is not None:
+                self._trace.write(json.dumps(span._asdict(), ensure_ascii=False) + '\n')
+
+    def summary(self) -> list[dict]:
+        """
+        Aggregated spans of every endpoint, slowest median first.
+
+        :return: Dicts with the counters and the ``total``, ``ttfb`` and ``parse`` percentiles in milliseconds
+        """
+        with self._lock:
+            endpoints = [(key, dict(stats, total=sorted(stats['total']), ttfb=sorted(stats['ttfb']),
+                                    parse=sorted(stats['parse'])))
+                         for key, stats in self._endpoints.items()]
+        summary = []
+        for (method, endpoint), stats in endpoints:
+            row = dict(method=method, endpoint=endpoint, count=stats['count'], errors=stats['errors'],
+                       cached=stats['cached'], blocked=stats['blocked'], bytes=stats['bytes'])
+            for key in ('total', 'ttfb', 'parse'):
+                for share in self.PERCENTILES:
+                    value = percentile(stats[key], share)
+                    row[f"{key}_p{round(share * 100)}_ms"] = value * 1000 if value is not None else None
+            summary.append(row)
+        summary.sort(key=lambda row: row['total_p50_ms'] or 0, reverse=True)
+        return summary
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
@@ -0,0 +1,307 @@
+import threading
+from abc import ABC, abstractmethod
+
+from journal_free import settings
+
+
+def _has_class(name: str) -> str:
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+class BaseParser(ABC):
+    """
+    Extracts only the nodes NZClient needs from every nz.ua page type.
+
+    Every parse method returns a dict with the page ``title`` (used by the antibot
+    check) and the page specific fields.
+    """
+    name: str
+    PAGES = ('login', 'login_result', 'journal_list', 'lessons', 'lesson_form')
+
+    def parse(self, page: str, content: bytes) -> dict:
+        """
+        Parses the page content with the extractor of the given page type.
+
+        :param str page: Page type, one of PAGES
+        :param bytes content: Raw response body
+        """
+        if page not in self.PAGES:
+            raise ValueError(f"Unknown page type: {page}")
+        return getattr(self, page)(content)
+
+    @abstractmethod
+    def login(self, content: bytes) -> dict:
+        """ title, csrf """
+
+    @abstractmethod
+    def login_result(self, content: bytes) -> dict:
+        """ title, alert, user """
+
+    @abstractmethod
+    def journal_list(self, content: bytes) -> dict:
+        """ title, csrf, user, terms, selected_term, journals """
+
+    @abstractmethod
+    def lessons(self, content: bytes) -> dict:
+        """ title, page_count, lessons """
+
+    @abstractmethod
+    def lesson_form(self, content: bytes) -> dict:
+        """ title, csrf, hometask_to, topic, number, homework """
+
+
+class LxmlParser(BaseParser):
+    """
+    lxml backend, every selector is compiled to an XPath expression once per thread,
+    lxml parsers and XPath evaluators are not shared between threads.
+    """
+    name = 'lxml'
+    SELECTORS = {
+        'title': 'string((//title)[1])',
+        'csrf': '(//input[@name="_csrf"])[1]/@value',
+        'alert': f'(//div[{_has_class("alert-danger")}])[1]',
+        'alert_message': '(.//li)[1]',
+        'user': f'(//div[{_has_class("h-user-info")}]//span)[1]',
+        'terms': '//*[@id="personalselectform-semester_id"]//option',
+        'journal_rows': f'//table[{_has_class("journal-choose")}]//tr',
+        'row_cells': './td',
+        'cell_links': './/a',
+        'pagination': f'(//ul[{_has_class("pagination")}])[1]',
+        'pagination_items': './/li',
+        'lessons': f'//ul[{_has_class("dz-container")}]//a[{_has_class("dz-edit")} and {_has_class("modal-box")}]/@href',
+        'hometask_to': 'string((//*[@id="osvitaschedulereal-hometask_to"]//option)[1]/@value)',
+        'topic': 'string(//*[@id="osvitaschedulereal-lesson_topic"])',
+        'number': 'string(//*[@id="osvitaschedulereal-lesson_number_in_plan"]/@value)',
+        'homework': 'string(//*[@id="osvitaschedulereal-hometask"])',
+    }
+
+    def __init__(self) -> None:
+        from lxml import etree, html
+
+        self._etree = etree
+        self._html = html
+        self._local = threading.local()
+
+    def _thread_state(self) -> threading.local:
+        if not hasattr(self._local, 'xpath'):
+            self._local.parser = self._html.HTMLParser(encoding='utf-8')
+            self._local.xpath = {key: self._etree.XPath(selector) for key, selector in self.SELECTORS.items()}
+        return self._local
+
+    @property
+    def _xpath(self) -> dict:
+        return self._thread_state().xpath
+
+    def _tree(self, content: bytes):
+        return self._html.document_fromstring(content, parser=self._thread_state().parser)
+
+    def _first(self, key: str, node) -> object | None:
+        result = self._xpath[key](node)
+        return result[0] if result else None
+
+    def _string(self, key: str, node) -> str:
+        return str(self._xpath[key](node))
+
+    @staticmethod
+    def _string_or_none(value) -> str | None:
+        return str(value) if value is not None else None
+
+    def _text(self, key: str, node) -> str | None:
+        element = self._first(key, node)
+        return element.text_content() if element is not None else None
+
+    def login(self, content: bytes) -> dict:
+        tree = self._tree(content)
+        return dict(
+            title=self._string('title', tree),
+            csrf=self._string_or_none(self._first('csrf', tree)),
+        )
+
+    def login_result(self, content: bytes) -> dict:
+        tree = self._tree(content)
+        alert = self._first('alert', tree)
+        if alert is not None:
+            message = self._text('alert_message', alert)
+            alert = message if message is not None else alert.text_content().strip()
+        return dict(
+            title=self._string('title', tree),
+            alert=alert,
+            user=self._text('user', tree),
+        )
+
+    def journal_list(self, content: bytes) -> dict:
+        tree = self._tree(content)
+        terms = []
+        selected_term = None
+        for option in self._xpath['terms'](tree):
+            term = {"name": option.text_content(), "value": option.get('value')}
+            terms.append(term)
+            if selected_term is None and option.get('selected') is not None:
+                selected_term = dict(term)
+        journals = []
+        for row in self._xpath['journal_rows'](tree):
+            cells = self._xpath['row_cells'](row)
+            if len(cells) < 2:
+                continue
+            journals.append({
+                "subject": cells[0].text_content(),
+                "classes": [{"name": link.text_content(), "url": link.get('href')} for link in self._xpath['cell_links'](cells[1])]
+            })
+        return dict(
+            title=self._string('title', tree),
+            csrf=self._string_or_none(self._first('csrf', tree)),
+            user=self._text('user', tree),
+            terms=terms,
+            selected_term=selected_term,
+            journals=journals,
+        )
+
+    def lessons(self, content: bytes) -> dict:
+        tree = self._tree(content)
+        pagination = self._first('pagination', tree)
+        return dict(
+            title=self._string('title', tree),
+            page_count=len(self._xpath['pagination_items'](pagination)) - 2 if pagination is not None else 1,
+            lessons=[str(href) for href in self._xpath['lessons'](tree)],
+        )
+
+    def lesson_form(self, content: bytes) -> dict:
+        tree = self._tree(content)
+        return dict(
+            title=self._string('title', tree),
+            csrf=self._string_or_none(self._first('csrf', tree)),
+            hometask_to=self._string('hometask_to', tree),
+            topic=self._string('topic', tree),
+            number=self._string('number', tree),
+            homework=self._string('homework', tree),
+        )
+
+
+class SoupParser(BaseParser):
+    """
+    BeautifulSoup backend, only the subtrees listed in STRAINERS are built.
+    """
+    name = 'soup'
+    STRAINERS = {
+        'login': ['title', 'input'],
+        'login_result': ['title', 'div'],
+        'journal_list': ['title', 'input', 'select', 'table', 'div'],
+        'lessons': ['title', 'ul'],
+        'lesson_form': ['title', 'input', 'textarea', 'select'],
+    }
+
+    def __init__(self) -> None:
+        from bs4 import BeautifulSoup, SoupStrainer
+
+        self._soup = BeautifulSoup
+        self._strainers = {page: SoupStrainer(tags) for page, tags in self.STRAINERS.items()}
+
+    def _tree(self, page: str, content: bytes):
+        return self._soup(content, 'html.parser', parse_only=self._strainers[page])
+
+    @staticmethod
+    def _title(site) -> str | None:
+        title = site.find('title')
+        return title.text if title is not None else None
+
+    @staticmethod
+    def _csrf(site) -> str | None:
+        csrf = site.find('input', {"name": "_csrf"})
+        return csrf.get('value', None) if csrf is not None else None
+
+    @staticmethod
+    def _user(site) -> str | None:
+        user = site.find('div', class_='h-user-info')
+        user = user.find('span') if user is not None else None
+        return user.text if user is not None else None
+
+    def login(self, content: bytes) -> dict:
+        site = self._tree('login', content)
+        return dict(
+            title=self._title(site),
+            csrf=self._csrf(site),
+        )
+
+    def login_result(self, content: bytes) -> dict:
+        site = self._tree('login_result', content)
+        alert = site.find('div', class_='alert-danger')
+        if alert is not None:
+            message = alert.find('li')
+            alert = message.text if message is not None else alert.text.strip()
+        return dict(
+            title=self._title(site),
+            alert=alert,
+            user=self._user(site),
+        )
+
+    def journal_list(self, content: bytes) -> dict:
+        site = self._tree('journal_list', content)
+        terms_select = site.find(id="personalselectform-semester_id")
+        options = terms_select.find_all("option") if terms_select is not None else []
+        terms = [{"name": term.text, "value": term.get('value')} for term in options]
+        selected = next((term for term, option in zip(terms, options) if option.has_attr('selected')), None)
+        journals = []
+        table = site.find("table", class_="journal-choose")
+        for item in table.find_all("tr") if table is not None else []:
+            subj_obj = item.find_all("td")
+            if len(subj_obj) < 2:
+                continue
+            journals.append({
+                "subject": subj_obj[0].text,
+                "classes": [{"name": class_.text, "url": class_.get('href', None)} for class_ in subj_obj[1].find_all("a")]
+            })
+        return dict(
+            title=self._title(site),
+            csrf=self._csrf(site),
+            user=self._user(site),
+            terms=terms,
+            selected_term=dict(selected) if selected is not None else None,
+            journals=journals,
+        )
+
+    def lessons(self, content: bytes) -> dict:
+        site = self._tree('lessons', content)
+        pagination = site.find('ul', class_='pagination')
+        container = site.find('ul', class_='dz-container')
+        links = container.find_all('a', class_="dz-edit modal-box") if container is not None else []
+        return dict(
+            title=self._title(site),
+            page_count=len(pagination.find_all('li')) - 2 if pagination is not None else 1,
+            lessons=[link['href'] for link in links],
+        )
+
+    def lesson_form(self, content: bytes) -> dict:
+        site = self._tree('lesson_form', content)
+        hometask_to = site.find(id="osvitaschedulereal-hometask_to")
+        hometask_to = hometask_to.find('option') if hometask_to is not None else None
+        topic = site.find(id="osvitaschedulereal-lesson_topic")
+        number = site.find(id="osvitaschedulereal-lesson_number_in_plan")
+        homework = site.find(id="osvitaschedulereal-hometask")
+        return dict(
+            title=self._title(site),
+            csrf=self._csrf(site),
+            hometask_to=hometask_to.get('value', '') if hometask_to is not None else '',
+            topic=topic.get_text() if topic is not None else '',
+            number=number.get('value', '') if number is not None else '',
+            homework=homework.get_text() if homework is not None else '',
+        )
+
+
+PARSERS: dict[str, type[BaseParser]] = {
+    LxmlParser.name: LxmlParser,
+    SoupParser.name: SoupParser,
+}
+
+
+def get_parser(name: str = settings.HTML_PARSER) -> BaseParser:
+    """
+    Creates the HTML extraction backend.
+
+    :param str name: (optional) Backend name from PARSERS, "auto" prefers lxml when it is installed
+    """
+    if name != 'auto':
+        return PARSERS[name]()
+    try:
+        return LxmlParser()
+    except ImportError:
+        return SoupParser()
@@ -0,0 +1,262 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, TypeVar
+
+from journal_free import settings
+
+T = TypeVar('T')
+
+
+class CircuitBreaker:
+    """
+    Pauses every request of a client while nz.ua is blocking it.
+
+    Outcomes of the requests are kept for a sliding window, once the blocked
+    share of the window reaches the rate the breaker opens and wait() blocks
+    all callers for the cooldown. A breaker that trips again right after a
+    pause doubles the cooldown up to the maximum.
+
+    :param float window: (optional) Seconds of request outcomes considered
+    :param int min_requests: (optional) Requests in the window needed before the breaker can open
+    :param float rate: (optional) Blocked share of the window that opens the breaker
+    :param float cooldown: (optional) Seconds the first pause lasts
+    :param float max_cooldown: (optional) Longest pause
+    """
+
+    def __init__(self, window: float = settings.BREAKER_WINDOW, min_requests: int = settings.BREAKER_MIN_REQUESTS,
+                 rate: float = settings.BREAKER_RATE, cooldown: float = settings.BREAKER_COOLDOWN,
+                 max_cooldown: float = settings.BREAKER_MAX_COOLDOWN) -> None:
+        self.window = window
+        self.min_requests = min_requests
+        self.rate = rate
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.trips = 0
+        self.paused_seconds = 0.0
+        self._next_cooldown = cooldown
+        self._open_until = 0.0
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._blocked = 0
+        self._condition = threading.Condition()
+
+    @property
+    def is_open(self) -> bool:
+        with self._condition:
+            return self._open_until > time.monotonic()
+
+    def wait(self) -> None:
+        """
+        Blocks while the breaker is open.
+        """
+        with self._condition:
+            while True:
+                remaining = self._open_until - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._condition.wait(remaining)
+
+    def record(self, is_blocked: bool) -> None:
+        now = time.monotonic()
+        with self._condition:
+            self._outcomes.append((now, is_blocked))
+            self._blocked += is_blocked
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._blocked -= self._outcomes.popleft()[1]
+            if not is_blocked:
+                if self._open_until + self.window < now:
+                    self._next_cooldown = self.cooldown
+                return
+            if (self._open_until <= now and len(self._outcomes) >= self.min_requests
+                    and self._blocked >= self.rate * len(self._outcomes)):
+                self._trip(now)
+
+    def _trip(self, now: float) -> None:
+        self.trips += 1
+        self.paused_seconds += self._next_cooldown
+        self._open_until = now + self._next_cooldown
+        self._next_cooldown = min(self._next_cooldown * 2, self.max_cooldown)
+        # The outcomes that opened the breaker must not open it again after the pause
+        self._outcomes.clear()
+        self._blocked = 0
+        self._condition.notify_all()
+
+
+class RequestPolicy:
+    """
+    Retries blocked requests with exponential backoff and full jitter behind a circuit breaker.
+
+    :param int attempts: (optional) Retries after the first blocked response
+    :param float base_delay: (optional) Backoff of the first retry in seconds
+    :param float max_delay: (optional) Longest backoff in seconds
+    :param CircuitBreaker breaker: (optional) Breaker shared by every request of the client
+    """
+
+    def __init__(self, attempts: int = settings.RETRY_ATTEMPTS, base_delay: float = settings.RETRY_BASE_DELAY,
+                 max_delay: float = settings.RETRY_MAX_DELAY, breaker: CircuitBreaker | None = None) -> None:
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.requests = 0
+        self.blocked = 0
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt: int, retry_after: float | None = None) -> float:
+        """
+        Seconds to wait before the retry, the server Retry-After is used as the lower bound.
+
+        :param int attempt: Number of the failed attempt, starting at 0
+        :param float retry_after: (optional) Delay requested by the server
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def execute(self, send: Callable[[], T], is_blocked: Callable[[T], bool],
+                retry_after: Callable[[T], float | None] = lambda result: None) -> T:
+        """
+        Sends the request until it is not blocked or the attempts run out.
+
+        :param send: Sends the request and returns its result
+        :param is_blocked: Checks whether the result is a throttled or challenged response
+        :param retry_after: (optional) Reads the delay requested by the server from the result
+        :return: The first result that is not blocked, or the last blocked one
+        """
+        attempt = 0
+        while True:
+            self.breaker.wait()
+            result = send()
+            blocked = is_blocked(result)
+            self.breaker.record(blocked)
+            with self._lock:
+                self.requests += 1
+                self.blocked += blocked
+                if blocked and attempt == self.attempts:
+                    self.exhausted += 1
+                elif blocked:
+                    self.retries += 1
+            if not blocked or attempt == self.attempts:
+                return result
+            time.sleep(self.backoff(attempt, retry_after(result)))
+            attempt += 1
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                requests=self.requests,
+                blocked=self.blocked,
+                retries=self.retries,
+                exhausted=self.exhausted,
+                breaker_trips=self.breaker.trips,
+                breaker_paused_seconds=self.breaker.paused_seconds,
+                breaker_open=self.breaker.is_open,
+            )
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit of the requests in flight, tuned by the observed latency.
+
+    Every healthy completion raises the limit by increase / limit, so it grows by
+    about one per round of requests. A failed request or a smoothed latency above
+    tolerance times the baseline cuts the limit by the decrease factor, once per
+    congestion episode: completions of requests started before the last cut do
+    not cut it again. The baseline is the lowest smoothed latency seen, slowly
+    following the latency up so a server that stays slower is not treated as
+    congested forever. A limiter with equal minimum and maximum is a plain
+    fixed concurrency limit.
+
+    :param float initial: Limit the requests start with
+    :param int minimum: (optional) Lowest limit
+    :param int maximum: (optional) Highest limit, raised to the initial limit if it is lower
+    :param float increase: (optional) Additive increase per round of requests
+    :param float decrease: (optional) Multiplicative decrease factor
+    :param float tolerance: (optional) Smoothed latency to baseline ratio treated as congestion
+    :param float smoothing: (optional) Weight of the newest sample in the smoothed latency
+    """
+    BASELINE_DRIFT = 0.01
+
+    def __init__(self, initial: float, minimum: int = settings.ADAPTIVE_MIN_CONCURRENCY,
+                 maximum: int = settings.ADAPTIVE_MAX_CONCURRENCY, increase: float = 1.0,
+                 decrease: float = settings.ADAPTIVE_DECREASE, tolerance: float = settings.ADAPTIVE_LATENCY_TOLERANCE,
+                 smoothing: float = 0.2) -> None:
+        self.minimum = max(1, minimum)
+        # An explicitly higher starting point raises the ceiling
+        self.maximum = max(self.minimum, maximum, int(initial))
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.latency: float | None = None
+        self.baseline: float | None = None
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @classmethod
+    def fixed(cls, limit: int) -> "AdaptiveLimiter":
+        limit = max(1, limit)
+        return cls(limit, minimum=limit, maximum=limit)
+
+    @property
+    def limit(self) -> int:
+        with self._condition:
+            return int(self._limit)
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request fits under the limit.
+
+        :return: Start time to pass to release()
+        """
+        with self._condition:
+            while self.in_flight >= int(self._limit):
+                self._condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, ok: bool = True) -> None:
+        """
+        Frees the slot of a finished request and adjusts the limit.
+
+        :param float started: Value returned by acquire()
+        :param bool ok: (optional) False if the request failed or was blocked
+        """
+        now = time.monotonic()
+        with self._condition:
+            self.in_flight -= 1
+            if ok:
+                sample = now - started
+                self.latency = sample if self.latency is None else \
+                    self.latency + (sample - self.latency) * self.smoothing
+                if self.baseline is None or self.latency < self.baseline:
+                    self.baseline = self.latency
+                else:
+                    self.baseline += (self.latency - self.baseline) * self.BASELINE_DRIFT
+            if not ok or self.latency > self.baseline * self.tolerance:
+                if started >= self._last_decrease:
+                    self._limit = max(self.minimum, self._limit * self.decrease)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+            self._condition.notify_all()
+
+    @property
+    def stats(self) -> dict:
+        with self._condition:
+            return dict(
+                limit=int(self._limit),
+                in_flight=self.in_flight,
+                latency=self.latency,
+                baseline=self.baseline,
+                decreases=self.decreases,
+            )
@@ -0,0 +1,351 @@
+import codecs
+import csv
+import json
+import zipfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator
+from xml.etree.ElementTree import iterparse, ParseError
+
+
+class UnsupportedFormatError(Exception):
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        super().__init__(f"Unsupported plan format: {Path(file_path).suffix or file_path}, "
+                         f"supported: {', '.join(supported_extensions())}")
+
+
+class SheetNotFoundError(Exception):
+
+    def __init__(self, file_path: str, sheet: str, sheets: list[str]) -> None:
+        self.file_path = file_path
+        self.sheet = sheet
+        self.sheets = sheets
+        super().__init__(f"Sheet {sheet!r} does not exist in {Path(file_path).name}, "
+                         f"available: {', '.join(map(repr, sheets)) or 'none'}")
+
+
+class PlanFormatError(Exception):
+
+    def __init__(self, file_path: str, reason: str) -> None:
+        self.file_path = file_path
+        self.reason = reason
+        super().__init__(f"{Path(file_path).name} is not a valid plan file: {reason}")
+
+
+class InvalidRowError(Exception):
+
+    def __init__(self, index: int, row, reason: str = "is not a list of cells") -> None:
+        self.index = index
+        self.row = row
+        super().__init__(f"Plan row {index + 1} {reason}: {row!r}")
+
+
+class BaseReader(ABC):
+    """
+    Reads the raw cell values of a plan file row by row.
+
+    Rows are yielded as tuples of ``(number, topic, homework, ...)`` values, an empty
+    cell is None, so every format is validated by FileClient the same way.
+    """
+    name: str
+    extensions: tuple[str, ...]
+
+    @abstractmethod
+    def sheet_names(self, file_path: str) -> list[str]:
+        """ Names of the plans stored in the file """
+
+    @abstractmethod
+    def iter_values(self, file_path: str, sheet: str | None = None) -> Iterator[tuple]:
+        """
+        Streams the row values of the sheet.
+
+        :param str file_path: Plan file
+        :param str sheet: (optional) Sheet with the plan, the first or active one by default
+        :raises SheetNotFoundError: The file has no such sheet
+        :raises PlanFormatError: The file is damaged or has another format than its extension
+        """
+
+
+class SingleSheetReader(BaseReader, ABC):
+    """
+    Formats holding one plan, the plan is named after the file.
+    """
+
+    def sheet_names(self, file_path: str) -> list[str]:
+        return [Path(file_path).stem]
+
+    def _check_sheet(self, file_path: str, sheet: str | None) -> None:
+        if sheet is not None and sheet not in self.sheet_names(file_path):
+            raise SheetNotFoundError(file_path, sheet, self.sheet_names(file_path))
+
+    @staticmethod
+    def _cell(value):
+        if isinstance(value, str):
+            value = value.strip()
+        return None if value == '' else value
+
+
+class XlsxReader(BaseReader):
+    """
+    openpyxl backend, the workbook is streamed in read-only mode with the cached formula values.
+    """
+    name = 'xlsx'
+    extensions = ('.xlsx', '.xlsm')
+
+    @staticmethod
+    def _load(file_path: str, **kwargs):
+        from openpyxl.reader.excel import load_workbook
+
+        try:
+            return load_workbook(file_path, read_only=True, **kwargs)
+        except (zipfile.BadZipFile, KeyError) as e:
+            raise PlanFormatError(file_path, str(e))
+
+    def sheet_names(self, file_path: str) -> list[str]:
+        document = self._load(file_path)
+        try:
+            return document.sheetnames
+        finally:
+            document.close()
+
+    def iter_values(self, file_path: str, sheet: str | None = None) -> Iterator[tuple]:
+        document = self._load(file_path, data_only=True)
+        try:
+            if sheet is not None and sheet not in document.sheetnames:
+                raise SheetNotFoundError(file_path, sheet, document.sheetnames)
+            active_page = document[sheet] if sheet is not None else document.active
+            yield from active_page.iter_rows(values_only=True)
+        finally:
+            document.close()
+
+
+class CsvReader(SingleSheetReader):
+    """
+    csv module backend, the delimiter is sniffed since spreadsheet exports often use ";" or tabs.
+
+    Files which are not UTF-8 are read as cp1251, the encoding Excel exports CSV with on a Cyrillic Windows.
+    """
+    name = 'csv'
+    extensions = ('.csv', '.tsv')
+    DELIMITERS = ',;\t'
+    SNIFF_SIZE = 1 << 14
+    FALLBACK_ENCODING = 'cp1251'
+
+    def _encoding(self, file_path: str) -> str:
+        # The whole file is checked, a cp1251 letter can first appear on the last row
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with open(file_path, 'rb') as file:
+            try:
+                for chunk in iter(lambda: file.read(1 << 16), b''):
+                    decoder.decode(chunk)
+                decoder.decode(b'', final=True)
+            except UnicodeDecodeError:
+                return self.FALLBACK_ENCODING
+        return 'utf-8-sig'
+
+    def iter_values(self, file_path: str, sheet: str | None = None) -> Iterator[tuple]:
+        self._check_sheet(file_path, sheet)
+        try:
+            yield from self._iter_rows(file_path)
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise PlanFormatError(file_path, str(e))
+
+    def _iter_rows(self, file_path: str) -> Iterator[tuple]:
+        with open(file_path, newline='', encoding=self._encoding(file_path)) as file:
+            sample = file.read(self.SNIFF_SIZE)
+            file.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=self.DELIMITERS)
+            except csv.Error:
+                dialect = csv.excel_tab if file_path.endswith('.tsv') else csv.excel
+            for row in csv.reader(file, dialect):
+                if row:
+                    yield tuple(self._cell(value) for value in row)
+
+
+class JsonReader(SingleSheetReader):
+    """
+    json module backend.
+
+    The file holds a list of rows, either ``[number, topic, homework]`` lists or
+    objects with the same keys, or an object mapping plan names to such lists.
+    """
+    name = 'json'
+    extensions = ('.json',)
+    KEYS = ('number', 'topic', 'homework')
+
+    @staticmethod
+    def _load(file_path: str) -> list | dict:
+        try:
+            with open(file_path, encoding='utf-8-sig') as file:
+                return json.load(file)
+        except ValueError as e:
+            # JSONDecodeError and UnicodeDecodeError
+            raise PlanFormatError(file_path, str(e))
+
+    def sheet_names(self, file_path: str) -> list[str]:
+        data = self._load(file_path)
+        return list(data) if isinstance(data, dict) else super().sheet_names(file_path)
+
+    def iter_values(self, file_path: str, sheet: str | None = None) -> Iterator[tuple]:
+        """
+        :raises InvalidRowError: A row is neither a list nor an object
+        """
+        data = self._load(file_path)
+        if isinstance(data, dict):
+            if sheet is not None and sheet not in data:
+                raise SheetNotFoundError(file_path, sheet, list(data))
+            rows = data[sheet] if sheet is not None else next(iter(data.values()), [])
+        else:
+            self._check_sheet(file_path, sheet)
+            rows = data
+        if not isinstance(rows, list):
+            raise InvalidRowError(0, rows)
+        for index, row in enumerate(rows):
+            if isinstance(row, dict):
+                row = [row.get(key) for key in self.KEYS]
+            elif not isinstance(row, list):
+                # A string would be split into one cell per character
+                raise InvalidRowError(index, row)
+            yield tuple(self._cell(value) for value in row)
+
+
+class OdsReader(BaseReader):
+    """
+    OpenDocument spreadsheet backend, content.xml is streamed from the archive with
+    iterparse. Repeated rows and cells are expanded, trailing empty ones are dropped.
+    """
+    name = 'ods'
+    extensions = ('.ods',)
+    TABLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+    OFFICE_NS = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+    TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+    TABLE = f'{{{TABLE_NS}}}table'
+    ROW = f'{{{TABLE_NS}}}table-row'
+    CELLS = (f'{{{TABLE_NS}}}table-cell', f'{{{TABLE_NS}}}covered-table-cell')
+    NAME = f'{{{TABLE_NS}}}name'
+    ROWS_REPEATED = f'{{{TABLE_NS}}}number-rows-repeated'
+    COLUMNS_REPEATED = f'{{{TABLE_NS}}}number-columns-repeated'
+    VALUE_TYPE = f'{{{OFFICE_NS}}}value-type'
+    VALUE = f'{{{OFFICE_NS}}}value'
+    PARAGRAPHS = (f'{{{TEXT_NS}}}p', f'{{{TEXT_NS}}}h')
+    SPACE = f'{{{TEXT_NS}}}s'
+    SPACE_COUNT = f'{{{TEXT_NS}}}c'
+    TAB = f'{{{TEXT_NS}}}tab'
+    LINE_BREAK = f'{{{TEXT_NS}}}line-break'
+
+    # Not an archive, no content.xml in it or a truncated one
+    DAMAGED = (zipfile.BadZipFile, KeyError, ParseError)
+
+    def _iter_tables(self, file_path: str) -> Iterator[tuple[str, Iterator]]:
+        with zipfile.ZipFile(file_path) as archive, archive.open('content.xml') as content:
+            events = iterparse(content, events=('start', 'end'))
+            for event, element in events:
+                if event == 'start' and element.tag == self.TABLE:
+                    yield element.get(self.NAME), events
+
+    def sheet_names(self, file_path: str) -> list[str]:
+        names = []
+        try:
+            for name, events in self._iter_tables(file_path):
+                names.append(name)
+                self._skip_table(events)
+        except self.DAMAGED as e:
+            raise PlanFormatError(file_path, str(e))
+        return names
+
+    def _skip_table(self, events: Iterator) -> None:
+        for event, element in events:
+            if event == 'end':
+                if element.tag == self.TABLE:
+                    return
+                if element.tag == self.ROW:
+                    element.clear()
+
+    def _cell_value(self, cell):
+        if cell.get(self.VALUE_TYPE) in ('float', 'percentage', 'currency'):
+            value = float(cell.get(self.VALUE))
+            return int(value) if value.is_integer() else value
+        text = '\n'.join(self._text(paragraph) for paragraph in cell if paragraph.tag in self.PARAGRAPHS)
+        return text.strip() or None
+
+    def _text(self, element) -> str:
+        # Runs of spaces, tabs and line breaks are stored as elements, itertext would drop them
+        parts = [element.text or '']
+        for child in element:
+            if child.tag == self.SPACE:
+                parts.append(' ' * int(child.get(self.SPACE_COUNT, 1)))
+            elif child.tag == self.TAB:
+                parts.append('\t')
+            elif child.tag == self.LINE_BREAK:
+                parts.append('\n')
+            else:
+                parts.append(self._text(child))
+            parts.append(child.tail or '')
+        return ''.join(parts)
+
+    def _row_values(self, row) -> list:
+        values = []
+        for cell in row:
+            if cell.tag in self.CELLS:
+                values.extend([self._cell_value(cell)] * int(cell.get(self.COLUMNS_REPEATED, 1)))
+        while values and values[-1] is None:
+            values.pop()
+        return values
+
+    def iter_values(self, file_path: str, sheet: str | None = None) -> Iterator[tuple]:
+        try:
+            yield from self._iter_rows(file_path, sheet)
+        except self.DAMAGED as e:
+            raise PlanFormatError(file_path, str(e))
+
+    def _iter_rows(self, file_path: str, sheet: str | None) -> Iterator[tuple]:
+        for name, events in self._iter_tables(file_path):
+            if sheet is not None and name != sheet:
+                self._skip_table(events)
+                continue
+            empty_rows = 0
+            for event, element in events:
+                if event != 'end':
+                    continue
+                if element.tag == self.TABLE:
+                    return
+                if element.tag == self.ROW:
+                    values = self._row_values(element)
+                    repeated = int(element.get(self.ROWS_REPEATED, 1))
+                    element.clear()
+                    if not values:
+                        empty_rows += repeated
+                        continue
+                    # Empty rows are only kept between filled ones, so the sheet padding is not yielded
+                    yield from [()] * empty_rows
+                    empty_rows = 0
+                    yield from [tuple(values)] * repeated
+        if sheet is not None:
+            raise SheetNotFoundError(file_path, sheet, self.sheet_names(file_path))
+
+
+READERS: dict[str, type[BaseReader]] = {
+    reader.name: reader
+    for reader in (XlsxReader, CsvReader, JsonReader, OdsReader)
+}
+
+
+def supported_extensions() -> list[str]:
+    return [extension for reader in READERS.values() for extension in reader.extensions]
+
+
+def get_reader(file_path: str) -> BaseReader:
+    """
+    Creates the reader of the plan file by its extension.
+
+    :param str file_path: Plan file
+    :raises UnsupportedFormatError: No reader handles the extension
+    """
+    extension = Path(file_path).suffix.lower()
+    for reader in READERS.values():
+        if extension in reader.extensions:
+            return reader()
+    raise UnsupportedFormatError(file_path)
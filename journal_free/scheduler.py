@@ -0,0 +1,184 @@
+import heapq
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from enum import IntEnum
+from typing import Callable, Hashable, NamedTuple
+
+from journal_free import settings
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BULK = 1
+
+
+class _Job(NamedTuple):
+    future: Future
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    priority: Priority
+    key: Hashable | None
+
+
+class RequestScheduler:
+    """
+    Thread pool running requests by priority.
+
+    Jobs run in priority order, then in submission order. Bulk jobs never take
+    the last ``reserved`` threads, so an interactive request is answered while a
+    fill keeps the rest of the pool busy. Jobs sharing a key run one at a time in
+    submission order, which serialises the calls changing the NZClient state.
+    Threads are started on demand up to ``workers`` and reused, they are daemon
+    threads and do not keep the application alive.
+
+    :param int workers: (optional) Most threads of the pool
+    :param int reserved: (optional) Threads only interactive jobs may run on
+    """
+
+    def __init__(self, workers: int = settings.SCHEDULER_WORKERS, reserved: int = settings.SCHEDULER_RESERVED) -> None:
+        self.workers = max(1, workers)
+        self.reserved = min(max(0, reserved), self.workers - 1)
+        self._queue: list[tuple[int, int, _Job]] = []
+        # Key of every job queued or running, its head is in the queue or running, the rest wait in submission order
+        self._keys: dict[Hashable, tuple[_Job, deque[_Job]]] = {}
+        self._threads: list[threading.Thread] = []
+        self._idle = 0
+        self._bulk = 0
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._shutdown = False
+
+    def submit(self, fn: Callable, *args, priority: Priority = Priority.INTERACTIVE, key: Hashable | None = None,
+               supersede: bool = False, **kwargs) -> Future:
+        """
+        Schedules fn(*args, **kwargs).
+
+        :param fn: Callable to run
+        :param priority: (optional) Interactive jobs run before bulk ones
+        :param key: (optional) Jobs with the same key never run at once
+        :param bool supersede: (optional) Cancel the jobs of the key that have not started yet
+        :return: Future of the call
+        """
+        job = _Job(Future(), fn, args, kwargs, Priority(priority), key)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new jobs after shutdown")
+            if key is not None and key in self._keys:
+                head, waiting = self._keys[key]
+                if supersede:
+                    head.future.cancel()
+                    for pending in waiting:
+                        pending.future.cancel()
+                waiting.append(job)
+            else:
+                if key is not None:
+                    self._keys[key] = (job, deque())
+                self._push(job)
+        return job.future
+
+    def executor(self, priority: Priority = Priority.BULK, key: Hashable | None = None) -> "SchedulerExecutor":
+        """
+        Executor view of the pool, lets the engines submit their lessons at the given priority.
+        """
+        return SchedulerExecutor(self, priority, key)
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        with self._condition:
+            self._shutdown = True
+            if cancel_pending:
+                for _, _, job in self._queue:
+                    job.future.cancel()
+                for _, waiting in self._keys.values():
+                    for job in waiting:
+                        job.future.cancel()
+            self._condition.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    @property
+    def stats(self) -> dict:
+        with self._condition:
+            return dict(threads=len(self._threads), idle=self._idle, bulk=self._bulk, queued=len(self._queue),
+                        keys=len(self._keys))
+
+    def _push(self, job: _Job, spawn: bool = True) -> None:
+        heapq.heappush(self._queue, (job.priority, next(self._counter), job))
+        if spawn and self._idle == 0 and len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"scheduler-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        else:
+            self._condition.notify_all()
+
+    def _next(self) -> _Job | None:
+        if not self._queue:
+            return None
+        priority, _, job = self._queue[0]
+        if priority > Priority.INTERACTIVE and self._bulk >= self.workers - self.reserved:
+            return None
+        heapq.heappop(self._queue)
+        if priority > Priority.INTERACTIVE:
+            self._bulk += 1
+        return job
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                job = self._next()
+                while job is None:
+                    if self._shutdown and not self._queue:
+                        return
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                    job = self._next()
+            self._run(job)
+
+    def _run(self, job: _Job) -> None:
+        try:
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    result = job.fn(*job.args, **job.kwargs)
+                except BaseException as e:
+                    job.future.set_exception(e)
+                else:
+                    job.future.set_result(result)
+        finally:
+            with self._condition:
+                if job.priority > Priority.INTERACTIVE:
+                    self._bulk -= 1
+                if job.key is not None:
+                    self._release(job.key)
+                self._condition.notify_all()
+
+    def _release(self, key: Hashable) -> None:
+        _, waiting = self._keys[key]
+        if waiting:
+            head = waiting.popleft()
+            self._keys[key] = (head, waiting)
+            # The releasing thread is about to look for a job, no new thread is needed
+            self._push(head, spawn=False)
+        else:
+            del self._keys[key]
+
+
+class SchedulerExecutor(Executor):
+    """
+    Submits to a RequestScheduler at a fixed priority, shutting it down leaves the scheduler running.
+    """
+
+    def __init__(self, scheduler: RequestScheduler, priority: Priority, key: Hashable | None = None) -> None:
+        self.scheduler = scheduler
+        self.priority = priority
+        self.key = key
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        return self.scheduler.submit(fn, *args, priority=self.priority, key=self.key, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        pass
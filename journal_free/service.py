@@ -0,0 +1,626 @@
+import hmac
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+from journal_free import settings
+from journal_free.client import NZClient, FileClient
+from journal_free.engine import FillStatus, Progress
+from journal_free.readers import get_reader, PlanFormatError, SheetNotFoundError, UnsupportedFormatError
+from journal_free.sharding import run_fill, run_export
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    # A finished job holds the FillStatus value of its run
+
+
+class JobQueue:
+    """
+    Fill and export jobs kept in a local SQLite database shared by the service processes.
+
+    Jobs are claimed in submission order, a claim is a single write transaction
+    so two workers never take the same job. A running job is leased to its worker,
+    which renews the lease with heartbeats. Running jobs of a worker that died or
+    whose lease expired, or of a service that was stopped, are put back in the queue
+    and resume from their fill checkpoints. A job whose workers died max_crashes times fails.
+
+    :param Path path: (optional) SQLite database file
+    """
+    KINDS = ('fill', 'export')
+
+    def __init__(self, path: Path = settings.SERVICE_DB_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                progress TEXT,
+                result TEXT,
+                worker TEXT,
+                crashes INTEGER NOT NULL DEFAULT 0,
+                heartbeat_at REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        columns = [row['name'] for row in self._connection.execute("PRAGMA table_info(jobs)")]
+        if 'crashes' not in columns:
+            self._connection.execute("ALTER TABLE jobs ADD COLUMN crashes INTEGER NOT NULL DEFAULT 0")
+        if 'heartbeat_at' not in columns:
+            self._connection.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def __enter__(self) -> "JobQueue":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @staticmethod
+    def _job(row: sqlite3.Row | None) -> dict | None:
+        if row is None:
+            return None
+        job = dict(row)
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        for key in ('params', 'progress', 'result'):
+            job[key] = json.loads(job[key]) if job[key] is not None else None
+        return job
+
+    def submit(self, kind: str, params: dict) -> dict:
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO jobs (kind, params, status, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(params, ensure_ascii=False), JobStatus.QUEUED, time.time())
+            )
+            return self._get(cursor.lastrowid)
+
+    def claim(self, worker: str) -> dict | None:
+        """
+        Takes the oldest queued job.
+
+        :param str worker: Id of the claiming worker
+        :return: The job, now running, None if the queue is empty
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (JobStatus.QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    self._connection.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                        (JobStatus.RUNNING, worker, now, now, row['id'])
+                    )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            return self._get(row['id']) if row is not None else None
+
+    def set_progress(self, job_id: int, progress: Progress) -> None:
+        with self._lock:
+            self._connection.execute("UPDATE jobs SET progress = ? WHERE id = ?",
+                                     (json.dumps(progress._asdict()), job_id))
+
+    def heartbeat(self, worker: str) -> int:
+        """
+        Renews the lease of the running jobs of a worker.
+
+        :return: Number of jobs the worker still holds
+        """
+        with self._lock:
+            return self._connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker = ?",
+                                            (time.time(), JobStatus.RUNNING, worker)).rowcount
+
+    def finish(self, job_id: int, result: dict, worker: str | None = None) -> None:
+        """
+        Stores the result of a job.
+
+        :param str worker: (optional) Worker the job must still be leased to, the job of
+            a worker whose lease expired already belongs to another worker or the queue
+        """
+        query = "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?"
+        args = [result['status'], json.dumps(result, ensure_ascii=False), time.time(), job_id]
+        if worker is not None:
+            query += " AND status = ? AND worker = ?"
+            args += [JobStatus.RUNNING, worker]
+        with self._lock:
+            self._connection.execute(query, args)
+
+    def cancel(self, job_id: int) -> dict | None:
+        """
+        Cancels a queued job at once, a running one is asked to stop after its lessons in flight.
+
+        :return: The job, None if there is no such job
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ? AND status = ?",
+                (FillStatus.CANCELLED, time.time(), job_id, JobStatus.QUEUED)
+            )
+            self._connection.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, JobStatus.RUNNING)
+            )
+            return self._get(job_id)
+
+    def is_cancel_requested(self, job_id: int) -> bool:
+        with self._lock:
+            row = self._connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row['cancel_requested'])
+
+    def requeue(self, worker: str | None = None, job_id: int | None = None) -> int:
+        """
+        Puts running jobs back in the queue, those of a worker, a single job or all of them.
+
+        :return: Number of requeued jobs
+        """
+        query = "UPDATE jobs SET status = ?, worker = NULL, started_at = NULL WHERE status = ?"
+        args = [JobStatus.QUEUED, JobStatus.RUNNING]
+        if worker is not None:
+            query += " AND worker = ?"
+            args.append(worker)
+        if job_id is not None:
+            query += " AND id = ?"
+            args.append(job_id)
+        with self._lock:
+            return self._connection.execute(query, args).rowcount
+
+    def recover(self, worker: str, max_crashes: int = settings.SERVICE_MAX_CRASHES) -> tuple[int, int]:
+        """
+        Handles the running jobs of a worker that died, they are queued again unless it crashed them too often.
+
+        :param str worker: Id of the dead worker
+        :param int max_crashes: (optional) Crashes after which a job fails
+        :return: Numbers of requeued and failed jobs
+        """
+        result = json.dumps(dict(status=FillStatus.ERROR, error=f"the worker running the job died {max_crashes} times"))
+        running = "status = ? AND worker = ?"
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute(f"UPDATE jobs SET crashes = crashes + 1 WHERE {running}",
+                                         (JobStatus.RUNNING, worker))
+                failed = self._connection.execute(
+                    f"UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE {running} AND crashes >= ?",
+                    (FillStatus.ERROR, result, time.time(), JobStatus.RUNNING, worker, max_crashes)
+                ).rowcount
+                requeued = self._connection.execute(
+                    f"UPDATE jobs SET status = ?, worker = NULL, started_at = NULL WHERE {running}",
+                    (JobStatus.QUEUED, JobStatus.RUNNING, worker)
+                ).rowcount
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return requeued, failed
+
+    def workers(self, lease_timeout: float | None = None) -> list[str]:
+        """
+        Ids of the workers with running jobs.
+
+        :param float lease_timeout: (optional) Only the workers without a heartbeat for so many seconds
+        """
+        query = "SELECT DISTINCT worker FROM jobs WHERE status = ?"
+        args = [JobStatus.RUNNING]
+        if lease_timeout is not None:
+            # Jobs claimed before the heartbeats were added have none
+            query += " AND COALESCE(heartbeat_at, 0) < ?"
+            args.append(time.time() - lease_timeout)
+        with self._lock:
+            return [row['worker'] for row in self._connection.execute(query, args).fetchall()]
+
+    def _get(self, job_id: int) -> dict | None:
+        return self._job(self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def get(self, job_id: int) -> dict | None:
+        with self._lock:
+            return self._get(job_id)
+
+    def list(self, status: str | None = None, limit: int = 100) -> list[dict]:
+        """
+        Latest jobs first.
+        """
+        query = "SELECT * FROM jobs"
+        args = []
+        if status is not None:
+            query += " WHERE status = ?"
+            args.append(status)
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            return [self._job(row) for row in self._connection.execute(query, args).fetchall()]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def _run_job(client: NZClient, queue: JobQueue, job: dict, stop) -> None:
+    params = job['params']
+    cancelled = lambda: stop.is_set() or queue.is_cancel_requested(job['id'])
+    progress = lambda snapshot: queue.set_progress(job['id'], snapshot)
+    options = dict(sync=params.get('sync', False), resume=True, adaptive=settings.ADAPTIVE_CONCURRENCY)
+    task = dict(url=params['journal'], name=params.get('name') or params['journal'])
+    try:
+        if job['kind'] == 'export':
+            task['output'] = params['output']
+            result = run_export(client, task, dict(options, concurrency=settings.EXPORT_CONCURRENCY), cancelled,
+                                progress, settings.SERVICE_POLL_INTERVAL)
+        else:
+            task['file'] = FileClient(params['plan'], sheet=params.get('sheet'))
+            result = run_fill(client, task, dict(options, concurrency=settings.SUBMIT_CONCURRENCY), cancelled,
+                              progress, settings.SERVICE_POLL_INTERVAL)
+    except Exception as e:
+        # The plan could not be read
+        result = dict(name=task['name'], url=task['url'], status=FillStatus.ERROR, error=str(e), pid=os.getpid())
+    if result['status'] == FillStatus.CANCELLED and stop.is_set() and not queue.is_cancel_requested(job['id']):
+        # Interrupted by the service shutdown, the next start resumes it from the checkpoint
+        queue.requeue(worker=job['worker'], job_id=job['id'])
+        return
+    queue.finish(job['id'], result, job['worker'])
+
+
+def _heartbeat(queue: JobQueue, worker: str, done: threading.Event) -> None:
+    # A thread of its own, a job can wait on nz.ua far longer than its progress interval
+    while not done.wait(settings.SERVICE_HEARTBEAT_INTERVAL):
+        queue.heartbeat(worker)
+
+
+def _watch_service(pipe, stopped: threading.Event) -> None:
+    # The service closes its end of the pipe to stop the worker, the system closes it when the service dies
+    try:
+        pipe.recv()
+    except (EOFError, OSError):
+        pass
+    stopped.set()
+
+
+def _worker_main(state: dict, db_path: Path, pipe, worker: str) -> None:
+    # Ctrl+C reaches the whole process group, the service stops the workers through the pipe
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stopped = threading.Event()
+    threading.Thread(target=_watch_service, args=(pipe, stopped), daemon=True).start()
+    client = NZClient.from_state(state)
+    done = threading.Event()
+    with JobQueue(db_path) as queue:
+        threading.Thread(target=_heartbeat, args=(queue, worker, done), daemon=True).start()
+        try:
+            while not stopped.is_set():
+                job = queue.claim(worker)
+                if job is None:
+                    stopped.wait(settings.SERVICE_POLL_INTERVAL)
+                    continue
+                _run_job(client, queue, job, stopped)
+        finally:
+            done.set()
+    client.close()
+
+
+def _interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+    Local JSON API of the fill service.
+
+        GET  /jobs?status=queued&limit=100   latest jobs
+        POST /jobs                           submit {"journal", "plan", "sheet", "sync", "name"}
+                                             or {"kind": "export", "journal", "output", "name"},
+                                             output relative to the export directory
+        GET  /jobs/<id>                      job status, progress and result
+        POST /jobs/<id>/cancel               cancel, DELETE /jobs/<id> does the same
+
+    Every request needs the service bearer token and a localhost Host header,
+    job bodies must be sent as application/json.
+    """
+    service: "FillService"
+    # A page in the browser can reach the API through a rebound DNS name, its requests carry that name
+    LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+    def _send(self, data, status: int = 200) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(dict(error=message), status)
+
+    def _authorized(self) -> bool:
+        host = urlsplit(f"//{self.headers.get('Host', '')}").hostname
+        if host not in self.LOCAL_HOSTS:
+            self._error(403, "the API only answers requests to localhost")
+            return False
+        header = self.headers.get('Authorization', '')
+        if hmac.compare_digest(header.encode(), f"Bearer {self.service.token}".encode()):
+            return True
+        self._error(401, "invalid or missing token")
+        return False
+
+    def _is_json(self) -> bool:
+        # A form or a text/plain body can be posted by any page without a CORS preflight
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type == 'application/json':
+            return True
+        self._error(415, "the body must be application/json")
+        return False
+
+    def _route(self) -> tuple[list[str], dict]:
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        return [part for part in url.path.split('/') if part], query
+
+    def _job_id(self, parts: list[str]) -> int | None:
+        try:
+            return int(parts[1])
+        except ValueError:
+            self._error(404, "no such job")
+            return None
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        parts, query = self._route()
+        if parts == ['jobs']:
+            try:
+                limit = int(query.get('limit', 100))
+            except ValueError:
+                return self._error(400, "limit must be a number")
+            return self._send(self.service.queue.list(query.get('status'), limit))
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job_id = self._job_id(parts)
+            if job_id is None:
+                return
+            job = self.service.queue.get(job_id)
+            if job is None:
+                return self._error(404, "no such job")
+            return self._send(job)
+        self._error(404, "not found")
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        parts, _ = self._route()
+        if parts == ['jobs']:
+            if not self._is_json():
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                params = json.loads(self.rfile.read(length) or b'{}')
+                kind, params = self.service.validate(params)
+            except ValueError as e:
+                return self._error(400, str(e))
+            return self._send(self.service.queue.submit(kind, params), 201)
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            return self._cancel(parts)
+        self._error(404, "not found")
+
+    def do_DELETE(self) -> None:
+        if not self._authorized():
+            return
+        parts, _ = self._route()
+        if len(parts) == 2 and parts[0] == 'jobs':
+            return self._cancel(parts)
+        self._error(404, "not found")
+
+    def _cancel(self, parts: list[str]) -> None:
+        job_id = self._job_id(parts)
+        if job_id is None:
+            return
+        job = self.service.queue.cancel(job_id)
+        if job is None:
+            return self._error(404, "no such job")
+        self._send(job)
+
+
+class FillService:
+    """
+    Long-running fill and export service.
+
+    Jobs submitted through the local JSON API are kept in a SQLite JobQueue and
+    processed continuously by worker processes. Every worker logs in once from
+    the exported session of the client and reuses it for all of its jobs, it
+    runs one job at a time with the usual engine concurrency. Workers that die
+    are restarted and their running job is queued again, so are the jobs whose
+    lease expired, their worker is gone even if its pid was reused since.
+
+    :param NZClient client: Authenticated client the worker sessions are exported from
+    :param int workers: (optional) Worker processes
+    :param str host: (optional) Interface the API listens on
+    :param int port: (optional) Port of the API, 0 picks a free one
+    :param str token: (optional) Bearer token required by the API, a random one by default
+    :param Path db_path: (optional) SQLite job queue
+    :param Path export_dir: (optional) Directory the export jobs write their workbooks to
+    """
+
+    def __init__(self, client: NZClient, workers: int = settings.SERVICE_WORKERS, host: str = settings.SERVICE_HOST,
+                 port: int = settings.SERVICE_PORT, token: str | None = settings.SERVICE_TOKEN,
+                 db_path: Path = settings.SERVICE_DB_PATH, export_dir: Path = settings.SERVICE_EXPORT_DIR) -> None:
+        self.client = client
+        self.workers = max(1, workers)
+        self.token = token if token is not None else secrets.token_urlsafe(32)
+        self.token_path = settings.SERVICE_TOKEN_PATH
+        self.db_path = db_path
+        self.export_dir = export_dir.resolve()
+        self.queue = JobQueue(db_path)
+        self._context = multiprocessing.get_context('spawn')
+        self._stopping = False
+        # Worker processes, their ids in the queue and the service end of their stop pipes
+        self._processes: list = []
+        self._worker_ids: list[str] = []
+        self._pipes: list = []
+        handler = type('BoundApiHandler', (ApiHandler,), dict(service=self))
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self._http_thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def validate(self, params) -> tuple[str, dict]:
+        """
+        Checks a submitted job.
+
+        :return: Job kind and its parameters
+        :raises ValueError: The job is malformed
+        """
+        if not isinstance(params, dict):
+            raise ValueError("the job must be a JSON object")
+        kind = params.get('kind', 'fill')
+        if kind not in JobQueue.KINDS:
+            raise ValueError(f"kind must be one of {', '.join(JobQueue.KINDS)}")
+        if not params.get('journal'):
+            raise ValueError("journal is required")
+        job = dict(journal=params['journal'], name=params.get('name'))
+        if kind == 'export':
+            if not params.get('output'):
+                raise ValueError("output is required")
+            job['output'] = str(self._output_path(params['output']))
+            return kind, job
+        if not params.get('plan'):
+            raise ValueError("plan is required")
+        plan = Path(params['plan']).resolve()
+        if not plan.is_file():
+            raise ValueError(f"plan file {plan} does not exist")
+        sheet = params.get('sheet')
+        try:
+            reader = get_reader(str(plan))
+            if sheet is not None and sheet not in reader.sheet_names(str(plan)):
+                raise SheetNotFoundError(str(plan), sheet, reader.sheet_names(str(plan)))
+        except (UnsupportedFormatError, SheetNotFoundError, PlanFormatError) as e:
+            raise ValueError(str(e))
+        return kind, dict(job, plan=str(plan), sheet=sheet, sync=bool(params.get('sync', False)))
+
+    def _output_path(self, output) -> Path:
+        # The API must not let a job overwrite any file the user can write
+        if not isinstance(output, str):
+            raise ValueError("output must be a path")
+        relative = Path(output)
+        if relative.is_absolute() or relative.drive or '..' in relative.parts:
+            raise ValueError("output must be a path inside the export directory")
+        path = (self.export_dir / relative).resolve()
+        if not path.is_relative_to(self.export_dir) or path == self.export_dir:
+            raise ValueError("output must be a path inside the export directory")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def start(self) -> "FillService":
+        requeued, failed = self._recover_expired()
+        if requeued or failed:
+            print(f"Requeued {requeued} and failed {failed} jobs interrupted by the previous run", file=sys.stderr)
+        self._write_token()
+        self._stopping = False
+        for _ in range(self.workers):
+            self._spawn()
+        self._http_thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._http_thread.start()
+        return self
+
+    def _write_token(self) -> None:
+        # Local clients read the token from the file, it is created readable by the current user only
+        self.token_path.parent.mkdir(parents=True, exist_ok=True)
+        self.token_path.unlink(missing_ok=True)
+        descriptor = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(self.token)
+
+    def _recover_expired(self) -> tuple[int, int]:
+        # Workers left behind by a killed service keep their lease until they requeue their jobs themselves
+        requeued = failed = 0
+        for worker in self.queue.workers(settings.SERVICE_LEASE_TIMEOUT):
+            worker_requeued, worker_failed = self.queue.recover(worker)
+            requeued += worker_requeued
+            failed += worker_failed
+        return requeued, failed
+
+    def _spawn(self, index: int | None = None) -> None:
+        # An event shared with the workers can deadlock once a worker is killed while waiting on it, a pipe cannot
+        reader, writer = self._context.Pipe(duplex=False)
+        # A pid can be reused by another process once the worker is gone, after a reboot in particular
+        worker = uuid.uuid4().hex
+        process = self._context.Process(target=_worker_main,
+                                        args=(self.client.export_state(), self.db_path, reader, worker), daemon=True)
+        process.start()
+        reader.close()
+        if index is None:
+            self._processes.append(process)
+            self._worker_ids.append(worker)
+            self._pipes.append(writer)
+        else:
+            self._pipes[index].close()
+            self._processes[index] = process
+            self._worker_ids[index] = worker
+            self._pipes[index] = writer
+
+    def check_workers(self) -> None:
+        """
+        Restarts the workers that died and recovers the jobs whose lease expired,
+        their running job is queued again or failed, see JobQueue.recover().
+        """
+        if self._stopping:
+            return
+        for index, process in enumerate(self._processes):
+            if not process.is_alive():
+                self.queue.recover(self._worker_ids[index])
+                self._spawn(index)
+        self._recover_expired()
+
+    def serve_forever(self, interval: float = settings.SERVICE_POLL_INTERVAL) -> None:
+        """
+        Runs until interrupted, Ctrl+C or SIGTERM lets the workers finish their lessons in flight.
+        """
+        previous = signal.signal(signal.SIGTERM, _interrupt)
+        self.start()
+        try:
+            while True:
+                time.sleep(interval)
+                self.check_workers()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            signal.signal(signal.SIGTERM, previous)
+
+    def stop(self) -> None:
+        """
+        Stops the API and the workers, the running jobs are queued again for the next start.
+        """
+        self._stopping = True
+        for pipe in self._pipes:
+            pipe.close()
+        if self._http_thread is not None:
+            self.httpd.shutdown()
+            self._http_thread = None
+        self.httpd.server_close()
+        for process in self._processes:
+            process.join()
+        self._processes, self._worker_ids, self._pipes = [], [], []
+        self.token_path.unlink(missing_ok=True)
+        self.queue.close()
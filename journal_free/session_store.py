@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from journal_free import settings
+
+if TYPE_CHECKING:
+    from requests import Session
+
+
+def export_session(session: "Session") -> dict:
+    """
+    Serializes the cookie jar with the User-Agent and the TLS cipher suite the antibot clearance cookies are bound to.
+    """
+    return dict(
+        user_agent=session.headers.get('User-Agent'),
+        cipher_suite=getattr(session, 'cipherSuite', None),
+        cookies=[
+            dict(
+                name=cookie.name,
+                value=cookie.value,
+                domain=cookie.domain,
+                path=cookie.path,
+                expires=cookie.expires,
+                secure=cookie.secure,
+                rest=dict(cookie._rest),
+            )
+            for cookie in session.cookies
+        ],
+    )
+
+
+def import_session(session: "Session", state: dict) -> None:
+    """
+    Loads a state created by export_session into the session.
+
+    The cipher suite is fixed when the session is created, see NZClient.load_session_state.
+    """
+    if state.get('user_agent'):
+        session.headers['User-Agent'] = state['user_agent']
+    for cookie in state.get('cookies', []):
+        session.cookies.set(**cookie)
+
+
+class SessionStore:
+    """
+    Authenticated session of one nz.ua user kept on disk between launches.
+
+    The file name is a hash of the username and the file is readable by its owner only.
+
+    :param str username: nz.ua login
+    :param Path directory: (optional) Directory with the stored sessions
+    """
+    LAST_USER_FILE = "last_user"
+
+    def __init__(self, username: str, directory: Path = settings.SESSION_DIR) -> None:
+        self.username = username
+        self.directory = directory
+        self.path = directory / f"{hashlib.sha256(username.encode()).hexdigest()}.json"
+
+    def _write(self, path: Path, content: str) -> None:
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+    def save(self, session: "Session", user: str | None) -> None:
+        self._write(self.path, json.dumps(dict(user=user, **export_session(session))))
+        self._write(self.directory / self.LAST_USER_FILE, self.username)
+
+    def load(self) -> dict | None:
+        """
+        Reads the stored session.
+
+        :return: State created by export_session, None if no session is stored
+        """
+        try:
+            return json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+        (self.directory / self.LAST_USER_FILE).unlink(missing_ok=True)
+
+    @classmethod
+    def last_username(cls, directory: Path = settings.SESSION_DIR) -> str | None:
+        """
+        Returns the user of the last saved session if it is still stored.
+        """
+        try:
+            username = (directory / cls.LAST_USER_FILE).read_text(encoding='utf-8')
+        except OSError:
+            return None
+        return username if cls(username, directory).path.exists() else None
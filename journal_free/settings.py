@@ -1,5 +1,105 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
 
-BASE_URL = "https://old.nz.ua"
\ No newline at end of file
+# Per user application data (checkpoints, sessions)
+DATA_DIR = Path.home() / ".journal_free"
+
+# Overridable to run against a local stand-in server, see benchmarks/fake_server.py
+BASE_URL = os.environ.get("NZ_BASE_URL", "https://old.nz.ua")
+
+# Seconds an unused pooled HTTP session of NZClient keeps its connections before it is closed
+SESSION_IDLE_TIMEOUT = 120
+
+# Maximum number of journal pagination pages fetched at once
+PAGE_CONCURRENCY = 4
+
+# Lessons submitted to the journal at once, the starting point when the concurrency is adaptive
+SUBMIT_CONCURRENCY = 6
+
+# Lesson pages read at once by a journal export, the starting point when the concurrency is adaptive
+EXPORT_CONCURRENCY = 8
+
+# Tune the lessons in flight to nz.ua latency: additive increase while responses stay
+# fast, multiplicative decrease on slowdowns, errors and antibot responses
+ADAPTIVE_CONCURRENCY = True
+ADAPTIVE_MIN_CONCURRENCY = 1
+ADAPTIVE_MAX_CONCURRENCY = 24
+ADAPTIVE_DECREASE = 0.5
+ADAPTIVE_LATENCY_TOLERANCE = 2.0
+
+# Threads of the GUI request scheduler, a fill or export runs its lessons on it as bulk jobs
+SCHEDULER_WORKERS = ADAPTIVE_MAX_CONCURRENCY + 4
+# Scheduler threads bulk jobs cannot take, they keep the interface responsive during a fill
+SCHEDULER_RESERVED = 2
+
+# HTML extraction backend: "lxml", "soup" or "auto" (lxml when installed)
+HTML_PARSER = "auto"
+
+# SQLite journal with the lessons confirmed by interrupted fill runs
+CHECKPOINT_PATH = DATA_DIR / "checkpoints.sqlite3"
+
+# Keep the authenticated session on disk so the next launch skips the login
+REMEMBER_SESSION = True
+SESSION_DIR = DATA_DIR / "sessions"
+
+# Seconds NZClient keeps parsed GET responses per endpoint path, other endpoints are not cached
+CACHE_TTL = {
+    "/journal/list": 120,
+}
+# POST endpoints after which every cached response is dropped
+CACHE_INVALIDATE_ALL = ("/login", "/site/semester-change")
+
+# Responses retried with exponential backoff and jitter, antibot challenge pages are retried too
+RETRY_STATUSES = (403, 429, 503)
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+# The circuit breaker pauses every request of the client once this share of the
+# requests in the window is blocked, the pause doubles up to the maximum while it keeps tripping
+BREAKER_WINDOW = 30
+BREAKER_MIN_REQUESTS = 10
+BREAKER_RATE = 0.5
+BREAKER_COOLDOWN = 15
+BREAKER_MAX_COOLDOWN = 120
+
+# Seconds between the progress reports of a running fill or export
+PROGRESS_INTERVAL = 0.25
+
+# JSON-lines file every NZClient request span is appended to, none by default
+TRACE_PATH = os.environ.get("JOURNAL_FREE_TRACE") or None
+# Latest request spans kept per endpoint for the timing percentiles
+TRACE_SAMPLES = 10000
+
+# Lessons in flight across all journals of a batch fill
+BATCH_CONCURRENCY = 12
+# Journals filled at once by a batch fill
+BATCH_JOURNALS = 4
+
+# Worker processes of a sharded batch fill or export, every process handles one journal at a time
+SHARD_PROCESSES = os.cpu_count() or 1
+
+# Fill service: SQLite job queue, worker processes and the local JSON API, see service.py
+SERVICE_DB_PATH = DATA_DIR / "jobs.sqlite3"
+SERVICE_WORKERS = 2
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8750
+# Bearer token required by the API, a random one is generated at startup when it is not set
+SERVICE_TOKEN = os.environ.get("JOURNAL_FREE_SERVICE_TOKEN") or None
+# File the token of the running service is written to, readable by the current user only
+SERVICE_TOKEN_PATH = DATA_DIR / "service_token"
+# Directory the export jobs write to, their output is a path relative to it
+SERVICE_EXPORT_DIR = DATA_DIR / "exports"
+# Times the worker running a job may die before the job fails instead of being queued again
+SERVICE_MAX_CRASHES = 3
+# Seconds between the heartbeats of a worker renewing the lease of its running job
+SERVICE_HEARTBEAT_INTERVAL = 5.0
+# Seconds without a heartbeat after which the job of a worker is recovered, whatever process has its pid now
+SERVICE_LEASE_TIMEOUT = 30.0
+# Seconds an idle worker waits before looking for queued jobs again, and between the cancel checks of a running job
+SERVICE_POLL_INTERVAL = 1.0
+
+# Print a startup timing report to stderr, starts slower than the budget are flagged
+STARTUP_TIMING = os.environ.get("JOURNAL_FREE_STARTUP_TIMING", "") == "1"
+STARTUP_BUDGET_MS = float(os.environ.get("JOURNAL_FREE_STARTUP_BUDGET_MS", 1500))
@@ -0,0 +1,219 @@
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+from journal_free import settings
+from journal_free.client import NZClient, FileClient
+from journal_free.engine import BaseEngine, SubmissionEngine, ExportEngine, FillStatus, Progress
+
+# State of a worker process, set once by _init_worker
+_client: NZClient | None = None
+_cancelled = None
+_progress = None
+
+
+def _init_worker(state: dict, cancelled, progress) -> None:
+    global _client, _cancelled, _progress
+    # Ctrl+C reaches the whole process group, the parent cancels the workers through the event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _client = NZClient.from_state(state)
+    _cancelled = cancelled
+    _progress = progress
+
+
+@contextmanager
+def cancel_when(engine: BaseEngine, cancelled: Callable[[], bool], interval: float = 0.1):
+    """
+    Polls the cancel condition while the engine runs and cancels the engine once it holds.
+
+    :param BaseEngine engine: Running engine
+    :param cancelled: Condition checked every interval, it may wait for up to the interval itself
+    :param float interval: (optional) Seconds between the checks
+    """
+    done = threading.Event()
+
+    def watch():
+        while not done.wait(interval):
+            if cancelled():
+                engine.cancel()
+                return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        done.set()
+        watcher.join()
+
+
+def run_fill(client: NZClient, job: dict, options: dict, cancelled: Callable[[], bool],
+             progress: Callable[[Progress], None] | None = None, interval: float = 0.1) -> dict:
+    """
+    Fills one journal of a sharded run or a service job.
+
+    :param NZClient client: Authenticated client of the worker
+    :param dict job: Journal ``url``, display ``name`` and plan ``file``
+    :param dict options: ``concurrency``, ``sync``, ``resume`` and ``adaptive`` of the engine
+    :param cancelled: Condition cancelling the fill, see cancel_when
+    :param progress: (optional) Callback receiving Progress snapshots
+    :param float interval: (optional) Seconds between the cancel checks
+    :return: Report of the journal
+    """
+    report = dict(name=job.get('name', job['url']), url=job['url'], error=None, pid=os.getpid())
+    counters = dict(total=0, submitted=0, skipped=0, resumed=0, failed=0)
+    file: FileClient = job['file']
+    if not file.is_valid:
+        return dict(report, status=FillStatus.INVALID_PLAN, **counters)
+    if cancelled():
+        return dict(report, status=FillStatus.CANCELLED, **counters)
+    engine = SubmissionEngine(client, concurrency=options['concurrency'], sync=options['sync'],
+                              adaptive=options['adaptive'], progress=progress)
+    try:
+        with cancel_when(engine, cancelled, interval):
+            status = engine.fill(job['url'], file, resume=options['resume'])
+    except Exception as e:
+        status = FillStatus.ERROR
+        report['error'] = str(e)
+    return dict(
+        report,
+        status=status,
+        total=engine.total,
+        submitted=engine.submitted,
+        skipped=engine.skipped,
+        resumed=engine.resumed,
+        failed=engine.failed,
+        limit=engine.limiter.limit,
+        latency=engine.limiter.latency,
+    )
+
+
+def run_export(client: NZClient, job: dict, options: dict, cancelled: Callable[[], bool],
+               progress: Callable[[Progress], None] | None = None, interval: float = 0.1) -> dict:
+    """
+    Exports one journal of a sharded run or a service job, see run_fill.
+
+    :param dict job: Journal ``url``, display ``name`` and the ``output`` xlsx file
+    :return: Report of the journal
+    """
+    report = dict(name=job.get('name', job['url']), url=job['url'], file=job['output'], error=None, pid=os.getpid())
+    if cancelled():
+        return dict(report, status=FillStatus.CANCELLED, lessons=0)
+    engine = ExportEngine(client, concurrency=options['concurrency'], adaptive=options['adaptive'], progress=progress)
+    try:
+        with cancel_when(engine, cancelled, interval):
+            status = engine.export(job['url'], job['output'])
+    except Exception as e:
+        status = FillStatus.ERROR
+        report['error'] = str(e)
+    return dict(report, status=status, lessons=engine.total, limit=engine.limiter.limit,
+                latency=engine.limiter.latency)
+
+
+def _report_progress(name: str) -> Callable[[Progress], None] | None:
+    if _progress is None:
+        return None
+    return lambda progress: _progress.put((name, progress))
+
+
+def _fill_journal(job: dict, options: dict) -> dict:
+    return run_fill(_client, job, options, _cancelled.is_set, _report_progress(job.get('name', job['url'])))
+
+
+def _export_journal(job: dict, options: dict) -> dict:
+    return run_export(_client, job, options, _cancelled.is_set, _report_progress(job.get('name', job['url'])))
+
+
+class ShardedRun:
+    """
+    Fills or exports many journals on a pool of worker processes.
+
+    Parsing the pages and writing the workbooks is CPU work held by the GIL,
+    a single process saturates one core long before the network. Journals are
+    sharded across the processes, every process logs in once from the exported
+    session of the client and handles one journal at a time with its own
+    engine and concurrency limit. The reports are merged in job order.
+
+    Plans are validated in the parent, so the jobs of BatchFill can be passed as is.
+
+    :param NZClient client: Authenticated client the worker sessions are exported from
+    :param int processes: (optional) Worker processes
+    :param int concurrency: (optional) Lessons in flight per process, the initial limit when adaptive
+    :param bool sync: (optional) Skip lessons whose journal content already matches the plan row
+    :param bool resume: (optional) Resume interrupted fills from their checkpoints
+    :param bool adaptive: (optional) Tune the concurrency of every process to the server latency
+    :param progress: (optional) Callback receiving the journal name and its Progress snapshots
+    """
+
+    def __init__(self, client: NZClient, processes: int = settings.SHARD_PROCESSES,
+                 concurrency: int = settings.SUBMIT_CONCURRENCY, sync: bool = False, resume: bool = True,
+                 adaptive: bool = settings.ADAPTIVE_CONCURRENCY,
+                 progress: Callable[[str, Progress], None] | None = None) -> None:
+        self.client = client
+        self.processes = max(1, processes)
+        self.concurrency = max(1, concurrency)
+        self.sync = sync
+        self.resume = resume
+        self.adaptive = adaptive
+        self.on_progress = progress
+        # Workers are spawned, forking a process with running threads is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self._cancelled = self._context.Event()
+
+    def cancel(self) -> None:
+        """
+        Cancels the running journals and the journals not started yet, fill checkpoints are kept.
+        """
+        self._cancelled.set()
+
+    def fill(self, jobs: Iterable[dict]) -> list[dict]:
+        """
+        Fills every journal and waits for all of them.
+
+        :param jobs: Dicts with the journal ``url``, its display ``name`` and the plan ``file``
+        :return: Report of every journal in job order
+        """
+        return self._run(_fill_journal, jobs)
+
+    def export(self, jobs: Iterable[dict]) -> list[dict]:
+        """
+        Exports every journal and waits for all of them.
+
+        :param jobs: Dicts with the journal ``url``, its display ``name`` and the ``output`` xlsx file
+        :return: Report of every journal in job order
+        """
+        return self._run(_export_journal, jobs)
+
+    def _run(self, task: Callable[[dict, dict], dict], jobs: Iterable[dict]) -> list[dict]:
+        jobs = list(jobs)
+        if not jobs:
+            return []
+        self._cancelled.clear()
+        options = dict(concurrency=self.concurrency, sync=self.sync, resume=self.resume, adaptive=self.adaptive)
+        progress = self._context.Queue() if self.on_progress is not None else None
+        forwarder = None
+        if progress is not None:
+            forwarder = threading.Thread(target=self._forward_progress, args=(progress,), daemon=True)
+            forwarder.start()
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.processes, len(jobs)), mp_context=self._context,
+                                     initializer=_init_worker,
+                                     initargs=(self.client.export_state(), self._cancelled, progress)) as executor:
+                futures = [executor.submit(task, job, options) for job in jobs]
+                return [future.result() for future in futures]
+        finally:
+            if progress is not None:
+                progress.put(None)
+                forwarder.join()
+                progress.close()
+
+    def _forward_progress(self, progress) -> None:
+        while True:
+            item = progress.get()
+            if item is None:
+                return
+            self.on_progress(*item)
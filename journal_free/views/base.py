@@ -10,6 +10,7 @@ from PySide6.QtCore import Qt, QSize, QRect, QPoint, QMargins, Property, QProper
 from PySide6.QtGui import QPalette, QBrush, QRadialGradient, QColor, QPainter, QPainterPath, QIcon, QPixmap, QTransform, \
     QCursor
 
+from journal_free.readers import READERS, supported_extensions
 from journal_free.settings import BASE_DIR
 
 SCROLL_STYLE = """
@@ -168,6 +169,8 @@ COMBO_STYLE = """
 class OperationStatus:
     ERROR = "error"
     NO_LESSONS = "no lessons"
+    INVALID_PLAN = "invalid plan"
+    CANCELLED = "cancelled"
     SUCCESS = "success"
 
 class Spinner(QWidget):
@@ -576,7 +579,7 @@ class FileSelectorWidget(QFrame):
         icon_label.setPixmap(pixmap)
         icon_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
-        text_label = QLabel("Нажмите для выбора файла\nПоддерживаемые форматы XLS, XLSX")
+        text_label = QLabel("Нажмите для выбора файла\nПоддерживаемые форматы " + ", ".join(name.upper() for name in READERS))
         text_label.setStyleSheet("font-family: 'Inter'; font-style: normal; font-weight: 400; font-size: 14px; line-height: 20px; text-align: center; color: #707070;")
         text_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
@@ -592,7 +595,7 @@ class FileSelectorWidget(QFrame):
         self.layout.addWidget(self.button)
 
     def openFileDialog(self):
-        self.file_name, _ = QFileDialog.getOpenFileName(self, "Выбор файла", "", "Excel Files (*.xlsx *.xls)")
+        self.file_name, _ = QFileDialog.getOpenFileName(self, "Выбор файла", "", f"Файлы плана ({' '.join('*' + extension for extension in supported_extensions())})")
         if self.file_name:
             self.showSelectedFile()
 
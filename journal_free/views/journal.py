@@ -1,13 +1,16 @@
-from typing import Callable
+from typing import Callable, TYPE_CHECKING
 
 from PySide6.QtGui import QCursor, QIcon
 from PySide6.QtWidgets import QFrame, QVBoxLayout, QPushButton, QLabel, \
-    QSpacerItem, QSizePolicy, QWidget, QScrollArea, QHBoxLayout
+    QSpacerItem, QSizePolicy, QWidget, QScrollArea, QHBoxLayout, QCheckBox
 from PySide6.QtCore import Qt, QSize
 
 from journal_free.settings import BASE_DIR
 from journal_free.views.base import SCROLL_STYLE, FileSelectorWidget, Spinner
 
+if TYPE_CHECKING:
+    from journal_free.engine import Progress
+
 
 class JournalWindow(QWidget):
     title = "Настройки автозаполнения"
@@ -82,10 +85,20 @@ class JournalWindow(QWidget):
     def setFillEvent(self, event: Callable):
         self.save_button.clicked.connect(event)
 
+    def setExportEvent(self, event: Callable):
+        self.export_button.clicked.connect(event)
+
+    def setStopEvent(self, event: Callable):
+        self.stop_button.clicked.connect(event)
+
     @property
     def file_path(self):
         return self.file_selector.file_name
 
+    @property
+    def sync_enabled(self) -> bool:
+        return self.sync_checkbox.isChecked()
+
     def load_content(self, subject: str, class_: dict, selected_term: str):
         self.journal_url = class_['url']
         self.class_ = f"{subject} - {class_['name']}"
@@ -152,42 +165,118 @@ class JournalWindow(QWidget):
         self.file_selector = FileSelectorWidget(file_frame)
         file_layout.addWidget(self.file_selector)
 
+        self.sync_checkbox = QCheckBox("Пропускать уроки, которые уже совпадают с планированием", file_frame)
+        self.sync_checkbox.setStyleSheet(
+            "QCheckBox{font-family: 'Inter'; font-style: normal; font-weight: 400; font-size: 12px; line-height: 15px; color: #464646;}")
+        self.sync_checkbox.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
+        self.sync_checkbox.setChecked(True)
+        file_layout.addWidget(self.sync_checkbox)
+
         self.content_layout.addWidget(file_frame)
 
         self.content_layout.addItem(QSpacerItem(15, 15, QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed))
 
-        self.save_button = QPushButton(self)
-        self.save_button.setFixedSize(150, 40)
-        self.save_button.setStyleSheet("QPushButton {background-color: #FF4D00; border-radius: 10px;} QPushButton:hover {background-color: #FF7337;} QPushButton:pressed {background-color: #E1632D;}")
-        self.save_button.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
-        self.save_button.setFlat(True)
-        self.content_layout.addWidget(self.save_button)
-
-        self.save_button_layout = QVBoxLayout(self.save_button)
-        self.save_button_layout.setContentsMargins(0, 0, 0, 0)
-        self.save_button_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        self.save_button_icon = Spinner(self.save_button)
-        self.save_button_icon.setFixedSize(28, 28)
-        self.save_button_icon.setStyleSheet("background: none;")
-        self.save_button_icon.setVisible(False)
-        self.save_button_layout.addWidget(self.save_button_icon)
-
-        self.save_button_text = QLabel("Заполнить", self.save_button)
-        self.save_button_text.setStyleSheet("background: none; font-family: 'Inter'; font-style: normal; font-weight: 700; font-size: 16px; line-height: 19px; color: #FFFFFF;")
-        self.save_button_text.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.save_button_text.setVisible(True)
-        self.save_button_layout.addWidget(self.save_button_text)
+        buttons = QFrame(self)
+        buttons.setStyleSheet('background: none;')
+        buttons_layout = QHBoxLayout(buttons)
+        buttons_layout.setContentsMargins(0, 0, 0, 0)
+        buttons_layout.setAlignment(Qt.AlignmentFlag.AlignLeft)
+
+        self.save_button, self.save_button_icon, self.save_button_text = self._action_button(
+            buttons, "Заполнить",
+            "QPushButton {background-color: #FF4D00; border-radius: 10px;} QPushButton:hover {background-color: #FF7337;} QPushButton:pressed {background-color: #E1632D;}",
+            "#FFFFFF")
+        buttons_layout.addWidget(self.save_button)
+
+        self.export_button, self.export_button_icon, self.export_button_text = self._action_button(
+            buttons, "Скачать",
+            "QPushButton {background-color: #FFFFFF; border: 1px solid #FF4D00; border-radius: 10px;} QPushButton:hover {background-color: #FFF1EB;} QPushButton:pressed {background-color: #FFE3D6;}",
+            "#FF4D00")
+        buttons_layout.addWidget(self.export_button)
+
+        self.stop_button, _, _ = self._action_button(
+            buttons, "Остановить",
+            "QPushButton {background-color: #FFFFFF; border: 1px solid #ABABAB; border-radius: 10px;} QPushButton:hover {background-color: #F3F3F3;} QPushButton:pressed {background-color: #E6E6E6;}",
+            "#464646")
+        self.stop_button.setVisible(False)
+        buttons_layout.addWidget(self.stop_button)
+
+        self.content_layout.addWidget(buttons)
+
+        self.progress_label = QLabel(self)
+        self.progress_label.setStyleSheet(
+            "QLabel{background: none; font-family: 'Inter'; font-style: normal; font-weight: 400; font-size: 12px; line-height: 15px; color: #464646;}")
+        self.progress_label.setVisible(False)
+        self.content_layout.addWidget(self.progress_label)
+
+    @staticmethod
+    def _action_button(parent: QWidget, text: str, style: str, color: str) -> tuple[QPushButton, Spinner, QLabel]:
+        button = QPushButton(parent)
+        button.setFixedSize(150, 40)
+        button.setStyleSheet(style)
+        button.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
+        button.setFlat(True)
+
+        button_layout = QVBoxLayout(button)
+        button_layout.setContentsMargins(0, 0, 0, 0)
+        button_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        button_icon = Spinner(button)
+        button_icon.setFixedSize(28, 28)
+        button_icon.setStyleSheet("background: none;")
+        button_icon.setVisible(False)
+        button_layout.addWidget(button_icon)
+
+        button_text = QLabel(text, button)
+        button_text.setStyleSheet(f"background: none; font-family: 'Inter'; font-style: normal; font-weight: 700; font-size: 16px; line-height: 19px; color: {color};")
+        button_text.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        button_text.setVisible(True)
+        button_layout.addWidget(button_text)
+        return button, button_icon, button_text
 
     def set_enabled(self, is_enabled: bool):
         self.backspace_button.setEnabled(is_enabled)
         self.save_button.setEnabled(is_enabled)
+        self.export_button.setEnabled(is_enabled)
         self.file_selector.set_enable(is_enabled)
+        self.sync_checkbox.setEnabled(is_enabled)
 
     def loading(self, is_loading: bool):
-        self.save_button_text.setVisible(not is_loading)
-        self.save_button_icon.setVisible(is_loading)
+        self._button_loading(self.save_button_icon, self.save_button_text, is_loading)
+
+    def running(self, is_running: bool):
+        """ Stop button and progress line of a running fill or export """
+        self.stop_button.setEnabled(True)
+        self.stop_button.setVisible(is_running)
+        self.progress_label.setText('')
+        self.progress_label.setVisible(is_running)
+
+    def stopping(self):
+        self.stop_button.setEnabled(False)
+        self.progress_label.setText('Остановка, ожидание отправленных уроков...')
+
+    def show_progress(self, progress: "Progress"):
+        if not self.stop_button.isEnabled():
+            return
+        text = f"Обработано уроков: {progress.done}"
+        if progress.expected is not None:
+            text += f" из {progress.expected}"
+        if progress.failed:
+            text += f", ошибок: {progress.failed}"
+        if progress.throughput:
+            text += f" · {progress.throughput:.1f} ур./с"
+        if progress.eta is not None:
+            text += f" · осталось ~{progress.eta:.0f} с"
+        self.progress_label.setText(text)
+
+    def export_loading(self, is_loading: bool):
+        self._button_loading(self.export_button_icon, self.export_button_text, is_loading)
+
+    @staticmethod
+    def _button_loading(icon: Spinner, text: QLabel, is_loading: bool):
+        text.setVisible(not is_loading)
+        icon.setVisible(is_loading)
         if is_loading:
-            self.save_button_icon.start()
+            icon.start()
         else:
-            self.save_button_icon.stop()
+            icon.stop()
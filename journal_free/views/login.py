@@ -127,6 +127,9 @@ class LoginWindow(QWidget):
     def password(self):
         return self.login_password_input.text()
 
+    def set_username(self, username: str) -> None:
+        self.login_username_input.setText(username)
+
     def set_enabled_form(self, is_enabled: bool):
         self.login_button.setEnabled(is_enabled)
         self.login_username_input.setEnabled(is_enabled)
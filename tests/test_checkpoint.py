@@ -0,0 +1,55 @@
+from journal_free.checkpoint import Checkpoint
+from journal_free.engine import SubmissionEngine, FillStatus
+
+from test_engine import StubClient, write_plan
+
+
+def test_confirmed_lessons_survive_a_restart(tmp_path):
+    path = tmp_path / 'checkpoints.sqlite3'
+    with Checkpoint('/journal', 'plan', path) as checkpoint:
+        checkpoint.confirm(0, '/lesson/0')
+        checkpoint.confirm(1, '/lesson/1')
+    with Checkpoint('/journal', 'plan', path) as checkpoint:
+        assert checkpoint.count == 2
+        assert checkpoint.is_confirmed(1, '/lesson/1')
+        # A lesson moved to another position of the journal is not the confirmed one
+        assert not checkpoint.is_confirmed(1, '/lesson/5')
+        assert not checkpoint.is_confirmed(2, '/lesson/2')
+
+
+def test_runs_are_kept_per_journal_and_plan(tmp_path):
+    path = tmp_path / 'checkpoints.sqlite3'
+    with Checkpoint('/journal', 'plan', path) as checkpoint:
+        checkpoint.confirm(0, '/lesson/0')
+    with Checkpoint('/journal', 'changed plan', path) as checkpoint:
+        assert checkpoint.count == 0
+    with Checkpoint('/other', 'plan', path) as checkpoint:
+        assert checkpoint.count == 0
+
+
+def test_clear_forgets_the_run(tmp_path):
+    path = tmp_path / 'checkpoints.sqlite3'
+    with Checkpoint('/journal', 'plan', path) as checkpoint:
+        checkpoint.confirm(0, '/lesson/0')
+        checkpoint.clear()
+        assert checkpoint.count == 0
+    with Checkpoint('/journal', 'plan', path) as checkpoint:
+        assert checkpoint.count == 0
+
+
+def test_a_failed_fill_resumes_after_its_confirmed_lessons(tmp_path):
+    path = tmp_path / 'checkpoints.sqlite3'
+    plan = write_plan(tmp_path / 'plan.csv', 6)
+    client = StubClient(6, fail=('/lesson/3',))
+    engine = SubmissionEngine(client, checkpoint=Checkpoint('/journal', plan.hash, path), concurrency=1, adaptive=False)
+    assert engine.fill('/journal', plan) == FillStatus.ERROR
+    assert sorted(client.submitted) == ['/lesson/0', '/lesson/1', '/lesson/2']
+
+    client.fail = ()
+    client.submitted.clear()
+    engine = SubmissionEngine(client, checkpoint=Checkpoint('/journal', plan.hash, path), concurrency=1, adaptive=False)
+    assert engine.fill('/journal', plan) == FillStatus.SUCCESS
+    assert engine.resumed == 3
+    assert sorted(client.submitted) == ['/lesson/3', '/lesson/4', '/lesson/5']
+    with Checkpoint('/journal', plan.hash, path) as checkpoint:
+        assert checkpoint.count == 0
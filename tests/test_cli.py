@@ -0,0 +1,18 @@
+from journal_free import cli
+from journal_free.client import NZClient
+
+
+def test_login_fails_when_the_login_form_is_missing(monkeypatch, capsys):
+    monkeypatch.setattr(NZClient, 'restore_session', lambda self: False)
+    monkeypatch.setattr(NZClient, 'authenticate', lambda self: False)
+    assert cli.main(['-u', 'teacher', '-p', 'secret', 'login']) == 1
+    captured = capsys.readouterr()
+    assert 'Logged in' not in captured.out
+    assert 'login form' in captured.err
+
+
+def test_a_damaged_plan_exits_with_a_message(monkeypatch, capsys, tmp_path):
+    monkeypatch.setattr(cli, '_login', lambda args: None)
+    (tmp_path / 'plan.json').write_text('[[1, "Тема"', 'utf-8')
+    assert cli.main(['fill', str(tmp_path / 'plan.json'), '--journal', '/journal']) == 1
+    assert 'plan.json is not a valid plan file' in capsys.readouterr().err
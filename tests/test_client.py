@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_server import FakeNZServer
+from benchmarks.throughput import login, write_plan
+from journal_free import settings
+from journal_free.async_client import AsyncNZClient
+from journal_free.client import NZClient
+from journal_free.engine import SubmissionEngine, FillStatus
+from journal_free.session_store import SessionStore
+
+CIPHER_SUITE = 'ECDHE-RSA-AES128-GCM-SHA256'
+
+
+@pytest.fixture
+def server():
+    with FakeNZServer() as server:
+        yield server
+
+
+def test_sessions_are_reused_across_fills(server, tmp_path):
+    client = login(server, tmp_path)
+    plan = write_plan(tmp_path / 'plan.csv', server.site.lessons_per_journal)
+    created = []
+    for _ in range(3):
+        engine = SubmissionEngine(client, concurrency=4, adaptive=False)
+        assert engine.fill(server.journal_url(), plan, resume=False) == FillStatus.SUCCESS
+        created.append(client.session_stats['created'])
+    assert created[1] == created[2] == created[0]
+    client.close()
+
+
+def test_idle_sessions_expire(server, tmp_path, monkeypatch):
+    client = login(server, tmp_path)
+    with client._session(), client._session():
+        pass
+    assert client.session_stats['idle'] == 2
+    monkeypatch.setattr(settings, 'SESSION_IDLE_TIMEOUT', 0)
+    with client._session():
+        pass
+    assert client.session_stats['idle'] == 1
+    client.close()
+    assert client.session_stats['idle'] == 0
+
+
+def test_restored_session_keeps_the_cipher_suite(server, tmp_path):
+    client = NZClient("teacher", server.site.password, session_store=SessionStore("teacher", tmp_path),
+                      base_url=server.url)
+    client.load_session_state(dict(cipher_suite=CIPHER_SUITE))
+    client.authenticate()
+    assert SessionStore("teacher", tmp_path).load()['cipher_suite'] == CIPHER_SUITE
+
+    restored = NZClient("teacher", '', session_store=SessionStore("teacher", tmp_path), base_url=server.url)
+    assert restored.restore_session()
+    assert restored.user == client.user
+    assert restored._main_session.cipherSuite == CIPHER_SUITE
+    with restored._session() as session:
+        assert session.cipherSuite == CIPHER_SUITE
+
+
+def test_worker_client_keeps_the_cipher_suite(server, tmp_path):
+    client = NZClient("teacher", server.site.password, session_store=SessionStore("teacher", tmp_path),
+                      base_url=server.url)
+    client.load_session_state(dict(cipher_suite=CIPHER_SUITE))
+    client.authenticate()
+    worker = NZClient.from_state(client.export_state())
+    assert worker._main_session.cipherSuite == CIPHER_SUITE
+    assert worker.cookies.get_dict() == client.cookies.get_dict()
+    assert worker.get_journals() is not None
+
+
+def test_restore_keeps_the_stored_session_when_offline(server, tmp_path, monkeypatch):
+    login(server, tmp_path)
+    restored = NZClient("benchmark", '', session_store=SessionStore("benchmark", tmp_path), base_url=server.url)
+
+    def offline(*args, **kwargs):
+        raise ConnectionError("Network is unreachable")
+
+    monkeypatch.setattr(restored, '_request', offline)
+    assert not restored.restore_session()
+    assert SessionStore("benchmark", tmp_path).load() is not None
+    assert SessionStore.last_username(tmp_path) == "benchmark"
+
+
+def test_restore_clears_a_logged_out_session(server, tmp_path):
+    login(server, tmp_path)
+    server.site.sessions.clear()
+    restored = NZClient("benchmark", '', session_store=SessionStore("benchmark", tmp_path), base_url=server.url)
+    assert not restored.restore_session()
+    assert SessionStore("benchmark", tmp_path).load() is None
+
+
+def test_async_client_drives_the_blocking_client(server, tmp_path):
+    client = NZClient("teacher", server.site.password, session_store=SessionStore("teacher", tmp_path),
+                      base_url=server.url)
+
+    async def fill() -> tuple[list[int], list[dict]]:
+        async with AsyncNZClient(client=client, concurrency=4) as nz:
+            assert await nz.authenticate() and nz.is_auth
+            journal_list = await nz.get_journals()
+            assert journal_list is not None and nz.journals
+            urls = await nz.find_lessons_url(server.journal_url())
+            rows = [dict(number=str(index), topic=f"Тема {index}", homework='') for index in range(len(urls))]
+            return await nz.add_topics(urls, rows), await nz.parse_lessons_data(urls)
+
+    statuses, lessons = asyncio.run(fill())
+    assert statuses == [200] * server.site.lessons_per_journal
+    assert [lesson['topic'] for lesson in lessons] == [f"Тема {index}" for index in range(len(lessons))]
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from journal_free.client import FileClient
+from journal_free.engine import SubmissionEngine, FillStatus
+from journal_free.policy import AdaptiveLimiter
+
+
+class StubClient:
+    """
+    Stands in for NZClient, every lesson is saved unless its url is in fail.
+    """
+
+    def __init__(self, lessons: int, fail: tuple[str, ...] = ()) -> None:
+        self.urls = [f"/lesson/{index}" for index in range(lessons)]
+        self.fail = fail
+        self.submitted: dict[str, dict] = {}
+
+    def iter_lessons_pages(self, url: str):
+        yield self.urls
+
+    def add_topic(self, url: str, lesson_data: dict) -> int:
+        if url in self.fail:
+            return 500
+        self.submitted[url] = lesson_data
+        return 200
+
+
+def write_plan(path, lessons: int) -> FileClient:
+    path.write_text(''.join(f"{number},Тема {number},ДЗ {number}\n" for number in range(1, lessons + 1)), 'utf-8')
+    return FileClient(str(path))
+
+
+def test_fill_submits_every_lesson_in_order(tmp_path):
+    client = StubClient(5)
+    engine = SubmissionEngine(client, adaptive=False)
+    assert engine.fill('/journal', write_plan(tmp_path / 'plan.csv', 5), resume=False) == FillStatus.SUCCESS
+    assert [client.submitted[url]['topic'] for url in client.urls] == [f"Тема {number}" for number in range(1, 6)]
+    assert engine.submitted == 5
+
+
+def test_fill_stops_after_a_failed_lesson(tmp_path):
+    client = StubClient(20, fail=('/lesson/0',))
+    engine = SubmissionEngine(client, limiter=AdaptiveLimiter.fixed(1))
+    assert engine.fill('/journal', write_plan(tmp_path / 'plan.csv', 20), resume=False) == FillStatus.ERROR
+    assert engine.failed == 1
+    assert engine.limiter.in_flight == 0
+
+
+def test_fill_reports_a_plan_changed_after_validation(tmp_path):
+    plan = write_plan(tmp_path / 'plan.csv', 3)
+    (tmp_path / 'plan.csv').write_text('1,Тема 1\n2,\n3,Тема 3\n', 'utf-8')
+    engine = SubmissionEngine(StubClient(3), adaptive=False)
+    assert engine.fill('/journal', plan, resume=False) == FillStatus.INVALID_PLAN
+
+
+def test_a_failing_progress_callback_does_not_leak_limiter_slots(tmp_path):
+    reports = []
+
+    def progress(snapshot):
+        reports.append(snapshot)
+        if len(reports) == 1:
+            raise ValueError("display failed")
+
+    client = StubClient(10)
+    engine = SubmissionEngine(client, limiter=AdaptiveLimiter.fixed(1), progress=progress)
+    assert engine.fill('/journal', write_plan(tmp_path / 'plan.csv', 10), resume=False) == FillStatus.SUCCESS
+    assert engine.submitted == 10
+    assert engine.limiter.in_flight == 0
+
+
+def test_lessons_cancelled_before_they_ran_release_their_slots():
+    from journal_free.scheduler import RequestScheduler
+
+    scheduler = RequestScheduler(workers=1, reserved=0)
+    gate = threading.Event()
+    scheduler.submit(gate.wait)
+    engine = SubmissionEngine(StubClient(3), limiter=AdaptiveLimiter.fixed(3), executor=scheduler.executor())
+    run = threading.Thread(target=engine.run, args=(StubClient(3).urls, [{}] * 3))
+    run.start()
+    while scheduler.stats['queued'] < 3:
+        time.sleep(0.01)
+    scheduler.shutdown(wait=False, cancel_pending=True)
+    gate.set()
+    run.join(2)
+    assert not run.is_alive()
+    assert engine.limiter.in_flight == 0
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from journal_free.policy import AdaptiveLimiter, CircuitBreaker, RequestPolicy
+
+
+def test_breaker_opens_once_the_blocked_share_reaches_the_rate():
+    breaker = CircuitBreaker(window=60, min_requests=4, rate=0.5, cooldown=30, max_cooldown=120)
+    breaker.record(False)
+    breaker.record(False)
+    breaker.record(True)
+    assert not breaker.is_open
+    breaker.record(True)
+    assert breaker.is_open
+    assert breaker.trips == 1
+    assert breaker.paused_seconds == 30
+
+
+def test_breaker_doubles_the_cooldown_when_it_trips_again_right_after_a_pause():
+    breaker = CircuitBreaker(window=60, min_requests=2, rate=0.5, cooldown=0.01, max_cooldown=0.03)
+    for expected in (0.01, 0.02, 0.03, 0.03):
+        paused = breaker.paused_seconds
+        breaker.wait()
+        breaker.record(True)
+        breaker.record(True)
+        assert breaker.paused_seconds - paused == pytest.approx(expected)
+    assert breaker.trips == 4
+
+
+def test_breaker_wait_blocks_for_the_cooldown():
+    breaker = CircuitBreaker(window=60, min_requests=1, rate=1.0, cooldown=0.05)
+    breaker.record(True)
+    started = time.monotonic()
+    breaker.wait()
+    assert time.monotonic() - started >= 0.04
+    assert not breaker.is_open
+
+
+def no_breaker() -> CircuitBreaker:
+    return CircuitBreaker(min_requests=1000)
+
+
+def test_policy_retries_blocked_results_until_one_passes():
+    results = iter([429, 429, 200])
+    policy = RequestPolicy(attempts=3, base_delay=0, max_delay=0, breaker=no_breaker())
+    assert policy.execute(lambda: next(results), lambda status: status == 429) == 200
+    assert policy.stats['requests'] == 3
+    assert policy.stats['retries'] == 2
+    assert policy.stats['exhausted'] == 0
+
+
+def test_policy_returns_the_last_blocked_result_when_the_attempts_run_out():
+    sent = []
+    policy = RequestPolicy(attempts=2, base_delay=0, max_delay=0, breaker=no_breaker())
+    assert policy.execute(lambda: sent.append(1) or 429, lambda status: status == 429) == 429
+    assert len(sent) == 3
+    assert policy.stats['exhausted'] == 1
+
+
+def test_backoff_is_capped_and_honours_retry_after():
+    policy = RequestPolicy(base_delay=1, max_delay=4, breaker=no_breaker())
+    assert all(0 <= policy.backoff(attempt) <= 4 for attempt in range(10))
+    assert policy.backoff(0, retry_after=3) >= 3
+    assert policy.backoff(0, retry_after=60) <= 4
+
+
+def test_fixed_limiter_bounds_the_requests_in_flight():
+    limiter = AdaptiveLimiter.fixed(2)
+    limiter.acquire()
+    limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+    limiter.release(time.monotonic())
+    assert acquired.wait(1)
+    thread.join()
+    assert limiter.in_flight == 2
+    assert limiter.limit == 2
+
+
+def test_limiter_grows_by_about_one_per_round_of_healthy_requests():
+    limiter = AdaptiveLimiter(4, minimum=1, maximum=10)
+    for _ in range(4):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 4
+    assert 4.9 < limiter._limit < 5.1
+
+
+def test_limiter_cuts_once_per_congestion_episode():
+    limiter = AdaptiveLimiter(8, minimum=1, maximum=10, decrease=0.5)
+    started = [limiter.acquire() for _ in range(4)]
+    for start in started:
+        limiter.release(start, ok=False)
+    assert limiter.limit == 4
+    assert limiter.decreases == 1
+    limiter.release(limiter.acquire(), ok=False)
+    assert limiter.limit == 2
+
+
+def test_limiter_treats_a_latency_spike_as_congestion():
+    limiter = AdaptiveLimiter(8, minimum=1, maximum=10, tolerance=2.0, smoothing=1.0)
+    now = time.monotonic()
+    limiter.acquire()
+    limiter.release(now - 0.01)
+    limiter.acquire()
+    limiter.release(now - 1.0)
+    assert limiter.decreases == 1
+    assert limiter.limit < 8
+
+
+def test_limiter_never_leaves_its_bounds():
+    limiter = AdaptiveLimiter(2, minimum=2, maximum=3)
+    for _ in range(10):
+        limiter.release(limiter.acquire(), ok=False)
+    assert limiter.limit == 2
+    for _ in range(100):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 3
@@ -0,0 +1,171 @@
+import json
+import zipfile
+
+import pytest
+
+from journal_free.client import FileClient
+from journal_free.readers import CsvReader, JsonReader, OdsReader, InvalidRowError, PlanFormatError, \
+    SheetNotFoundError, UnsupportedFormatError, get_reader
+
+ODS_CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+    xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+    xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">
+<office:body><office:spreadsheet>{tables}</office:spreadsheet></office:body>
+</office:document-content>"""
+
+
+def write_ods(path, tables: dict[str, str]) -> str:
+    tables = ''.join(f'<table:table table:name="{name}">{rows}</table:table>' for name, rows in tables.items())
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('content.xml', ODS_CONTENT.format(tables=tables))
+    return str(path)
+
+
+def ods_row(*cells: str, repeated: int = 1) -> str:
+    return f'<table:table-row table:number-rows-repeated="{repeated}">{"".join(cells)}</table:table-row>'
+
+
+def number_cell(value) -> str:
+    return f'<table:table-cell office:value-type="float" office:value="{value}"><text:p>{value}</text:p></table:table-cell>'
+
+
+def text_cell(paragraph: str) -> str:
+    return f'<table:table-cell office:value-type="string"><text:p>{paragraph}</text:p></table:table-cell>'
+
+
+def test_ods_keeps_spaces_tabs_and_line_breaks(tmp_path):
+    path = write_ods(tmp_path / 'plan.ods', {'Plan': ods_row(
+        number_cell(1),
+        text_cell('Тема<text:s text:c="2"/>один<text:tab/>два<text:line-break/><text:span>три<text:s/>четыре</text:span>'),
+    )})
+    assert list(OdsReader().iter_values(path)) == [(1, 'Тема  один\tдва\nтри четыре')]
+
+
+def test_ods_ignores_cell_annotations(tmp_path):
+    cell = ('<table:table-cell office:value-type="string"><text:p>Тема</text:p>'
+            '<office:annotation><text:p>comment</text:p></office:annotation></table:table-cell>')
+    path = write_ods(tmp_path / 'plan.ods', {'Plan': ods_row(number_cell(1), cell)})
+    assert list(OdsReader().iter_values(path)) == [(1, 'Тема')]
+
+
+def test_ods_expands_repeated_rows_and_drops_sheet_padding(tmp_path):
+    rows = ods_row(number_cell(1), text_cell('A'), repeated=2) + ods_row('<table:table-cell/>', repeated=3) + \
+        ods_row(number_cell(2), text_cell('B')) + ods_row('<table:table-cell/>', repeated=1000)
+    path = write_ods(tmp_path / 'plan.ods', {'Plan': rows})
+    assert list(OdsReader().iter_values(path)) == [(1, 'A'), (1, 'A'), (), (), (), (2, 'B')]
+
+
+def test_ods_sheets(tmp_path):
+    path = write_ods(tmp_path / 'plan.ods', {'First': ods_row(number_cell(1), text_cell('A')),
+                                             'Second': ods_row(number_cell(2), text_cell('B'))})
+    reader = OdsReader()
+    assert reader.sheet_names(path) == ['First', 'Second']
+    assert list(reader.iter_values(path, 'Second')) == [(2, 'B')]
+    with pytest.raises(SheetNotFoundError) as error:
+        list(reader.iter_values(path, 'Missing'))
+    assert error.value.sheets == ['First', 'Second']
+
+
+def test_json_rows_and_objects(tmp_path):
+    path = tmp_path / 'plan.json'
+    path.write_text(json.dumps([[1, ' Тема ', ''], {'number': 2, 'topic': 'Тема 2', 'homework': 'ДЗ'}]), 'utf-8')
+    assert list(JsonReader().iter_values(str(path))) == [(1, 'Тема', None), (2, 'Тема 2', 'ДЗ')]
+
+
+def test_json_named_plans(tmp_path):
+    path = tmp_path / 'plans.json'
+    path.write_text(json.dumps({'A': [[1, 'a']], 'B': [[2, 'b']]}), 'utf-8')
+    reader = JsonReader()
+    assert reader.sheet_names(str(path)) == ['A', 'B']
+    assert list(reader.iter_values(str(path), 'B')) == [(2, 'b')]
+
+
+@pytest.mark.parametrize('rows', [["Тема"], [[1, 'a'], 5], {'A': 'Тема'}])
+def test_json_rejects_scalar_rows(tmp_path, rows):
+    path = tmp_path / 'plan.json'
+    path.write_text(json.dumps(rows), 'utf-8')
+    with pytest.raises(InvalidRowError):
+        list(JsonReader().iter_values(str(path)))
+    assert not FileClient(str(path)).valid
+
+
+@pytest.mark.parametrize('content', ['1,"Тема, частина 1",ДЗ\n2,Тема 2,\n',
+                                     '1;Тема, частина 1;ДЗ\n2;Тема 2;\n',
+                                     '1\tТема, частина 1\tДЗ\n2\tТема 2\t\n'])
+def test_csv_sniffs_the_delimiter(tmp_path, content):
+    path = tmp_path / 'plan.csv'
+    path.write_text(content, 'utf-8')
+    assert list(CsvReader().iter_values(str(path))) == [('1', 'Тема, частина 1', 'ДЗ'), ('2', 'Тема 2', None)]
+
+
+def test_csv_falls_back_to_cp1251(tmp_path):
+    path = tmp_path / 'plan.csv'
+    # Excel on a Cyrillic Windows saves CSV in cp1251 with ";"
+    path.write_bytes('1;Тема 1;ДЗ 1\n2;Тема 2;\n'.encode('cp1251'))
+    assert list(CsvReader().iter_values(str(path))) == [('1', 'Тема 1', 'ДЗ 1'), ('2', 'Тема 2', None)]
+    assert FileClient(str(path)).valid
+
+
+@pytest.mark.parametrize('name, content', [('plan.json', b'[[1, "\xd0\xa2'),
+                                           ('plan.json', '[[1, "Тема"]]'.encode('cp1251')),
+                                           ('plan.ods', b'not an archive'),
+                                           ('plan.xlsx', b'not an archive')])
+def test_damaged_plan_files(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    with pytest.raises(PlanFormatError, match=name):
+        FileClient(str(path))
+    with pytest.raises(PlanFormatError):
+        FileClient.sheet_names(str(path))
+
+
+def test_ods_without_content(tmp_path):
+    with zipfile.ZipFile(tmp_path / 'plan.ods', 'w') as archive:
+        archive.writestr('mimetype', 'application/vnd.oasis.opendocument.spreadsheet')
+    with pytest.raises(PlanFormatError):
+        list(OdsReader().iter_values(str(tmp_path / 'plan.ods')))
+
+
+def test_file_client_validates_and_streams_rows(tmp_path):
+    path = tmp_path / 'plan.csv'
+    path.write_text('1,Тема 1,ДЗ 1\n2,Тема 2,\n', 'utf-8')
+    file = FileClient(str(path))
+    assert file.valid and file.count == 2
+    assert file.validated_data == [{'topic': 'Тема 1', 'number': '1', 'homework': 'ДЗ 1'},
+                                   {'topic': 'Тема 2', 'number': '2', 'homework': ''}]
+
+
+def test_file_client_rejects_rows_without_topic(tmp_path):
+    path = tmp_path / 'plan.csv'
+    path.write_text('1,Тема 1\n2,\n', 'utf-8')
+    assert not FileClient(str(path)).valid
+
+
+def test_file_client_unknown_sheet_lists_the_sheets(tmp_path):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    workbook.active.title = 'Математика - 5-А'
+    workbook.active.append([1, 'Тема'])
+    workbook.save(tmp_path / 'plans.xlsx')
+    with pytest.raises(SheetNotFoundError, match='Математика - 5-А'):
+        FileClient(str(tmp_path / 'plans.xlsx'), sheet='Фізика')
+
+
+def test_file_client_reports_rows_changed_after_validation(tmp_path):
+    path = tmp_path / 'plan.csv'
+    path.write_text('1,Тема 1\n2,Тема 2\n', 'utf-8')
+    file = FileClient(str(path))
+    assert file.valid
+    path.write_text('1,Тема 1\n2,\n', 'utf-8')
+    rows = file.rows()
+    assert next(rows).topic == 'Тема 1'
+    with pytest.raises(InvalidRowError) as error:
+        next(rows)
+    assert error.value.index == 1
+
+
+def test_unsupported_extension():
+    with pytest.raises(UnsupportedFormatError):
+        get_reader('plan.txt')
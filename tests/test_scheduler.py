@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from journal_free.scheduler import Priority, RequestScheduler
+
+
+def block(scheduler: RequestScheduler, **kwargs) -> tuple[threading.Event, object]:
+    """
+    Submits a job holding its thread until the returned gate is set, returns once the job runs.
+    """
+    started, gate = threading.Event(), threading.Event()
+    future = scheduler.submit(lambda: started.set() or gate.wait(), **kwargs)
+    assert started.wait(1)
+    return gate, future
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RequestScheduler(workers=2, reserved=1)
+    yield scheduler
+    scheduler.shutdown(cancel_pending=True)
+
+
+def test_interactive_jobs_run_before_queued_bulk_ones():
+    scheduler = RequestScheduler(workers=1, reserved=0)
+    gate, blocker = block(scheduler)
+    order = []
+    bulk = [scheduler.submit(order.append, f'bulk {index}', priority=Priority.BULK) for index in range(2)]
+    interactive = scheduler.submit(order.append, 'interactive')
+    gate.set()
+    for future in (blocker, interactive, *bulk):
+        future.result(1)
+    scheduler.shutdown()
+    assert order == ['interactive', 'bulk 0', 'bulk 1']
+
+
+def test_bulk_jobs_leave_the_reserved_threads_free(scheduler):
+    gate = threading.Event()
+    bulk = [scheduler.submit(gate.wait, priority=Priority.BULK) for _ in range(3)]
+    deadline = time.monotonic() + 1
+    while scheduler.stats['bulk'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # One thread of two is reserved, the interactive job is answered while the bulk ones wait
+    assert scheduler.submit(lambda: 'answered').result(1) == 'answered'
+    assert scheduler.stats['bulk'] == 1 and scheduler.stats['queued'] == 2
+    gate.set()
+    for future in bulk:
+        future.result(1)
+
+
+def test_jobs_with_the_same_key_never_overlap(scheduler):
+    running = []
+    overlaps = []
+
+    def job(index: int) -> int:
+        running.append(index)
+        if len(running) > 1:
+            overlaps.append(index)
+        time.sleep(0.01)
+        running.remove(index)
+        return index
+
+    futures = [scheduler.submit(job, index, key='client') for index in range(5)]
+    assert [future.result(1) for future in futures] == list(range(5))
+    assert overlaps == []
+
+
+def test_supersede_cancels_the_jobs_of_the_key_that_did_not_start(scheduler):
+    gate, started = block(scheduler, key='term')
+    waiting = scheduler.submit(lambda: 'old', key='term')
+    latest = scheduler.submit(lambda: 'new', key='term', supersede=True)
+    gate.set()
+    assert started.result(1) is True
+    assert waiting.cancelled()
+    assert latest.result(1) == 'new'
+
+
+def test_shutdown_cancels_pending_jobs_and_refuses_new_ones():
+    scheduler = RequestScheduler(workers=1, reserved=0)
+    gate, running = block(scheduler)
+    pending = scheduler.submit(lambda: None)
+    scheduler.shutdown(wait=False, cancel_pending=True)
+    assert pending.cancelled()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(lambda: None)
+    gate.set()
+    assert running.result(1) is True
@@ -0,0 +1,260 @@
+import os
+import threading
+
+import pytest
+
+from journal_free.engine import FillStatus, Progress
+from journal_free.service import FillService, JobQueue, JobStatus
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with JobQueue(tmp_path / 'jobs.sqlite3') as queue:
+        yield queue
+
+
+def test_jobs_are_claimed_in_submission_order(queue):
+    first = queue.submit('fill', dict(journal='/a'))
+    second = queue.submit('export', dict(journal='/b'))
+    assert first['status'] == JobStatus.QUEUED
+    assert queue.claim('1')['id'] == first['id']
+    claimed = queue.claim('2')
+    assert claimed['id'] == second['id']
+    assert claimed['status'] == JobStatus.RUNNING and claimed['worker'] == '2'
+    assert queue.claim('3') is None
+
+
+def test_concurrent_claims_never_take_the_same_job(tmp_path):
+    path = tmp_path / 'jobs.sqlite3'
+    with JobQueue(path) as queue:
+        for index in range(50):
+            queue.submit('fill', dict(journal=f'/{index}'))
+    claimed = []
+
+    def work(worker: str) -> None:
+        with JobQueue(path) as queue:
+            while (job := queue.claim(worker)) is not None:
+                claimed.append(job['id'])
+
+    threads = [threading.Thread(target=work, args=(str(worker),)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == list(range(1, 51))
+
+
+def test_progress_and_result_are_stored_as_json(queue):
+    job = queue.submit('fill', dict(journal='/a', name='Математика - 5-А'))
+    queue.claim('1')
+    queue.set_progress(job['id'], Progress(3, 10, 2, 1, 0, 0, 1.5, 2.0, 3.5))
+    assert queue.get(job['id'])['progress']['submitted'] == 2
+    queue.finish(job['id'], dict(status=FillStatus.SUCCESS, submitted=10))
+    job = queue.get(job['id'])
+    assert job['status'] == FillStatus.SUCCESS
+    assert job['result'] == dict(status=FillStatus.SUCCESS, submitted=10)
+    assert job['params']['name'] == 'Математика - 5-А'
+
+
+def test_cancel_stops_a_queued_job_and_flags_a_running_one(queue):
+    running = queue.submit('fill', dict(journal='/a'))
+    queued = queue.submit('fill', dict(journal='/b'))
+    queue.claim('1')
+    assert queue.cancel(queued['id'])['status'] == FillStatus.CANCELLED
+    job = queue.cancel(running['id'])
+    assert job['status'] == JobStatus.RUNNING and job['cancel_requested']
+    assert queue.is_cancel_requested(running['id'])
+    assert queue.cancel(1000) is None
+
+
+def test_requeue_puts_running_jobs_back(queue):
+    job = queue.submit('fill', dict(journal='/a'))
+    queue.claim('1')
+    assert queue.requeue() == 1
+    job = queue.get(job['id'])
+    assert job['status'] == JobStatus.QUEUED and job['worker'] is None
+    assert queue.workers() == []
+
+
+def test_a_job_crashing_its_workers_fails_after_max_crashes(queue):
+    job = queue.submit('fill', dict(journal='/a'))
+    for worker in ('1', '2'):
+        queue.claim(worker)
+        assert queue.workers() == [worker]
+        assert queue.recover(worker, max_crashes=3) == (1, 0)
+    queue.claim('3')
+    assert queue.recover('3', max_crashes=3) == (0, 1)
+    job = queue.get(job['id'])
+    assert job['status'] == FillStatus.ERROR and job['crashes'] == 3
+    assert 'died 3 times' in job['result']['error']
+
+
+def test_recover_leaves_the_jobs_of_other_workers(queue):
+    queue.submit('fill', dict(journal='/a'))
+    queue.claim('1')
+    assert queue.recover('2') == (0, 0)
+    assert queue.workers() == ['1']
+
+
+def test_workers_without_heartbeats_lose_their_jobs(queue):
+    queue.submit('fill', dict(journal='/a'))
+    queue.submit('fill', dict(journal='/b'))
+    queue.claim('stale')
+    queue.claim('alive')
+    assert queue.workers(lease_timeout=60) == []
+    queue._connection.execute("UPDATE jobs SET heartbeat_at = heartbeat_at - 120")
+    assert queue.heartbeat('alive') == 1
+    assert queue.workers(lease_timeout=60) == ['stale']
+    assert queue.heartbeat('gone') == 0
+
+
+def test_a_worker_that_lost_its_job_cannot_finish_it(queue):
+    job = queue.submit('fill', dict(journal='/a'))
+    queue.claim('stale')
+    queue.recover('stale')
+    queue.claim('new')
+    queue.finish(job['id'], dict(status=FillStatus.SUCCESS), 'stale')
+    assert queue.get(job['id'])['status'] == JobStatus.RUNNING
+    queue.finish(job['id'], dict(status=FillStatus.SUCCESS), 'new')
+    assert queue.get(job['id'])['status'] == FillStatus.SUCCESS
+
+
+def test_start_recovers_expired_leases_whatever_the_pid(tmp_path, monkeypatch):
+    from journal_free import settings
+
+    monkeypatch.setattr(settings, 'SERVICE_TOKEN_PATH', tmp_path / 'service_token')
+    api_service = FillService(None, workers=1, port=0, token='secret', db_path=tmp_path / 'jobs.sqlite3')
+    queue = api_service.queue
+    job = queue.submit('fill', dict(journal='/a'))
+    # The worker of the previous run had the pid of this process, which is alive
+    queue.claim(str(os.getpid()))
+    queue._connection.execute("UPDATE jobs SET heartbeat_at = NULL")
+    monkeypatch.setattr(api_service, '_spawn', lambda index=None: None)
+    api_service.start()
+    try:
+        job = queue.get(job['id'])
+        assert job['status'] == JobStatus.QUEUED and job['crashes'] == 1
+    finally:
+        api_service.stop()
+
+
+def test_a_database_without_the_crash_counter_is_migrated(tmp_path):
+    import sqlite3
+
+    path = tmp_path / 'jobs.sqlite3'
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, params TEXT NOT NULL,
+                           status TEXT NOT NULL, cancel_requested INTEGER NOT NULL DEFAULT 0, progress TEXT,
+                           result TEXT, worker TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)
+    """)
+    connection.close()
+    with JobQueue(path) as queue:
+        job = queue.submit('fill', dict(journal='/a'))
+        assert job['crashes'] == 0 and job['heartbeat_at'] is None
+
+
+class ValidatingService(FillService):
+    """
+    FillService without a client, workers and HTTP server, only its job validation is used.
+    """
+
+    def __init__(self, export_dir) -> None:
+        self.export_dir = export_dir.resolve()
+
+
+@pytest.fixture
+def service(tmp_path):
+    return ValidatingService(tmp_path / 'exports')
+
+
+def test_export_outputs_stay_in_the_export_directory(service, tmp_path):
+    kind, job = service.validate(dict(kind='export', journal='/a', output='5-А/journal.xlsx'))
+    assert kind == 'export'
+    assert job['output'] == str(tmp_path / 'exports' / '5-А' / 'journal.xlsx')
+    for output in ('../journal.xlsx', str(tmp_path / 'journal.xlsx'), 'a/../../journal.xlsx', '.', 5):
+        with pytest.raises(ValueError):
+            service.validate(dict(kind='export', journal='/a', output=output))
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink') or os.name == 'nt', reason="symlinks need privileges on Windows")
+def test_export_outputs_cannot_escape_through_a_symlink(service, tmp_path):
+    (tmp_path / 'exports').mkdir()
+    (tmp_path / 'exports' / 'link').symlink_to(tmp_path)
+    with pytest.raises(ValueError):
+        service.validate(dict(kind='export', journal='/a', output='link/journal.xlsx'))
+
+
+def test_fill_jobs_need_an_existing_plan_and_sheet(service, tmp_path):
+    plan = tmp_path / 'plan.csv'
+    plan.write_text('1,Тема\n', 'utf-8')
+    kind, job = service.validate(dict(journal='/a', plan=str(plan), sync=1))
+    assert kind == 'fill' and job['sync'] is True and job['plan'] == str(plan.resolve())
+    for params in (dict(journal='/a'), dict(plan=str(plan)), dict(journal='/a', plan=str(tmp_path / 'missing.csv')),
+                   dict(journal='/a', plan=str(plan), sheet='other'), dict(kind='delete', journal='/a'), ['/a']):
+        with pytest.raises(ValueError):
+            service.validate(params)
+
+
+@pytest.fixture
+def api(tmp_path):
+    import http.client
+
+    # Only the HTTP server is started, the submitted jobs stay queued
+    api_service = FillService(None, port=0, token='secret', db_path=tmp_path / 'jobs.sqlite3',
+                              export_dir=tmp_path / 'exports')
+    thread = threading.Thread(target=api_service.httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+
+    def request(method: str, path: str, body: str | None = None, **headers) -> tuple[int, dict | list]:
+        import json
+
+        connection = http.client.HTTPConnection(*api_service.httpd.server_address[:2])
+        headers = {'Authorization': 'Bearer secret', 'Content-Type': 'application/json',
+                   **{key.replace('_', '-'): value for key, value in headers.items()}}
+        headers = {key: value for key, value in headers.items() if value is not None}
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    yield request
+    api_service.httpd.shutdown()
+    api_service.httpd.server_close()
+    api_service.queue.close()
+
+
+def test_api_submits_and_cancels_jobs(api):
+    status, job = api('POST', '/jobs', '{"kind": "export", "journal": "/a", "output": "a.xlsx"}')
+    assert status == 201 and job['status'] == JobStatus.QUEUED
+    assert api('GET', f"/jobs/{job['id']}")[1]['id'] == job['id']
+    assert [listed['id'] for listed in api('GET', '/jobs')[1]] == [job['id']]
+    assert api('DELETE', f"/jobs/{job['id']}")[1]['status'] == FillStatus.CANCELLED
+    assert api('GET', '/jobs/1000')[0] == 404
+
+
+def test_api_requires_the_token(api):
+    assert api('GET', '/jobs', Authorization=None)[0] == 401
+    assert api('GET', '/jobs', Authorization='Bearer wrong')[0] == 401
+
+
+def test_api_rejects_bodies_that_are_not_json(api):
+    body = '{"kind": "export", "journal": "/a", "output": "a.xlsx"}'
+    assert api('POST', '/jobs', body, Content_Type='text/plain')[0] == 415
+    assert api('POST', '/jobs', body, Content_Type='application/x-www-form-urlencoded')[0] == 415
+    assert api('POST', '/jobs', 'not json')[0] == 400
+
+
+def test_api_only_answers_localhost(api):
+    assert api('GET', '/jobs', Host='attacker.example:8750')[0] == 403
+    assert api('GET', '/jobs', Host='localhost:8750')[0] == 200
+
+
+def test_a_random_token_is_generated_without_a_configured_one(tmp_path):
+    first = FillService(None, port=0, token=None, db_path=tmp_path / 'jobs.sqlite3')
+    second = FillService(None, port=0, token=None, db_path=tmp_path / 'jobs.sqlite3')
+    try:
+        assert first.token and second.token and first.token != second.token
+    finally:
+        for api_service in (first, second):
+            api_service.httpd.server_close()
+            api_service.queue.close()
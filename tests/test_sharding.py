@@ -0,0 +1,30 @@
+from benchmarks.fake_server import FakeNZServer
+from benchmarks.throughput import login, write_plan
+from journal_free.client import FileClient
+from journal_free.engine import FillStatus
+from journal_free.sharding import ShardedRun, run_fill
+
+OPTIONS = dict(concurrency=4, sync=False, resume=False, adaptive=False)
+
+
+def test_sharded_fill_reports_every_journal_in_order(tmp_path):
+    with FakeNZServer() as server:
+        client = login(server, tmp_path)
+        plan = write_plan(tmp_path / 'plan.csv', server.site.lessons_per_journal)
+        jobs = [dict(name=str(index), url=server.journal_url(index), file=plan)
+                for index in range(len(server.site.journals))]
+        reports = ShardedRun(client, processes=2, concurrency=4, resume=False, adaptive=False).fill(jobs)
+        assert [report['name'] for report in reports] == [job['name'] for job in jobs]
+        assert all(report['status'] == FillStatus.SUCCESS for report in reports)
+        assert sum(report['submitted'] for report in reports) == len(jobs) * server.site.lessons_per_journal
+        assert len(server.site.lessons) == len(jobs) * server.site.lessons_per_journal
+
+
+def test_run_fill_checks_the_plan_and_cancellation_first(tmp_path):
+    (tmp_path / 'empty.csv').write_text('', 'utf-8')
+    job = dict(url='/journal', file=FileClient(str(tmp_path / 'empty.csv')))
+    assert run_fill(None, job, OPTIONS, lambda: False)['status'] == FillStatus.INVALID_PLAN
+    job['file'] = write_plan(tmp_path / 'plan.csv', 3)
+    report = run_fill(None, job, OPTIONS, lambda: True)
+    assert report['status'] == FillStatus.CANCELLED
+    assert report['submitted'] == 0